@@ -0,0 +1,157 @@
+"""
+Asyncio (ASGI) version of app_web.py with the same JSON API and index.html.
+
+    pip install starlette uvicorn
+    python app_async.py                      # uvicorn on 127.0.0.1:5000
+    uvicorn app_async:app --port 5000
+
+Request handlers never block the event loop. Chat messages are micro-batched
+and scored in a process pool (serving.ProcessModelPool), so prediction uses
+every core and a slow batch doesn't hold up the loop. Logging and feedback go
+through a small thread pool because they can touch SQLite. Retraining runs in
+a separate process. A waiting request is just a coroutine, so a single
+process can hold thousands of open client connections.
+"""
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from chatbot import metrics
+from chatbot.config import ASYNC_DB_THREADS, BASE_DIR
+from chatbot.db import init_db
+from chatbot.nlp import warmup
+from chatbot.serving import ProcessModelPool
+from chatbot.training import load_or_train_model
+from chatbot.writebehind import record_interaction, record_feedback
+
+LOW_CONFIDENCE_REPLY = "I'm not sure about that yet. You can teach me a better answer."
+
+db_executor = ThreadPoolExecutor(ASYNC_DB_THREADS, thread_name_prefix="db")
+models: ProcessModelPool = None
+
+
+async def run_db(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(db_executor, partial(fn, *args, **kwargs))
+
+
+async def read_json(request: Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global models
+    loop = asyncio.get_running_loop()
+    await run_db(init_db)
+    await loop.run_in_executor(None, partial(warmup, download=True))
+    # Train (or confirm the cached model) once here, so the workers only load it
+    await loop.run_in_executor(None, load_or_train_model)
+    models = ProcessModelPool()
+    await models.start()
+    try:
+        yield
+    finally:
+        await models.close()
+        db_executor.shutdown(wait=True)
+
+
+async def home(request: Request):
+    return FileResponse(BASE_DIR / "index.html")
+
+
+# --- APIs ---
+async def api_chat(request: Request):
+    if request.method == "OPTIONS":
+        return Response(status_code=204)
+    data = await read_json(request)
+    text = str(data.get("message") or "").strip()
+    if not text:
+        return JSONResponse({"error": "message is required"}, status_code=400)
+
+    res = await models.infer(text)
+    reply = res["answer"] or LOW_CONFIDENCE_REPLY
+    iid = await run_db(
+        record_interaction,
+        user_text=text,
+        bot_intent=res["intent"],
+        confidence=res["confidence"],
+        bot_answer=reply,
+    )
+    return JSONResponse({
+        "reply": reply,
+        "intent": res["intent"] or "unknown",
+        "confidence": res["confidence"],
+        "interaction_id": iid,
+    })
+
+
+async def api_feedback(request: Request):
+    if request.method == "OPTIONS":
+        return Response(status_code=204)
+    data = await read_json(request)
+    try:
+        iid = int(data["interaction_id"])
+    except (KeyError, TypeError, ValueError):
+        return JSONResponse({"ok": False, "error": "interaction_id is required"}, status_code=400)
+    helpful = data.get("helpful")
+    await run_db(
+        record_feedback,
+        iid,
+        helpful=None if helpful is None else bool(helpful),
+        correction_intent=(data.get("correction_intent") or "").strip() or None,
+        corrected_answer=(data.get("corrected_answer") or "").strip() or None,
+    )
+    return JSONResponse({"ok": True})
+
+
+async def api_train(request: Request):
+    if request.method == "OPTIONS":
+        return Response(status_code=204)
+    if request.method == "GET":
+        return JSONResponse({"ok": True, **models.status()})
+    data = await read_json(request)
+    started = models.retrain_async(full=bool(data.get("full")))
+    report = "Retraining started in the background." if started else "Retraining already in progress."
+    return JSONResponse({"ok": True, **models.status(), "report": report})
+
+
+async def api_metrics(request: Request):
+    # This process's stages (logging); prediction is timed inside the workers
+    return PlainTextResponse(metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/api/chat", api_chat, methods=["POST", "OPTIONS"]),
+        Route("/api/feedback", api_feedback, methods=["POST", "OPTIONS"]),
+        Route("/api/train", api_train, methods=["GET", "POST", "OPTIONS"]),
+        Route("/api/metrics", api_metrics, methods=["GET"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    try:  # thousands of open client sockets need as many file descriptors
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+    # One process: the prediction workers are its process pool, so don't add uvicorn workers
+    uvicorn.run(app, host="127.0.0.1", port=5000, backlog=4096, log_level="warning")
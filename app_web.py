@@ -1,29 +1,30 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 
+from chatbot import metrics
+from chatbot.nlp import warmup
+from chatbot.db import init_db
+from chatbot.writebehind import record_interaction, record_feedback
+from chatbot.serving import ModelHolder
+from chatbot.batching import MicroBatcher
+
 app = Flask(__name__, static_folder='.', static_url_path='')
 # Allow frontends on other ports (e.g., Live Server :5500). If serving same-origin, CORS is harmless but optional.
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Per-process setup, done once on import (i.e. once per WSGI worker) before serving.
+# NLTK/WordNet are loaded here so requests never load or download them.
+init_db()
+warmup(download=True)
+models = ModelHolder.from_disk()
+batcher = MicroBatcher(models.get)
+
+LOW_CONFIDENCE_REPLY = "I'm not sure about that yet. You can teach me a better answer."
+
 @app.get("/")
 def home():
     return send_from_directory(".", "index.html")
 
-# --- Fake inference (replace with your real pipeline) ---
-def fake_infer(user_text: str):
-    t = user_text.lower()
-    if "account" in t:
-        return ("account_types", "We currently offer: Savings, Current, FD, Student Savings, Senior Savings.", 0.99)
-    if "loan" in t or "rate" in t:
-        return ("loan_rates", "Personal: 16.5% p.a., Home: 13.9% p.a., Auto: 14.7% p.a.", 0.98)
-    if "hour" in t or "open" in t:
-        return ("branch_hours", "Weekdays 9:00–15:00, Sat 9:00–12:00, Sun closed.", 0.97)
-    if "atm" in t:
-        return ("atm_availability", "ATMs are available 24/7 at most branches.", 0.95)
-    if any(x in t for x in ["hi","hello","hey"]):
-        return ("greeting", "Hi there! What banking info do you need?", 1.00)
-    return ("unknown", "I'm not fully sure. Please teach me a better answer using the feedback buttons.", 0.2)
-
 # --- APIs ---
 @app.route("/api/chat", methods=["POST", "OPTIONS"])
 def api_chat():
@@ -31,24 +32,63 @@ def api_chat():
         return ("", 204)  # preflight OK for cross-origin
     data = request.get_json(silent=True) or {}
     text = (data.get("message") or "").strip()
-    intent, reply, conf = fake_infer(text)
-    # in a real app, record to DB and return that interaction id
-    return jsonify({"reply": reply, "intent": intent, "confidence": conf, "interaction_id": 1})
+    if not text:
+        return jsonify({"error": "message is required"}), 400
+
+    res = batcher.submit(text)
+    reply = res["answer"] or LOW_CONFIDENCE_REPLY
+    iid = record_interaction(
+        user_text=text,
+        bot_intent=res["intent"],
+        confidence=res["confidence"],
+        bot_answer=reply,
+    )
+    return jsonify({
+        "reply": reply,
+        "intent": res["intent"] or "unknown",
+        "confidence": res["confidence"],
+        "interaction_id": iid,
+    })
 
 @app.route("/api/feedback", methods=["POST", "OPTIONS"])
 def api_feedback():
     if request.method == "OPTIONS":
         return ("", 204)
     # accept { interaction_id, helpful?, correction_intent?, corrected_answer? }
+    data = request.get_json(silent=True) or {}
+    try:
+        iid = int(data["interaction_id"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"ok": False, "error": "interaction_id is required"}), 400
+    helpful = data.get("helpful")
+    record_feedback(
+        iid,
+        helpful=None if helpful is None else bool(helpful),
+        correction_intent=(data.get("correction_intent") or "").strip() or None,
+        corrected_answer=(data.get("corrected_answer") or "").strip() or None,
+    )
     return jsonify({"ok": True})
 
-@app.route("/api/train", methods=["POST", "OPTIONS"])
+@app.route("/api/train", methods=["GET", "POST", "OPTIONS"])
 def api_train():
     if request.method == "OPTIONS":
         return ("", 204)
-    # call your training routine here
-    return jsonify({"ok": True, "report": "Retrained on latest examples."})
+    if request.method == "GET":
+        return jsonify({"ok": True, **models.status()})
+    # Retrain in the background; the new model is swapped in when it's ready
+    data = request.get_json(silent=True) or {}
+    started = models.retrain_async(full=bool(data.get("full")))
+    report = "Retraining started in the background." if started else "Retraining already in progress."
+    return jsonify({"ok": True, **models.status(), "report": report})
+
+@app.get("/api/metrics")
+def api_metrics():
+    # Prometheus text format; per process, so scrape every worker
+    return Response(metrics.prometheus_text(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    # Run on :5000 so the index.html autodetection works
-    app.run(host="127.0.0.1", port=5000, debug=False)
+    # Development server on :5000 so the index.html autodetection works.
+    # For production use a multi-worker WSGI server, e.g.
+    #   gunicorn -w 4 --threads 8 -b 127.0.0.1:5000 app_web:app
+    #   waitress-serve --threads=16 --listen=127.0.0.1:5000 app_web:app
+    app.run(host="127.0.0.1", port=5000, debug=False, threaded=True)
@@ -0,0 +1,75 @@
+"""
+Queries/second of the db helpers: a fresh sqlite3 connection per call
+(the old behaviour) versus the pooled per-thread connections.
+
+Runs against a throwaway database, never data/banking_knowledge.db:
+
+    python -m benchmarks.bench_db [--n 20000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["BANKING_DB_PATH"] = str(Path(_tmp.name) / "bench.db")
+
+from chatbot import db  # noqa: E402  (must follow the env override)
+
+
+def legacy_get_fact(key):
+    con = sqlite3.connect(db.DB_PATH)
+    try:
+        r = con.execute("SELECT value FROM facts WHERE key=?", (key,)).fetchone()
+        return r[0] if r else None
+    finally:
+        con.close()
+
+
+def legacy_record_interaction(text):
+    con = sqlite3.connect(db.DB_PATH)
+    try:
+        cur = con.execute(
+            "INSERT INTO interactions(user_text, bot_intent, confidence, bot_answer, created_at) "
+            "VALUES (?, ?, ?, ?, datetime('now'))",
+            (text, "loan_rates", 0.9, "bench"),
+        )
+        con.commit()
+        return cur.lastrowid
+    finally:
+        con.close()
+
+
+def rate(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--n", type=int, default=20000, help="calls per measurement")
+    args = ap.parse_args()
+
+    db.init_db()
+    keys = ["loan_personal_rate", "loan_home_rate", "loan_auto_rate"]
+
+    rows = [
+        ("get_fact", lambda i: legacy_get_fact(keys[i % 3]), lambda i: db.get_fact(keys[i % 3]), args.n),
+        ("record_interaction", lambda i: legacy_record_interaction("bench"),
+         lambda i: db.record_interaction("bench", "loan_rates", 0.9, "bench"), args.n // 10),
+    ]
+    print(f"{'helper':<20} {'legacy q/s':>12} {'pooled q/s':>12} {'speedup':>8}")
+    for name, legacy, pooled, n in rows:
+        before = rate(legacy, n)
+        after = rate(pooled, n)
+        print(f"{name:<20} {before:>12,.0f} {after:>12,.0f} {after / before:>7.1f}x")
+
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
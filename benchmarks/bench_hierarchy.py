@@ -0,0 +1,146 @@
+"""
+Flat versus two-stage (hierarchy.py) intent classification as the intent
+catalogue grows: training time, per-message prediction time, accuracy and
+how well the confidences are calibrated.
+
+    python -m benchmarks.bench_hierarchy [--intents 10 100 1000 2000 5000 --memory-gb 4]
+
+The catalogues are synthetic, because the real database has only a handful of
+intents. Intents come in topics of 25 that share a vocabulary, like
+"card_limit_raise" and "card_limit_lower". Each intent is defined by two
+topic words and one modifier shared across topics, and its examples drop
+signature words and add filler words at random. Both models use the default
+hyperparameters (word 1-2 grams, C=10). The flat model is predicted through
+the lean predictor, the path it is served on. The two-stage model scores at
+most HIERARCHY_BEAM groups per message.
+
+Columns: "weights MB" is the size of the coefficient arrays served (the
+flat model's grow with intents x features). "top-1" and "top-3" are
+held-out accuracies. "ECE" is the expected
+calibration error of the top-1 confidence (10 bins; 0 means "confidence 0.8"
+is right 80% of the time). "answered" and "acc@thr" are the share of messages
+at or above CONFIDENCE_THRESHOLD and the accuracy on those. "predict us" times
+what serving asks for, the best intent and its confidence, as the best of
+three passes over the held-out messages.
+
+The flat model is skipped when its L-BFGS workspace (about 25 float64 per
+coefficient, intents x features coefficients) would exceed --memory-gb; the
+estimate is printed instead.
+"""
+import argparse
+import random
+import string
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from chatbot.config import CONFIDENCE_THRESHOLD, HIERARCHY_BEAM
+from chatbot.hierarchy import HierarchicalIntentModel, top_k_of
+from chatbot.lean import LeanIntentModel
+from chatbot.training import DEFAULT_PARAMS, build_pipeline
+
+TOPIC_SIZE = 25
+LBFGS_FLOATS_PER_COEF = 25  # scipy's L-BFGS-B workspace: (2m + 5) * n with m = 10
+FILLERS = ("i", "want", "to", "my", "the", "please", "how", "can", "do", "what", "is", "a", "for",
+           "about", "need", "help", "with", "me", "you", "on", "it", "could", "tell", "much")
+
+
+def catalogue(n_intents, rng, train_per_intent, test_per_intent):
+    seen = set()
+
+    def word():
+        while True:
+            w = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+            if w not in seen:
+                seen.add(w)
+                return w
+
+    n_topics = max(1, n_intents // TOPIC_SIZE)
+    topics = [[word() for _ in range(30)] for _ in range(n_topics)]
+    modifiers = [word() for _ in range(300)]
+    signatures = set()
+    while len(signatures) < n_intents:
+        topic = topics[len(signatures) % n_topics]
+        signatures.add((*sorted(rng.sample(topic, 2)), rng.choice(modifiers)))
+
+    def example(signature):
+        words = [w for w in signature if rng.random() > 0.2] or [rng.choice(signature)]
+        words += rng.sample(FILLERS, rng.randint(2, 4))
+        rng.shuffle(words)
+        return " ".join(words)
+
+    train, test = [], []
+    for i, signature in enumerate(sorted(signatures)):
+        label = f"intent_{i:05d}"
+        train += [(example(signature), label) for _ in range(train_per_intent)]
+        test += [(example(signature), label) for _ in range(test_per_intent)]
+    return train, test
+
+
+def scores(top_lists, expected):
+    """top-1, top-3, ECE, answered share and accuracy among answered."""
+    conf = np.array([top[0][1] for top in top_lists])
+    hit = np.array([top[0][0] == e for top, e in zip(top_lists, expected)])
+    top3 = np.mean([e in [label for label, _ in top] for top, e in zip(top_lists, expected)])
+    bins = np.minimum((conf * 10).astype(int), 9)
+    ece = sum(abs(hit[bins == b].mean() - conf[bins == b].mean()) * (bins == b).mean()
+              for b in range(10) if (bins == b).any())
+    answered = conf >= CONFIDENCE_THRESHOLD
+    return hit.mean(), top3, ece, answered.mean(), hit[answered].mean() if answered.any() else 0.0
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def per_message_us(fn, texts, repeat=3):
+    return min(timed(lambda: [fn(t) for t in texts])[1] for _ in range(repeat)) / len(texts) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--intents", type=int, nargs="+", default=[10, 100, 1000, 2000, 5000])
+    ap.add_argument("--train-per-intent", type=int, default=8)
+    ap.add_argument("--test-per-intent", type=int, default=2)
+    ap.add_argument("--memory-gb", type=float, default=4.0, help="largest flat-model solver workspace to attempt")
+    args = ap.parse_args()
+
+    print(f"{'intents':>7} {'model':<7} {'groups':>6} {'train s':>8} {'weights MB':>10} {'predict us':>10} "
+          f"{'top-1':>6} {'top-3':>6} {'ECE':>6} {'answered':>8} {'acc@thr':>7}")
+    for n in args.intents:
+        rng = random.Random(42)
+        train, test = catalogue(n, rng, args.train_per_intent, args.test_per_intent)
+        texts, labels = [t for t, _ in train], [label for _, label in train]
+        messages, expected = [t for t, _ in test], [label for _, label in test]
+
+        runs = []
+        n_features = len(TfidfVectorizer(ngram_range=tuple(DEFAULT_PARAMS["ngram_range"])).fit(texts).vocabulary_)
+        flat_gb = LBFGS_FLOATS_PER_COEF * 8 * n * n_features / 2**30
+        if flat_gb <= args.memory_gb:
+            flat, fit_s = timed(lambda: build_pipeline(DEFAULT_PARAMS).fit(texts, labels))
+            lean = LeanIntentModel.from_pipeline(flat)
+            us = per_message_us(lambda t: top_k_of(lean.proba_one(t), lean.classes_, 1), messages)
+            tops = [top_k_of(lean.proba_one(t), lean.classes_, 3) for t in messages]
+            runs.append(("flat", "-", fit_s, lean.coef_t.nbytes, us, tops))
+        p = DEFAULT_PARAMS
+        two, fit_s = timed(lambda: HierarchicalIntentModel(p["C"], p["ngram_range"], p["min_df"]).fit(texts, labels))
+        us = per_message_us(lambda t: two.top_k(t, 1), messages)
+        tops = [two.top_k(t, 3) for t in messages]
+        weights = two.coarse.coef_t.nbytes + sum(w.nbytes for w in two.group_coef_t_)
+        runs.append(("2-stage", two.n_groups, fit_s, weights, us, tops))
+
+        for name, groups, fit_s, weights, us, tops in runs:
+            top1, top3, ece, answered, acc_thr = scores(tops, expected)
+            print(f"{n:>7} {name:<7} {groups:>6} {fit_s:>8.2f} {weights / 2**20:>10.1f} {us:>10.1f} "
+                  f"{top1:>6.1%} {top3:>6.1%} {ece:>6.3f} {answered:>8.1%} {acc_thr:>7.1%}", flush=True)
+        if flat_gb > args.memory_gb:
+            print(f"{n:>7} {'flat':<7} skipped: {n} x {n_features} coefficients ({8 * n * n_features / 2**20:.0f} MB), "
+                  f"~{flat_gb:.0f} GiB solver workspace")
+    print(f"\n2-stage: at most {HIERARCHY_BEAM} groups per message (HIERARCHY_BEAM); threshold {CONFIDENCE_THRESHOLD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Rolling a retrained model out to several serving processes: how long until
+every worker answers with the new version, and whether any request failed
+or stalled meanwhile.
+
+    BANKING_DB_PATH=/tmp/copy.db BANKING_MODEL_DIR=/tmp/models \\
+        python -m benchmarks.bench_hot_reload [--workers 4 --publishes 5]
+
+Each worker process holds a serving.ModelHolder and answers messages in a
+tight loop. The parent retrains and publishes a new artifact version
+several times. For each publish it reports the time until the last worker
+swapped, then per worker the requests served, failures and the slowest
+request after warm-up. Finally it counts the versions left on disk after
+garbage collection. Point it at copies of the database and model directory.
+"""
+import argparse
+import multiprocessing
+import queue
+import time
+
+MESSAGES = ["what is the loan interest rate", "branch hours on saturday", "is there an atm near me",
+            "what account types do you have"]
+WARMUP_REQUESTS = 100  # first-request costs (caches, lazy loads) aren't what this measures
+
+
+def serve(idx, stop, events):
+    from chatbot.db import init_db
+    from chatbot.inference import infer_intent_and_answer
+    from chatbot.serving import ModelHolder
+    from chatbot.training import load_model
+
+    init_db()
+    holder = ModelHolder(load_model())
+    seen = holder.artifact_version
+    events.put(("ready", idx, seen, time.time()))
+    served = failed = 0
+    slowest = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            model = holder.get()
+            infer_intent_and_answer(model, MESSAGES[served % len(MESSAGES)])
+        except Exception:
+            failed += 1
+        if served >= WARMUP_REQUESTS:
+            slowest = max(slowest, time.perf_counter() - t0)
+        served += 1
+        version = getattr(model, "artifact_version_", 0)
+        if version != seen:
+            events.put(("swapped", idx, version, time.time()))
+            seen = version
+    events.put(("done", idx, served, failed, slowest))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--publishes", type=int, default=5)
+    ap.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for every worker to swap")
+    args = ap.parse_args()
+
+    from chatbot import artifacts
+    from chatbot.config import MODEL_ARTIFACTS_DIR, MODEL_KEEP_VERSIONS, MODEL_RELOAD_CHECK_INTERVAL
+    from chatbot.db import init_db
+    from chatbot.training import load_or_train_model, train_model
+
+    init_db()
+    load_or_train_model()  # make sure a version is published before the workers start
+
+    ctx = multiprocessing.get_context("spawn")
+    stop, events = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=serve, args=(i, stop, events), daemon=True) for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        events.get(timeout=120)
+    print(f"{args.workers} workers serving v{artifacts.read_manifest()['version']}, "
+          f"check interval {MODEL_RELOAD_CHECK_INTERVAL}s")
+
+    print(f"\n{'version':>8} {'train+publish s':>16} {'all swapped after s':>20}")
+    for _ in range(args.publishes):
+        t0 = time.time()
+        model, _ = train_model(save=True)
+        published = time.time()
+        version, pending = model.artifact_version_, set(range(args.workers))
+        while pending and time.time() - published < args.timeout:
+            try:
+                kind, idx, v, at = events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if kind == "swapped" and v == version:
+                pending.discard(idx)
+                last = at
+        rollout = f"{last - published:.2f}" if not pending else f"timeout ({len(pending)} left)"
+        print(f"{version:>8} {published - t0:>16.2f} {rollout:>20}")
+
+    stop.set()
+    print(f"\n{'worker':>6} {'requests':>9} {'failed':>7} {'slowest ms':>11}")
+    done = 0
+    while done < args.workers:
+        event = events.get(timeout=60)
+        if event[0] == "done":
+            _, idx, served, failed, slowest = event
+            print(f"{idx:>6} {served:>9} {failed:>7} {slowest * 1e3:>11.1f}")
+            done += 1
+    for p in procs:
+        p.join(timeout=10)
+    kept = sorted(p.name for p in MODEL_ARTIFACTS_DIR.glob("v*"))
+    print(f"\nversions on disk: {len(kept)} (MODEL_KEEP_VERSIONS={MODEL_KEEP_VERSIONS}): {' '.join(kept)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Single-message intent prediction: sklearn Pipeline.predict_proba vs the
+compact (.npy) model vs the lean dict + NumPy predictor, on the model
+trained from the knowledge base and on a larger synthetic one.
+
+    python -m benchmarks.bench_lean [--intents 200 --examples 40 --messages 2000]
+
+Also checks that the lean probabilities match the pipeline's and times a
+micro-batch of 32 through each predictor.
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from benchmarks.bench_model_format import synthetic_data
+from chatbot.compact import export_pipeline, CompactIntentModel
+from chatbot.db import init_db
+from chatbot.lean import LeanIntentModel
+from chatbot.nlp import normalize
+from chatbot.training import train_model, load_training_data
+
+
+def per_call_us(fn, items, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - t0) / (repeat * len(items)) * 1e6
+
+
+def compare(name, model, messages):
+    with tempfile.TemporaryDirectory() as tmp:
+        export_pipeline(model, tmp)
+        compact = CompactIntentModel.load(tmp)
+        lean = LeanIntentModel.from_pipeline(model)
+        diff = np.abs(lean.predict_proba(messages) - model.predict_proba(messages)).max()
+
+        single = {
+            "pipeline": per_call_us(lambda t: model.predict_proba([t]), messages),
+            "compact": per_call_us(lambda t: compact.predict_proba([t]), messages),
+            "lean": per_call_us(lean.proba_one, messages),
+        }
+        batches = [messages[i:i + 32] for i in range(0, len(messages) - 31, 32)]
+        batch = {
+            "pipeline": per_call_us(model.predict_proba, batches),
+            "compact": per_call_us(compact.predict_proba, batches),
+            "lean": per_call_us(lean.predict_proba, batches),
+        }
+    n_features = len(lean.vocabulary)
+    print(f"\n{name}: {len(lean.classes_)} intents, {n_features} features, max |diff| {diff:.3g}")
+    print(f"{'predictor':<10} {'1 msg us':>9} {'32 msgs us':>11}")
+    for key in single:
+        print(f"{key:<10} {single[key]:>9.1f} {batch[key]:>11.1f}")
+    print(f"lean speedup on one message: {single['pipeline'] / single['lean']:.1f}x")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--intents", type=int, default=200)
+    ap.add_argument("--examples", type=int, default=40)
+    ap.add_argument("--messages", type=int, default=2000)
+    args = ap.parse_args()
+
+    init_db()
+    model, _ = train_model(save=False)
+    X, _ = load_training_data()
+    rng = random.Random(7)
+    words = " ".join(X).split()
+    messages = [" ".join(rng.choices(words, k=rng.randint(2, 10))) for _ in range(args.messages)]
+    compare("knowledge-base model", model, [normalize(m) for m in messages])
+
+    X, y = synthetic_data(args.intents, args.examples, random.Random(42))
+    model = Pipeline([
+        ("vec", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
+        ("clf", LogisticRegression(max_iter=1000)),
+    ]).fit(X, y)
+    compare("synthetic model", model, rng.sample(X, min(args.messages, len(X))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Pickled Pipeline vs compact (.npy, memory-mapped) model: load time, memory
+and first-prediction latency, each measured in a fresh interpreter, plus a
+check that both give the same predict_proba.
+
+    python -m benchmarks.bench_model_format [--intents 200 --examples 40 --runs 5]
+
+A synthetic intent set (Zipf-distributed words, uni+bigrams) stands in for a
+grown knowledge base so the vocabulary and coefficient matrix are realistic
+in size. RssAnon is private memory; RssFile is file-backed pages that the
+kernel shares between every worker mapping the same model.
+"""
+import argparse
+import itertools
+import json
+import pickle
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from chatbot.compact import export_pipeline, CompactIntentModel
+
+PROBE = r"""
+import json, sys, time
+import numpy, scipy.sparse, sklearn.pipeline, sklearn.linear_model, sklearn.feature_extraction.text
+
+def rss():
+    with open("/proc/self/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return {k: int(fields[k].split()[0]) for k in ("VmRSS", "RssAnon", "RssFile")}
+
+fmt, path = sys.argv[1], sys.argv[2]
+before = rss()
+t0 = time.perf_counter()
+if fmt == "pickle":
+    import pickle
+    with open(path, "rb") as f:
+        model = pickle.load(f)
+else:
+    from chatbot.compact import CompactIntentModel
+    model = CompactIntentModel.load(path)
+t1 = time.perf_counter()
+model.predict_proba(["what are the loan rates for students"])
+t2 = time.perf_counter()
+after = rss()
+print(json.dumps({
+    "load_ms": (t1 - t0) * 1e3,
+    "first_predict_ms": (t2 - t1) * 1e3,
+    **{f"{k}_mb": (after[k] - before[k]) / 1024 for k in after},
+}))
+"""
+
+
+def synthetic_data(n_intents, n_examples, rng):
+    vocab = [f"w{i}" for i in range(20000)]
+    cum = list(itertools.accumulate(1.0 / (r + 1) for r in range(len(vocab))))
+    X, y = [], []
+    for c in range(n_intents):
+        topic = rng.sample(vocab[200:], 15)  # intent-specific words on top of common ones
+        for _ in range(n_examples):
+            words = rng.choices(vocab, cum_weights=cum, k=rng.randint(3, 8)) + rng.sample(topic, 3)
+            rng.shuffle(words)
+            X.append(" ".join(words))
+            y.append(f"intent_{c}")
+    return X, y
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--intents", type=int, default=200)
+    ap.add_argument("--examples", type=int, default=40)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    X, y = synthetic_data(args.intents, args.examples, rng)
+    t0 = time.perf_counter()
+    model = Pipeline([
+        ("vec", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
+        ("clf", LogisticRegression(max_iter=1000)),
+    ]).fit(X, y)
+    n_features = len(model.named_steps["vec"].vocabulary_)
+    print(f"trained {args.intents} intents x {args.examples} examples, "
+          f"{n_features} features in {time.perf_counter() - t0:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl, npy = Path(tmp) / "model.pkl", Path(tmp) / "model"
+        with open(pkl, "wb") as f:
+            pickle.dump(model, f)
+        export_pipeline(model, npy)
+        size_mb = {
+            "pickle": pkl.stat().st_size / 2**20,
+            "compact": sum(p.stat().st_size for p in npy.iterdir()) / 2**20,
+        }
+
+        sample = X[:: max(1, len(X) // 500)] + ["", "unseen words only", "W1 w2 W3"]
+        diff = np.abs(model.predict_proba(sample) - CompactIntentModel.load(npy).predict_proba(sample)).max()
+        print(f"max |predict_proba difference| over {len(sample)} texts: {diff:.3g}\n")
+
+        print(f"{'format':<8} {'disk MB':>8} {'load ms':>8} {'1st pred ms':>12} "
+              f"{'RSS MB':>7} {'RssAnon MB':>11} {'RssFile MB':>11}")
+        for fmt, path in (("pickle", pkl), ("compact", npy)):
+            runs = []
+            for _ in range(args.runs):
+                out = subprocess.run([sys.executable, "-c", PROBE, fmt, str(path)],
+                                     capture_output=True, text=True, check=True)
+                runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            med = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+            print(f"{fmt:<8} {size_mb[fmt]:>8.1f} {med['load_ms']:>8.1f} {med['first_predict_ms']:>12.2f} "
+                  f"{med['VmRSS_mb']:>7.1f} {med['RssAnon_mb']:>11.1f} {med['RssFile_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Bulk normalization of a training corpus: per-row normalize() (as
+load_training_data did) vs normalize_many(), single process and with a
+process pool, on synthetic utterances.
+
+    python -m benchmarks.bench_normalize [--rows 1000000 --distinct 200000 --workers 4]
+
+Messages are drawn with repetition from a pool of distinct questions and get
+random casing/punctuation, as logged traffic does. Checks that every method
+returns exactly the per-row output.
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks.bench_retrieval import sentence
+from chatbot import nlp
+
+PUNCT = ["", "", "?", "!", ".", "??", " :)"]
+
+
+def corpus(rows, distinct, rng):
+    pool = [sentence(rng, rng.randint(3, 12)) for _ in range(distinct)]
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(distinct)]
+    texts = []
+    for base in rng.choices(pool, weights=weights, k=rows):
+        if rng.random() < 0.3:
+            base = base.capitalize()
+        texts.append(base + rng.choice(PUNCT))
+    return texts
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--distinct", type=int, default=200_000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    texts = corpus(args.rows, args.distinct, random.Random(42))
+    nlp.warmup(download=False)
+    lemmatizer = type(nlp._get_lemmatizer()).__name__
+    print(f"{len(texts)} messages, {len(set(texts))} distinct, lemmatizer {lemmatizer}, "
+          f"{os.cpu_count()} cores")
+
+    nlp.clear_caches()
+    expected, per_row = timed(lambda: [nlp.normalize(t) for t in texts])
+    results = [("per-row normalize", per_row, True)]
+
+    out, secs = timed(lambda: nlp.normalize_many(texts, workers=1))
+    results.append(("normalize_many", secs, out == expected))
+
+    if args.workers > 1:
+        nlp.NORMALIZE_PARALLEL_MIN = 0  # force the process pool at any size
+        out, secs = timed(lambda: nlp.normalize_many(texts, workers=args.workers))
+        results.append((f"normalize_many x{args.workers}", secs, out == expected))
+
+    print(f"{'method':<22} {'seconds':>8} {'rows/s':>11} {'speedup':>8} {'identical':>9}")
+    for name, secs, same in results:
+        print(f"{name:<22} {secs:>8.2f} {len(texts) / secs:>11,.0f} {per_row / secs:>7.1f}x {str(same):>9}")
+
+
+if __name__ == "__main__":
+    main()
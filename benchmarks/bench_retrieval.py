@@ -0,0 +1,100 @@
+"""
+Learned-answer retrieval: lookup latency versus index size for the inverted
+LearnedAnswerIndex, compared with a brute-force scan over every stored
+question, plus build, incremental-add and memory-mapped load times.
+
+    python -m benchmarks.bench_retrieval [--sizes 10000 100000 300000]
+"""
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from chatbot.nlp import normalize
+from chatbot.retrieval import LearnedAnswerIndex, N_FEATURES, vectorize
+
+WORDS = (
+    "account loan rate branch open atm card balance transfer fee saving current "
+    "deposit interest home auto personal student senior weekend weekday hour "
+    "statement cheque online mobile app pin block limit credit debit overdraft "
+    "how what when where can i my the a to for is do close change report lost "
+    "international swift iban cash withdraw apply approve reset password"
+).split()
+# Zipf-like vocabulary: the banking words above are the most frequent,
+# followed by a long tail, as in real questions
+VOCAB = WORDS + [f"term{i}" for i in range(20000)]
+ZIPF = [1.0 / (rank + 1) for rank in range(len(VOCAB))]
+
+
+def sentence(rng, n_words):
+    return " ".join(rng.choices(VOCAB, weights=ZIPF, k=n_words))
+
+
+def make_rows(n, rng):
+    for i in range(n):
+        yield ("learned", i), sentence(rng, rng.randint(4, 10)), f"answer {i}"
+
+
+def percentiles_us(fn, queries):
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - t0) * 1e6)
+    return np.percentile(times, 50), np.percentile(times, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    ap.add_argument("--queries", type=int, default=500)
+    args = ap.parse_args()
+
+    print(f"{'rows':>7} {'build s':>8} {'load ms':>8} {'add us':>7} "
+          f"{'p50 us':>7} {'p99 us':>7} {'scan p50 us':>12} {'hits':>5}")
+    for n in args.sizes:
+        rng = random.Random(n)
+        rows = list(make_rows(n, rng))
+        # half the queries are taught questions, half unrelated ones
+        queries = [normalize(rows[rng.randrange(n)][1]) for _ in range(args.queries // 2)]
+        queries += [sentence(rng, 6) for _ in range(args.queries - len(queries))]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            t0 = time.perf_counter()
+            built = LearnedAnswerIndex(tmp, from_db=False)
+            built.add_many(rows)
+            built.save()
+            build_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            index = LearnedAnswerIndex(tmp, from_db=False)
+            len(index.search("warm up"))
+            load_ms = (time.perf_counter() - t0) * 1e3
+
+            t0 = time.perf_counter()
+            for i in range(200):
+                index.add_many([(("learned", n + i), f"how do i order a {i} chequebook", "x")])
+            add_us = (time.perf_counter() - t0) / 200 * 1e6
+
+            p50, p99 = percentiles_us(index.lookup, queries)
+            hits = sum(index.lookup(q) is not None for q in queries)
+
+            # brute force: every stored question against the query
+            docs = built._state.docs
+
+            def scan(q):
+                ids, weights = vectorize(q)
+                dense = np.zeros(N_FEATURES, dtype=np.float32)
+                dense[ids] = weights
+                return (docs @ dense).max()
+
+            scan50, _ = percentiles_us(scan, queries[:50])
+
+        print(f"{n:>7} {build_s:>8.1f} {load_ms:>8.1f} {add_us:>7.0f} "
+              f"{p50:>7.0f} {p99:>7.0f} {scan50:>12.0f} {hits:>5}")
+
+
+if __name__ == "__main__":
+    main()
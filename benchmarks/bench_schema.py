@@ -0,0 +1,118 @@
+"""
+Query latency on a synthetic analytics-scale database before and after the
+schema migrations (indexes) in chatbot/db.py.
+
+    python -m benchmarks.bench_schema [--rows 10000000] [--keep path.db]
+
+Builds the database in a temp directory (about 1 GB at 10M rows; use --rows
+to scale down). Feedback covers 2% of interactions and user_learned_qa has
+rows/50 entries.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("BANKING_DB_PATH", str(Path(_tmp.name) / "bench.db"))
+
+from chatbot import db  # noqa: E402
+
+POPULATE = [
+    """
+    WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :rows)
+    INSERT INTO interactions(user_text, bot_intent, confidence, bot_answer, created_at)
+    SELECT 'message ' || (x % 5000),
+           CASE x % 7 WHEN 0 THEN 'loan_rates' WHEN 1 THEN 'branch_hours' ELSE 'greeting' END,
+           (x % 100) / 100.0,
+           'answer ' || (x % 50),
+           strftime('%Y-%m-%dT%H:%M:%S', '2024-01-01', '+' || (x * 3) || ' seconds')
+    FROM c
+    """,
+    """
+    INSERT INTO feedback(interaction_id, helpful, correction_intent, corrected_answer, approved, created_at)
+    SELECT id, id % 2, CASE WHEN id % 3 = 0 THEN 'loan_rates' END, NULL,
+           CASE WHEN (id / 50) % 10 = 0 THEN 0 ELSE 1 END, created_at
+    FROM interactions WHERE id % 50 = 0
+    """,
+    """
+    WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :rows / 50)
+    INSERT INTO user_learned_qa(question, answer, approved, created_at)
+    SELECT 'question ' || x, 'answer ' || x, CASE WHEN x % 100 = 0 THEN 0 ELSE 1 END, '2024-06-01'
+    FROM c
+    """,
+]
+
+
+def q_feedback_training():
+    return len(db.get_feedback_training_data())
+
+
+def q_unapproved_learned():
+    return len(db.list_user_learned(only_unapproved=True))
+
+
+def q_last_day():
+    con = db.get_connection()
+    latest = con.execute("SELECT MAX(created_at) FROM interactions").fetchone()[0]
+    return con.execute(
+        "SELECT COUNT(*) FROM interactions WHERE created_at >= datetime(?, '-1 day')", (latest,)
+    ).fetchone()[0]
+
+
+def q_delete_interaction():
+    # FK cascade has to find the interaction's feedback rows
+    con = db.get_connection()
+    con.execute("BEGIN")
+    try:
+        con.execute("DELETE FROM interactions WHERE id = 50")
+    finally:
+        con.rollback()
+    return 1
+
+
+QUERIES = [
+    ("get_feedback_training_data", q_feedback_training),
+    ("list_user_learned(unapproved)", q_unapproved_learned),
+    ("interactions in last day", q_last_day),
+    ("delete one interaction", q_delete_interaction),
+]
+
+
+def measure(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    args = ap.parse_args()
+
+    con = db.get_connection()
+    con.executescript(db.SCHEMA)  # baseline schema, no migrations yet
+    t0 = time.perf_counter()
+    with con:
+        for sql in POPULATE:
+            con.execute(sql, {"rows": args.rows})
+    print(f"populated {args.rows:,} interactions in {time.perf_counter() - t0:.1f}s ({db.DB_PATH})\n")
+
+    before = {name: measure(fn) for name, fn in QUERIES}
+    t0 = time.perf_counter()
+    version = db.apply_migrations()
+    print(f"migrated to schema v{version} in {time.perf_counter() - t0:.1f}s\n")
+    after = {name: measure(fn) for name, fn in QUERIES}
+
+    print(f"{'query':<32} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name, _ in QUERIES:
+        print(f"{name:<32} {before[name]:>10.1f} {after[name]:>10.1f} {before[name] / max(after[name], 1e-3):>7.1f}x")
+    db.close_all()
+
+
+if __name__ == "__main__":
+    main()
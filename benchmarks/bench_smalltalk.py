@@ -0,0 +1,68 @@
+"""
+Smalltalk matching cost versus pattern count: the old per-row substring
+scan against the compiled SmalltalkMatcher.
+
+    python -m benchmarks.bench_smalltalk [--patterns 100 1000 5000]
+"""
+import argparse
+import random
+import time
+
+from chatbot.matcher import SmalltalkMatcher
+
+WORDS = (
+    "account loan rate branch open atm card balance transfer fee saving current "
+    "deposit interest home auto personal student senior weekend weekday hour "
+    "statement cheque online mobile app pin block limit credit debit overdraft"
+).split()
+
+
+def linear_scan(rows, text_norm):
+    for pattern, response in rows:
+        patt = pattern.lower().strip("%")
+        if patt and patt in text_norm:
+            return response
+    return None
+
+
+def make_rows(n, rng):
+    rows = []
+    for i in range(n):
+        phrase = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 3)))
+        rows.append((f"%{phrase} x{i}%", f"response {i}"))  # unique, rarely matching
+    rows.append(("%hello%", "Hello!"))
+    return rows
+
+
+def per_message_us(fn, messages, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for m in messages:
+            fn(m)
+    return (time.perf_counter() - t0) / (repeat * len(messages)) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--patterns", type=int, nargs="+", default=[100, 1000, 5000])
+    ap.add_argument("--messages", type=int, default=200)
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    messages = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) for _ in range(args.messages)]
+    messages += ["hello there", "this is about shipping"]
+
+    print(f"{'patterns':>8} {'build ms':>9} {'scan us/msg':>12} {'matcher us/msg':>15} {'speedup':>8}")
+    for n in args.patterns:
+        rows = make_rows(n, rng)
+        t0 = time.perf_counter()
+        matcher = SmalltalkMatcher(rows)
+        build_ms = (time.perf_counter() - t0) * 1e3
+        repeat = max(1, 20000 // n)
+        scan = per_message_us(lambda m: linear_scan(rows, m), messages, repeat)
+        fast = per_message_us(matcher.match, messages, repeat * 10)
+        print(f"{n:>8} {build_ms:>9.1f} {scan:>12.1f} {fast:>15.2f} {scan / fast:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Typo correction (spelling.py): accuracy with and without it, what it adds to
+a chat turn, and how lookups scale with the dictionary.
+
+    python -m benchmarks.bench_spelling [--typo-messages 2000 --dictionary 100000]
+
+Accuracy is measured with CONFIDENCE_THRESHOLD applied, as served: on
+tests/test_cases.csv (rows without an expected intent must go unanswered)
+and on intent examples with one or two random typos per message (a dropped,
+doubled, swapped or replaced letter in a word of 4+ letters). "answered" is
+the share of typo messages given an intent. "clean changed" counts intent
+examples without typos whose answer differs with correction on, i.e. false
+corrections. The response cache is off, so every message goes through the
+whole pipeline. Latency covers the correction on its own and a full chat
+turn, with the stage on and off.
+The last table times misspelled-word lookups against synthetic dictionaries
+of growing size.
+"""
+import argparse
+import random
+import string
+import tempfile
+import time
+from pathlib import Path
+
+from chatbot import inference, response_cache, spelling
+from chatbot.bench import csv_cases, _correct
+from chatbot.db import init_db
+from chatbot.nlp import normalize, warmup
+from chatbot.training import example_rows, load_or_train_model
+
+
+def typo(word, rng):
+    i = rng.randrange(1, len(word))  # keep the first letter, as most real typos do
+    kind = rng.choice(("drop", "double", "swap", "replace"))
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    if kind == "double":
+        return word[:i] + word[i] + word[i:]
+    if kind == "swap" and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def typo_messages(n, rng):
+    messages = []
+    rows = example_rows()
+    while len(messages) < n:
+        text, intent = rng.choice(rows)
+        words = text.lower().split()
+        long_words = [i for i, w in enumerate(words) if len(w) >= 4 and w.isalpha()]
+        if not long_words:
+            continue
+        for i in rng.sample(long_words, min(len(long_words), rng.randint(1, 2))):
+            words[i] = typo(words[i], rng)
+        messages.append((" ".join(words), intent))
+    return messages
+
+
+def answers(model, texts):
+    return [inference.infer_intent_and_answer(model, text)[0] for text in texts]
+
+
+def accuracy(cases, got):
+    return sum(_correct(expected, intent) for (_, expected), intent in zip(cases, got)) / len(cases)
+
+
+def per_message_us(fn, texts, repeat=3):
+    best = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best.append((time.perf_counter() - t0) / len(texts) * 1e6)
+    return min(best)
+
+
+def random_word(rng):
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--typo-messages", type=int, default=2000)
+    ap.add_argument("--dictionary", type=int, default=100_000, help="largest synthetic dictionary")
+    args = ap.parse_args()
+    rng = random.Random(42)
+
+    init_db()
+    warmup(download=False)
+    model, _ = load_or_train_model()
+    response_cache.ENABLED = False
+
+    t0 = time.perf_counter()
+    index = spelling.build_for_model(model)
+    build = time.perf_counter() - t0
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(Path(tmp))
+        t0 = time.perf_counter()
+        spelling.SpellingIndex.load(Path(tmp))
+        load = time.perf_counter() - t0
+    print(f"dictionary {index.meta['n_words']} words, {len(index.keys)} delete keys: "
+          f"build {build * 1e3:.1f} ms, load {load * 1e3:.1f} ms")
+
+    csv_rows = csv_cases()
+    typos = typo_messages(args.typo_messages, rng)
+    clean = [text for text, _ in rng.sample(example_rows(), min(args.typo_messages, len(example_rows())))]
+    norms = [normalize(t) for t, _ in csv_rows + typos]
+
+    results, clean_got = {}, {}
+    for label, enabled in (("off", False), ("on", True)):
+        spelling.SPELL_CORRECTION = enabled
+        spelling._indexes.clear()
+        spelling.for_model(model)
+        typo_got = answers(model, [t for t, _ in typos])
+        clean_got[label] = answers(model, clean)
+        results[label] = {
+            "csv": accuracy(csv_rows, answers(model, [t for t, _ in csv_rows])),
+            "typos": accuracy(typos, typo_got),
+            "answered": sum(intent is not None for intent in typo_got) / len(typos),
+            "turn_us": per_message_us(lambda t: inference._infer_normalized(model, t), norms),
+        }
+    changed = sum(a != b for a, b in zip(clean_got["off"], clean_got["on"]))
+    correct_us = per_message_us(index.correct, norms)
+    index._cache.clear()
+    cold_us = per_message_us(index.correct, norms, repeat=1)
+
+    print(f"\n{'correction':<11} {'csv acc':>8} {'typo acc':>9} {'answered':>9} {'turn us':>8}")
+    for label, r in results.items():
+        print(f"{label:<11} {r['csv']:>8.1%} {r['typos']:>9.1%} {r['answered']:>9.1%} {r['turn_us']:>8.1f}")
+    print(f"gain: csv {results['on']['csv'] - results['off']['csv']:+.1%}, "
+          f"typos {results['on']['typos'] - results['off']['typos']:+.1%}; "
+          f"clean changed {changed}/{len(clean)}; "
+          f"correction {cold_us:.1f} us/message cold, {correct_us:.1f} us warm")
+
+    print(f"\n{'dictionary':>10} {'keys':>10} {'build s':>8} {'lookup us':>10}")
+    size = 1000
+    while size <= args.dictionary:
+        words = {random_word(rng): rng.randint(1, 100) for _ in range(size)}
+        t0 = time.perf_counter()
+        big = spelling.SpellingIndex.build(words)
+        built = time.perf_counter() - t0
+        probes = [typo(w, rng) for w in rng.sample(sorted(words), 500)]
+        lookup_us = per_message_us(big._lookup, probes, repeat=1)
+        print(f"{size:>10} {len(big.keys):>10} {built:>8.2f} {lookup_us:>10.1f}")
+        size *= 10
+
+
+if __name__ == "__main__":
+    main()
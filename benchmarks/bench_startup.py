@@ -0,0 +1,58 @@
+"""
+Cold-start cost: importing chatbot.nlp / chatbot.inference, warmup(), and
+the first normalize() call, each measured in a fresh interpreter.
+
+    python -m benchmarks.bench_startup [--runs 5] [--max-import-ms 300]
+
+Exits non-zero when the median import time exceeds --max-import-ms, so it
+can guard against startup regressions (e.g. NLTK imported eagerly again).
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import chatbot.nlp as nlp
+import chatbot.inference
+t1 = time.perf_counter()
+nlp.normalize("What are your loan rates?")
+t2 = time.perf_counter()
+nlp.warmup()
+t3 = time.perf_counter()
+nlp.normalize("When does the branch open?")
+t4 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1e3,
+    "first_normalize_ms": (t2 - t1) * 1e3,
+    "warmup_ms": (t3 - t2) * 1e3,
+    "warm_normalize_ms": (t4 - t3) * 1e3,
+}))
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--max-import-ms", type=float, default=None)
+    args = ap.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    medians = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+    for k, v in medians.items():
+        print(f"{k:<20} {v:9.2f} ms")
+
+    if args.max_import_ms is not None and medians["import_ms"] > args.max_import_ms:
+        print(f"FAIL: import took {medians['import_ms']:.1f} ms > {args.max_import_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
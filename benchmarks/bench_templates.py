@@ -0,0 +1,77 @@
+"""
+Reply lookup cost versus intent count: an if-chain like the old
+inference.respond_for_intent (one branch per intent, get_fact calls per
+reply) against the pre-rendered response template registry.
+
+    python -m benchmarks.bench_templates [--intents 7 100 1000 5000]
+
+The chain is generated code with the same shape as the old function, and
+get_fact is a plain dict lookup, which flatters it. The registry is the one
+knowledge.py builds: "compile" is the time to render every template, paid
+once per knowledge-base reload, never per message.
+"""
+import argparse
+import random
+import time
+
+from chatbot.knowledge import compile_templates
+
+
+def make_templates(n, rng):
+    facts, rows = {}, []
+    for i in range(n):
+        keys = [f"fact_{i}_{j}" for j in range(rng.randint(0, 3))]
+        for key in keys:
+            facts[key] = f"value {key}"
+        body = ", ".join(f"{{{key}}}" for key in keys)
+        rows.append((f"intent_{i}", f"Reply for intent {i}: {body}.", None, None))
+    return rows, facts
+
+
+def if_chain(rows, facts):
+    lines = ["def respond_for_intent(intent):"]
+    for intent, template, _, _ in rows:
+        lines.append(f"    if intent == {intent!r}:")
+        keys = [k for k in facts if k.startswith(f"fact_{intent[7:]}_")]
+        for j, key in enumerate(keys):
+            lines.append(f"        v{j} = get_fact({key!r}) or 'N/A'")
+        args = ", ".join(f"{key}=v{j}" for j, key in enumerate(keys))
+        lines.append(f"        return {template!r}.format({args})")
+    lines.append("    return None")
+    namespace = {"get_fact": facts.get}
+    exec("\n".join(lines), namespace)
+    return namespace["respond_for_intent"]
+
+
+def per_call_us(fn, intents, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for intent in intents:
+            fn(intent)
+    return (time.perf_counter() - t0) / (repeat * len(intents)) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--intents", type=int, nargs="+", default=[7, 100, 1000, 5000])
+    ap.add_argument("--calls", type=int, default=20000)
+    args = ap.parse_args()
+    rng = random.Random(42)
+
+    print(f"{'intents':>8} {'if-chain us':>12} {'registry us':>12} {'speedup':>8} {'compile ms':>11} {'same':>5}")
+    for n in args.intents:
+        rows, facts = make_templates(n, rng)
+        chain = if_chain(rows, facts)
+        t0 = time.perf_counter()
+        responses, errors = compile_templates(rows, facts)
+        compile_ms = (time.perf_counter() - t0) * 1e3
+        intents = [f"intent_{rng.randrange(n)}" for _ in range(1000)]
+        repeat = max(1, args.calls // len(intents))
+        same = all(chain(i) == responses.get(i) for i in set(intents)) and not errors
+        old = per_call_us(chain, intents, max(1, repeat // max(1, n // 100)))
+        new = per_call_us(responses.get, intents, repeat)
+        print(f"{n:>8} {old:>12.2f} {new:>12.3f} {old / new:>7.0f}x {compile_ms:>11.1f} {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
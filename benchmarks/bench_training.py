@@ -0,0 +1,100 @@
+"""
+Accuracy and training time: the full TF-IDF + LogisticRegression refit
+versus the incremental hashing + SGD model (chatbot/online.py).
+
+Uses a temporary copy of data/banking_knowledge.db, optionally padded with
+synthetic utterances. The last --stream rows of the training split play the
+role of newly arrived feedback corrections.
+
+    python -m benchmarks.bench_training [--synthetic 20000] [--stream 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.TemporaryDirectory()
+_db = Path(_tmp.name) / "bench.db"
+shutil.copy(Path(__file__).resolve().parent.parent / "data" / "banking_knowledge.db", _db)
+os.environ["BANKING_DB_PATH"] = str(_db)
+os.environ["BANKING_MODEL_DIR"] = _tmp.name
+
+from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.model_selection import train_test_split  # noqa: E402
+from sklearn.pipeline import Pipeline  # noqa: E402
+
+from chatbot import online  # noqa: E402
+from chatbot.training import load_training_data  # noqa: E402
+
+FILLER = "please can you tell me i want to know about the my today now hey ok".split()
+
+
+def synthesize(X, y, n, rng):
+    Xs, ys = [], []
+    for _ in range(n):
+        i = rng.randrange(len(X))
+        words = X[i].split() + rng.sample(FILLER, rng.randint(0, 4))
+        rng.shuffle(words)
+        Xs.append(" ".join(words))
+        ys.append(y[i])
+    return Xs, ys
+
+
+def accuracy(model, X, y):
+    return sum(p == t for p, t in zip(model.predict(X), y)) / len(y)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--synthetic", type=int, default=20000, help="extra synthetic rows")
+    ap.add_argument("--stream", type=int, default=200, help="rows treated as new feedback")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    X, y = load_training_data()
+    Xs, ys = synthesize(X, y, args.synthetic, rng)
+    X, y = X + Xs, y + ys
+    Xtr, Xte, ytr, yte = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    base_X, base_y = Xtr[:-args.stream], ytr[:-args.stream]
+    new_X, new_y = Xtr[-args.stream:], ytr[-args.stream:]
+
+    def full_fit():
+        m = Pipeline([
+            ("vec", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
+            ("clf", LogisticRegression(max_iter=1000)),
+        ])
+        return m.fit(Xtr, ytr)
+
+    def online_rebuild():
+        return online._build_pipeline().fit(Xtr, ytr)
+
+    base = online._build_pipeline().fit(base_X, base_y)
+
+    def online_update():
+        online._fit_epochs(base, new_X, new_y, online.ONLINE_UPDATE_EPOCHS)
+        return base
+
+    print(f"{len(Xtr)} training rows ({args.stream} arriving as feedback), {len(Xte)} test rows, "
+          f"{len(set(y))} intents\n")
+    print(f"{'mode':<36} {'train s':>9} {'accuracy':>9}")
+    for name, fn in (
+        ("full refit (TF-IDF + LogReg)", full_fit),
+        ("incremental: full rebuild", online_rebuild),
+        (f"incremental: fold in {args.stream} new rows", online_update),
+    ):
+        model, secs = timed(fn)
+        print(f"{name:<36} {secs:>9.3f} {accuracy(model, Xte, yte):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
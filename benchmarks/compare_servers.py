@@ -0,0 +1,82 @@
+"""
+Flask (app_web.py) vs asyncio (app_async.py) under the same chat load.
+
+    python -m benchmarks.compare_servers [--clients 16 256 2000] [--requests 4000]
+
+Starts each server in turn on --port, drives /api/chat with the asyncio
+load-test client at each level of concurrent keep-alive connections, and
+prints throughput, p50/p99 latency and errors side by side. Point
+BANKING_DB_PATH / BANKING_MODEL_DIR at a scratch copy: every request is
+logged to the interactions table.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.load_test import percentile, run_clients
+from chatbot.config import BASE_DIR
+
+SERVERS = {
+    "flask": [sys.executable, "app_web.py"],
+    "async": [sys.executable, "app_async.py"],
+}
+
+
+def wait_for_port(port: int, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"server did not start listening on :{port}")
+
+
+def run_server(name: str, port: int, levels, requests: int):
+    proc = subprocess.Popen(SERVERS[name], cwd=BASE_DIR, env=os.environ.copy(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows = []
+    try:
+        wait_for_port(port)
+        url = f"http://127.0.0.1:{port}/api/chat"
+        asyncio.run(run_clients(url, 8, 200))  # warm up
+        for clients in levels:
+            latencies, errors, elapsed = asyncio.run(run_clients(url, clients, max(requests, clients)))
+            lat = sorted(latencies)
+            rows.append((name, clients, len(lat) / elapsed, percentile(lat, 50) * 1e3,
+                         percentile(lat, 99) * 1e3, errors))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--clients", type=int, nargs="+", default=[16, 256, 2000])
+    ap.add_argument("--requests", type=int, default=4000, help="requests per level")
+    ap.add_argument("--port", type=int, default=5000, help="the port both servers listen on")
+    ap.add_argument("--servers", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    args = ap.parse_args()
+
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    rows = []
+    for name in args.servers:
+        rows += run_server(name, args.port, args.clients, args.requests)
+    print(f"{'server':<7} {'clients':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, clients, rps, p50, p99, errors in rows:
+        print(f"{name:<7} {clients:>7} {rps:>9.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
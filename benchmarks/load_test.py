@@ -0,0 +1,135 @@
+"""
+Load test for the chat API: N concurrent clients POSTing to /api/chat.
+
+Start the server first (python app_web.py, python app_async.py, or a WSGI
+server), then:
+
+    python -m benchmarks.load_test [--url http://127.0.0.1:5000] [--concurrency 16] [--requests 2000]
+    python -m benchmarks.load_test --clients 2000 --requests 20000
+
+Reports requests/s and p50/p90/p99 latency. --clients switches to an asyncio
+client that holds that many keep-alive connections open at once (one thread
+per client doesn't scale to thousands).
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MESSAGES = [
+    "hello", "what is the loan interest rate", "when does the branch open",
+    "is there an atm near me", "what account types do you have", "thanks", "bye",
+    "do you offer student savings", "home loan rate today", "branch timing on saturday",
+]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def one_request(url, message):
+    body = json.dumps({"message": message}).encode()
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        resp.read()
+    return time.perf_counter() - t0
+
+
+async def _client(host, port, path, messages, latencies, counters):
+    """One keep-alive connection sending requests until the shared budget runs out."""
+    reader = writer = None
+    while counters["left"] > 0:
+        counters["left"] -= 1
+        body = json.dumps({"message": messages[counters["left"] % len(messages)]}).encode()
+        head = (f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode()
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(head + body)
+            await writer.drain()
+            status = await reader.readline()
+            length, close = 0, status.startswith(b"HTTP/1.0")
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                elif name.lower() == "connection" and value.strip().lower() == "close":
+                    close = True
+            await reader.readexactly(length)
+            if not status.startswith(b"HTTP/1.1 200") and not status.startswith(b"HTTP/1.0 200"):
+                raise RuntimeError(status)
+            latencies.append(time.perf_counter() - t0)
+            if close:
+                writer.close()
+                reader = writer = None
+        except (OSError, RuntimeError, asyncio.IncompleteReadError, ValueError):
+            counters["errors"] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_clients(url, clients, requests):
+    """Returns (latencies, errors, elapsed) for `requests` spread over `clients` connections."""
+    parts = urllib.parse.urlsplit(url)
+    latencies, counters = [], {"left": requests, "errors": 0}
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(parts.hostname, parts.port or 80, parts.path, MESSAGES, latencies, counters)
+                           for _ in range(clients)))
+    return latencies, counters["errors"], time.perf_counter() - t0
+
+
+def run_threads(url, concurrency, requests):
+    latencies, errors = [], 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(one_request, url, MESSAGES[i % len(MESSAGES)]) for i in range(requests)]
+        for fut in futures:
+            try:
+                latencies.append(fut.result())
+            except Exception:
+                errors += 1
+    return latencies, errors, time.perf_counter() - t0
+
+
+def report(latencies, errors, elapsed):
+    lat = sorted(latencies)
+    print(f"requests   {len(lat) + errors} ({errors} errors)")
+    print(f"throughput {len(lat) / elapsed:,.1f} req/s")
+    print(f"mean       {statistics.mean(lat) * 1e3:8.2f} ms" if lat else "mean       n/a")
+    for p in (50, 90, 99):
+        print(f"p{p:<9} {percentile(lat, p) * 1e3:8.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--clients", type=int, default=0, help="asyncio keep-alive connections (instead of threads)")
+    args = ap.parse_args()
+
+    url = args.url.rstrip("/") + "/api/chat"
+    if args.clients:
+        report(*asyncio.run(run_clients(url, args.clients, args.requests)))
+    else:
+        report(*run_threads(url, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
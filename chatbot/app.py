@@ -1,11 +1,10 @@
-from .db import (
-    init_db,
-    record_user_learning,
-    record_interaction,
-    record_feedback,
-)
-from .training import train_model, load_model
+from .db import init_db, record_user_learning
+from .writebehind import record_interaction, record_feedback
+from .training import retrain, load_model, load_or_train_model
 from .inference import infer_intent_and_answer
+from .nlp import warmup
+from .metrics import format_summary
+from . import response_cache
 
 BANNER = """
 ============================
@@ -13,21 +12,30 @@ BANNER = """
 ============================
 Type your question, or:
   :help   Show commands
-  :train  Retrain ML model from DB examples
+  :train  Retrain ML model from DB examples (":train full" forces a rebuild)
+  :stats  Per-stage timings and per-intent confidence
   :quit   Exit
 """
 
 def handle_help():
-    print(":help   Show this message\n:train  Retrain model\n:quit   Exit\n")
+    print(":help   Show this message\n:train  Retrain model (:train full = from scratch)\n"
+          ":stats  Timings per stage, confidence per intent, response cache\n:quit   Exit\n")
 
 def main():
     print(BANNER)
     init_db()
 
-    # Try to train; if it fails, try loading an existing model
+    # Load NLTK data up front so the first question doesn't pay for it
+    missing = [name for name, ok in warmup(download=True).items() if not ok]
+    if missing:
+        print("Warning: NLTK resources unavailable:", ", ".join(missing))
+        print("Run `python -m chatbot.setup_nltk`; continuing without them.")
+
+    # Reuse the saved model if the training data is unchanged, else train;
+    # if that fails, try loading whatever model exists
     try:
-        model, report = train_model(save=True)
-        print("Model trained. Mini-report:\n" + report)
+        model, report = load_or_train_model()
+        print("Model ready. Mini-report:\n" + report)
     except Exception as e:
         print("Warning: Could not train model:", e)
         try:
@@ -55,9 +63,13 @@ def main():
             if cmd == "help":
                 handle_help()
                 continue
-            if cmd == "train":
+            if cmd == "stats":
+                print(format_summary())
+                print(response_cache.format_stats())
+                continue
+            if cmd in ("train", "train full"):
                 try:
-                    model, report = train_model(save=True)
+                    model, report = retrain(model, full=(cmd == "train full"))
                     print("Model retrained. Mini-report:\n" + report)
                 except Exception as e:
                     print("Training failed:", e)
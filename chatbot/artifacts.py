@@ -0,0 +1,265 @@
+"""
+Versioned model artifacts shared by every process on the host.
+
+Each save goes to a new directory under MODEL_ARTIFACTS_DIR:
+
+    models/
+      MANIFEST.json        {"version": 7, "path": "v000007", "fingerprint": ..., "format": ...}
+      v000006/             the previous model (kept for in-flight loads)
+      v000007/
+        intent_model/      compact export (or intent_model.pkl with MODEL_FORMAT=pickle)
+        spelling/          the spelling index for this model
+        meta.json          fingerprint, training rows, report
+
+A version is built in a temporary directory and renamed into place, then
+MANIFEST.json is replaced (temp file + os.replace) to point at it. A reader
+therefore sees either the old or the new manifest, and the directory a
+manifest names is always complete. Publishers replace the manifest while
+holding MANIFEST.lock, and only with a higher version, so of two concurrent
+publishes the newer one wins whichever finishes last. Versions are never
+modified after they are published.
+
+Serving processes notice a new version with ManifestWatcher: at most every
+MODEL_RELOAD_CHECK_INTERVAL seconds it stat()s the manifest, and only reads it
+when the file changed. serving.ModelHolder then loads the new version in the
+background and swaps it in. After a publish, all but the newest
+MODEL_KEEP_VERSIONS versions are deleted.
+"""
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from . import compact, spelling
+from .config import (
+    MODEL_ARTIFACTS_DIR,
+    MODEL_FORMAT,
+    MODEL_KEEP_VERSIONS,
+    MODEL_RELOAD_CHECK_INTERVAL,
+    SPELL_CORRECTION,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST = "MANIFEST.json"
+MANIFEST_LOCK = "MANIFEST.lock"
+_TMP_PREFIX = ".tmp-"
+_STALE_TMP_SECONDS = 3600  # leftovers of a crashed publish
+
+
+def _version_name(version: int) -> str:
+    return f"v{version:06d}"
+
+
+def _versions(root: Path) -> Dict[int, Path]:
+    found = {}
+    for p in root.glob("v*"):
+        if p.is_dir() and p.name[1:].isdigit():
+            found[int(p.name[1:])] = p
+    return found
+
+
+def tmp_path(root: Path) -> Path:
+    """A fresh name under `root` for a file or directory that is renamed into place once complete."""
+    # not tempfile.mkdtemp/mkstemp: their 0700/0600 modes would hide the files from other users
+    return root / f"{_TMP_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+
+def write_json_atomic(path: Path, data: dict) -> None:
+    """Replace `path` with `data` as JSON; readers see the old or the new file, never a partial one."""
+    tmp = tmp_path(path.parent)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock, across processes, on the lock file `path` (created if missing)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _update_manifest(root: Path, manifest: dict) -> bool:
+    """Point the manifest at `manifest` unless it already names a newer version; True if it did."""
+    with file_lock(root / MANIFEST_LOCK):
+        if read_manifest(root).get("version", 0) >= manifest["version"]:
+            return False
+        write_json_atomic(root / MANIFEST, manifest)
+        return True
+
+
+def read_manifest(root: Path = MODEL_ARTIFACTS_DIR) -> dict:
+    """The published manifest, or {} if nothing has been published (or it is unreadable)."""
+    try:
+        with open(Path(root) / MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) and "version" in manifest else {}
+
+
+def read_meta(manifest: dict, root: Path = MODEL_ARTIFACTS_DIR) -> dict:
+    try:
+        with open(Path(root) / manifest["path"] / "meta.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def publish(model, rows: int, report: str, root: Path = MODEL_ARTIFACTS_DIR) -> int:
+    """
+    Write `model` (and its spelling index) as a new version, point the
+    manifest at it and garbage-collect old versions. Returns the version.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    fingerprint = getattr(model, "fingerprint_", None)
+    tmp = tmp_path(root)
+    tmp.mkdir()
+    try:
+        if MODEL_FORMAT == "compact" and compact.supports(model):
+            fmt = "compact"
+            compact.export_pipeline(model, tmp / "intent_model", fingerprint)
+        else:
+            fmt = "pickle"
+            with open(tmp / "intent_model.pkl", "wb") as f:
+                pickle.dump(model, f)
+        if SPELL_CORRECTION:
+            spelling.build_for_model(model).save(tmp / "spelling")
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "rows": rows, "report": report, "format": fmt}, f, indent=2)
+
+        # Claim the next free version number; rename() fails if another publisher took it
+        version = max([read_manifest(root).get("version", 0), *_versions(root)], default=0) + 1
+        while True:
+            try:
+                os.rename(tmp, root / _version_name(version))
+                break
+            except OSError:
+                if not (root / _version_name(version)).exists():
+                    raise
+                version += 1
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    # A publisher that claimed a later version may have got here first; it stays current
+    _update_manifest(root, {
+        "version": version,
+        "path": _version_name(version),
+        "fingerprint": fingerprint,
+        "format": fmt,
+        "published_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    model.artifact_version_ = version
+    model.artifact_dir_ = root / _version_name(version)
+    gc(root)
+    return version
+
+
+def load(manifest: Optional[dict] = None, root: Path = MODEL_ARTIFACTS_DIR):
+    """Load the version `manifest` (default: the current one) names; FileNotFoundError if none."""
+    root = Path(root)
+    manifest = manifest or read_manifest(root)
+    if not manifest:
+        raise FileNotFoundError(f"no model published under {root}")
+    path = root / manifest["path"]
+    if manifest.get("format") == "compact":
+        model = compact.CompactIntentModel.load(path / "intent_model")
+    else:
+        with open(path / "intent_model.pkl", "rb") as f:
+            model = pickle.load(f)
+    model.fingerprint_ = manifest.get("fingerprint")
+    model.artifact_version_ = manifest["version"]
+    model.artifact_dir_ = path
+    return model
+
+
+def gc(root: Path = MODEL_ARTIFACTS_DIR, keep: int = MODEL_KEEP_VERSIONS) -> int:
+    """Delete all but the newest `keep` versions (never the current one) and stale temp dirs."""
+    root = Path(root)
+    current = read_manifest(root).get("version")
+    removed = 0
+    for version, path in sorted(_versions(root).items())[:-max(keep, 1)]:
+        if version != current:
+            # Processes still serving it keep their memory maps (POSIX); on Windows this may fail
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    remove_stale_tmp(root)
+    return removed
+
+
+def remove_stale_tmp(root: Path) -> None:
+    """Delete tmp_path() leftovers older than an hour (a crashed writer's)."""
+    cutoff = time.time() - _STALE_TMP_SECONDS
+    for p in Path(root).glob(_TMP_PREFIX + "*"):
+        try:
+            if p.stat().st_mtime < cutoff:
+                shutil.rmtree(p) if p.is_dir() else p.unlink()
+        except OSError:
+            pass
+
+
+class ManifestWatcher:
+    """
+    Throttled check for a newly published manifest. poll() costs a clock
+    read between checks and one stat() per interval; the manifest is only
+    read when its stat changed.
+    """
+
+    def __init__(self, root: Path = MODEL_ARTIFACTS_DIR, interval: float = MODEL_RELOAD_CHECK_INTERVAL):
+        self.path = Path(root) / MANIFEST
+        self.interval = interval
+        self._next_check = 0.0
+        self._stat = None
+
+    def due(self) -> bool:
+        return time.monotonic() >= self._next_check
+
+    def poll(self) -> Optional[dict]:
+        """The manifest if it changed since the last poll, else None."""
+        if not self.due():
+            return None
+        self._next_check = time.monotonic() + self.interval
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key == self._stat:
+            return None
+        self._stat = key
+        return read_manifest(self.path.parent) or None
+
+    def reset(self) -> None:
+        """Make the next poll re-read the manifest (e.g. after a failed load)."""
+        self._stat = None
@@ -0,0 +1,60 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+from .inference import infer_batch
+from .config import MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT
+
+
+class MicroBatcher:
+    """
+    Funnels concurrent single-message requests into infer_batch calls.
+
+    submit() enqueues a message and blocks until its result is ready. A
+    background thread takes the first waiting message, gathers more for up to
+    max_wait seconds (or until max_size), and scores them together. The model
+    is fetched through get_model() for every batch, so a swapped-in model is
+    picked up without restarting the batcher.
+    """
+
+    def __init__(
+        self,
+        get_model: Callable,
+        max_size: int = MICROBATCH_MAX_SIZE,
+        max_wait: float = MICROBATCH_MAX_WAIT,
+    ):
+        self.get_model = get_model
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="microbatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str, timeout: float = None) -> Dict:
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut.result(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while len(batch) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+
+            try:
+                results = infer_batch(self.get_model(), [text for text, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(result)
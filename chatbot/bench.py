@@ -0,0 +1,341 @@
+"""
+Accuracy and performance suite.
+
+    python -m chatbot.bench [--messages 5000] [--out results.json]
+                            [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Replays tests/test_cases.csv and a synthetic traffic mix (perturbed intent
+examples, smalltalk, off-topic chatter) through the answering pipeline and
+reports:
+
+- accuracy on the CSV and on the synthetic traffic (a row with a blank expected
+  intent is right only when the bot gives no answer)
+- per-stage latency (normalize, smalltalk, spelling, retrieval, predict, fact lookup,
+  DB write), p50/p95/mean in microseconds
+- end-to-end throughput of infer_intent_and_answer + record_interaction, with
+  the response cache off, and again with every message a cache hit
+- memory (peak and growth of the process RSS)
+
+Results are written as JSON. With a baseline file present, every metric is
+compared against it and the run exits with status 1 if any regressed by
+more than the tolerance. Interactions logged during the run are deleted
+again at the end.
+"""
+import argparse
+import csv
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import lean, response_cache, retrieval, spelling, writebehind
+from .db import init_db, get_connection, get_smalltalk_rows
+from .inference import (
+    infer_intent_and_answer,
+    respond_for_intent,
+    smalltalk_or_none,
+    _prefer_corrected,
+    _top_intents,
+)
+from .nlp import normalize, clear_caches
+from .training import example_rows, load_or_train_model
+from .config import BASE_DIR, CONFIDENCE_THRESHOLD
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CSV_PATH = BASE_DIR / "tests" / "test_cases.csv"
+BASELINE_PATH = BASE_DIR / "benchmarks" / "baseline.json"
+STAGES = ["normalize", "smalltalk", "spelling", "retrieval", "predict", "fact_lookup", "db_write"]
+
+# The smalltalk tier answers these intents before the classifier sees them
+SMALLTALK_INTENTS = {"greeting", "goodbye", "thanks"}
+
+OFF_TOPIC = [
+    "what is the weather like tomorrow", "recommend a good movie", "how tall is mount everest",
+    "tell me a joke about cats", "who won the football match", "translate this to french",
+]
+# Stage latencies are a few microseconds; differences below this are timer noise
+LATENCY_SLACK_US = 10.0
+
+FILLERS = ["", "", "", "please ", "hey, ", "quick question: ", "can you tell me "]
+
+
+# ---------------------------
+# Traffic
+# ---------------------------
+def csv_cases(path: Path = CSV_PATH) -> List[Tuple[str, Optional[str]]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["input"], (row.get("expected_intent") or "").strip() or None) for row in csv.DictReader(f)]
+
+
+def _perturb(text: str, rng: random.Random) -> str:
+    words = text.split()
+    if len(words) > 3 and rng.random() < 0.3:
+        del words[rng.randrange(len(words))]
+    text = rng.choice(FILLERS) + " ".join(words)
+    if rng.random() < 0.3:
+        text = text.capitalize() + rng.choice(["?", "!", "."])
+    return text
+
+
+def synthetic_traffic(n: int, seed: int = 42) -> List[Tuple[str, Optional[str]]]:
+    """(message, expected intent) pairs: 60% intent examples, 25% smalltalk, 15% off-topic."""
+    rng = random.Random(seed)
+    examples = example_rows()
+    smalltalk = [p.strip("%").strip() for p, _ in get_smalltalk_rows() if p.strip("%").strip()]
+    traffic = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.60 and examples:
+            text, intent = rng.choice(examples)
+            traffic.append((_perturb(text, rng), intent))
+        elif roll < 0.85 and smalltalk:
+            traffic.append((_perturb(rng.choice(smalltalk), rng), "smalltalk"))
+        else:
+            traffic.append((rng.choice(OFF_TOPIC), None))
+    return traffic
+
+
+def _correct(expected: Optional[str], got: Optional[str]) -> bool:
+    if expected == got:
+        return True
+    return got == "smalltalk" and expected in SMALLTALK_INTENTS
+
+
+# ---------------------------
+# Measurements
+# ---------------------------
+def staged_answer(model, text: str, timings: Dict[str, List[float]]) -> Tuple[Optional[str], Optional[str], float]:
+    """infer_intent_and_answer, step by step, timing each stage (microseconds)."""
+    clock = time.perf_counter
+    t0 = clock()
+    text_norm = normalize(text)
+    t1 = clock()
+    timings["normalize"].append((t1 - t0) * 1e6)
+    st = smalltalk_or_none(text_norm)
+    t2 = clock()
+    timings["smalltalk"].append((t2 - t1) * 1e6)
+    if st:
+        return "smalltalk", st, 1.0
+    index = spelling.for_model(model)
+    fixed = index.correct(text_norm) if index is not None else text_norm
+    t3 = clock()
+    timings["spelling"].append((t3 - t2) * 1e6)
+    hit = retrieval.lookup(text_norm) or (retrieval.lookup(fixed) if fixed != text_norm else None)
+    t4 = clock()
+    timings["retrieval"].append((t4 - t3) * 1e6)
+    if hit:
+        return "learned", hit[0], hit[1]
+    label, conf = _top_intents(model, text_norm, 1)[0]
+    if fixed != text_norm and conf < CONFIDENCE_THRESHOLD:
+        label, conf = _prefer_corrected((label, conf), _top_intents(model, fixed, 1)[0])
+    t5 = clock()
+    timings["predict"].append((t5 - t4) * 1e6)
+    if conf < CONFIDENCE_THRESHOLD:
+        return None, None, conf
+    answer = respond_for_intent(label)
+    timings["fact_lookup"].append((clock() - t5) * 1e6)
+    return label, answer, conf
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "mean": 0.0, "n": 0}
+    ordered = sorted(values)
+    return {
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "mean": statistics.fmean(ordered),
+        "n": len(ordered),
+    }
+
+
+def _rss_mb() -> Dict[str, float]:
+    current = 0.0
+    try:
+        with open("/proc/self/status") as f:
+            current = next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+    except (OSError, StopIteration):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else 0.0
+    return {"current": current, "peak": peak}
+
+
+def _delete_interactions(ids: List[int]) -> None:
+    con = get_connection()
+    with con:
+        con.executemany("DELETE FROM interactions WHERE id = ?", [(i,) for i in ids])
+
+
+def run(n_messages: int = 5000, seed: int = 42) -> Dict:
+    init_db()
+    rss_start = _rss_mb()
+    model, _ = load_or_train_model()
+    lean.for_model(model)
+    spelling.for_model(model)
+    cases = csv_cases()
+    traffic = synthetic_traffic(n_messages, seed)
+    logged: List[int] = []
+
+    # 1) accuracy + per-stage latency (cold normalization caches)
+    clear_caches()
+    timings = {stage: [] for stage in STAGES}
+    accuracy, mismatches = {}, 0
+    for name, rows in (("csv", cases), ("synthetic", traffic)):
+        correct = 0
+        for text, expected in rows:
+            intent, answer, conf = staged_answer(model, text, timings)
+            t0 = time.perf_counter()
+            logged.append(writebehind.record_interaction(text, intent, conf, answer or ""))
+            timings["db_write"].append((time.perf_counter() - t0) * 1e6)
+            mismatches += infer_intent_and_answer(model, text)[0] != intent
+            # a blank expected intent (None) means the bot must not answer
+            correct += _correct(expected, intent)
+        accuracy[name] = correct / len(rows) if rows else 0.0
+
+    # 2) end-to-end throughput through the real entry points. The accuracy pass
+    # above filled the response cache with these very messages, so the pipeline
+    # is timed with the cache off, then (if enabled) warm, i.e. all cache hits
+    def replay() -> float:
+        t0 = time.perf_counter()
+        for text, _ in traffic:
+            intent, answer, conf = infer_intent_and_answer(model, text)
+            logged.append(writebehind.record_interaction(text, intent, conf, answer or ""))
+        elapsed = time.perf_counter() - t0
+        return len(traffic) / elapsed if elapsed else 0.0
+
+    cache_enabled = response_cache.ENABLED
+    clear_caches()
+    response_cache.ENABLED = False
+    try:
+        throughput = replay()
+    finally:
+        response_cache.ENABLED = cache_enabled
+    throughput_cached = replay() if cache_enabled else None
+
+    writebehind.flush_pending()
+    _delete_interactions(logged)
+    rss_end = _rss_mb()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "messages": {"csv": len(cases), "synthetic": len(traffic)},
+            "stage_mismatches": mismatches,  # staged_answer vs infer_intent_and_answer; should be 0
+        },
+        "accuracy": accuracy,
+        "latency_us": {stage: _summary(values) for stage, values in timings.items()},
+        "throughput_msgs_per_s": throughput,
+        "throughput_cached_msgs_per_s": throughput_cached,
+        "memory_mb": {
+            "rss_peak": rss_end["peak"],
+            "rss_growth": rss_end["current"] - rss_start["current"],
+        },
+    }
+
+
+# ---------------------------
+# Baseline comparison
+# ---------------------------
+def _flatten(results: Dict) -> Dict[str, float]:
+    flat = {f"accuracy.{k}": v for k, v in results["accuracy"].items()}
+    for stage, s in results["latency_us"].items():
+        if s["n"]:
+            flat[f"latency_us.{stage}.p50"] = s["p50"]
+            flat[f"latency_us.{stage}.p95"] = s["p95"]
+    flat["throughput_msgs_per_s"] = results["throughput_msgs_per_s"]
+    if results.get("throughput_cached_msgs_per_s"):
+        flat["throughput_cached_msgs_per_s"] = results["throughput_cached_msgs_per_s"]
+    flat["memory_mb.rss_peak"] = results["memory_mb"]["rss_peak"]
+    return flat
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = 0.3, accuracy_drop: float = 0.02) -> List[str]:
+    """
+    Regressions against the baseline: accuracy down by more than
+    accuracy_drop (absolute), latency or memory up / throughput down by more
+    than `tolerance` (relative). Latencies also get LATENCY_SLACK_US of
+    absolute slack.
+    """
+    now, base = _flatten(results), _flatten(baseline)
+    problems = []
+    for key, old in base.items():
+        new = now.get(key)
+        if new is None:
+            continue
+        if key.startswith("accuracy."):
+            bad = new < old - accuracy_drop
+        elif key.startswith("throughput"):
+            bad = new < old * (1 - tolerance)
+        elif key.startswith("latency_us."):
+            bad = new > old * (1 + tolerance) + LATENCY_SLACK_US
+        else:
+            bad = old > 0 and new > old * (1 + tolerance)
+        if bad:
+            problems.append(f"{key}: {old:.4g} -> {new:.4g}")
+    return problems
+
+
+def format_results(results: Dict) -> str:
+    lines = [
+        "accuracy:   " + "  ".join(f"{k} {v:.2%}" for k, v in results["accuracy"].items()),
+        f"throughput: {results['throughput_msgs_per_s']:.0f} msgs/s "
+        f"(infer_intent_and_answer + record_interaction, response cache off)",
+        f"memory:     peak RSS {results['memory_mb']['rss_peak']:.1f} MB, "
+        f"growth {results['memory_mb']['rss_growth']:+.1f} MB",
+        f"{'stage':<12} {'p50 us':>8} {'p95 us':>8} {'mean us':>8} {'calls':>7}",
+    ]
+    if results.get("throughput_cached_msgs_per_s"):
+        lines.insert(2, f"            {results['throughput_cached_msgs_per_s']:.0f} msgs/s with every message a cache hit")
+    for stage, s in results["latency_us"].items():
+        lines.append(f"{stage:<12} {s['p50']:>8.1f} {s['p95']:>8.1f} {s['mean']:>8.1f} {s['n']:>7}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Accuracy and performance suite for the answering pipeline.")
+    ap.add_argument("--messages", type=int, default=5000, help="synthetic messages to replay")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", help="write the results JSON here")
+    ap.add_argument("--baseline", default=str(BASELINE_PATH), help="results JSON to compare against")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.3, help="allowed relative slowdown/growth")
+    args = ap.parse_args()
+
+    results = run(args.messages, args.seed)
+    print(format_results(results))
+    if results["meta"]["stage_mismatches"]:
+        print(f"warning: staged pipeline disagreed with infer_intent_and_answer "
+              f"{results['meta']['stage_mismatches']} times")
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {baseline_path}.")
+    elif baseline_path.exists():
+        problems = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.tolerance)
+        if problems:
+            print("\nREGRESSIONS vs baseline:")
+            for p in problems:
+                print("  " + p)
+            sys.exit(1)
+        print(f"\nNo regressions vs {baseline_path}.")
+    else:
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Compact on-disk format for the TF-IDF + LogisticRegression intent model.
+
+Instead of pickling the whole Pipeline (vocabulary dict, analyzer closures,
+solver state), export_pipeline() writes a directory of plain arrays:
+
+    vocab.npy      sorted UTF-8 n-grams (fixed width); a term's position is its column
+    idf.npy        float64 IDF weight per column
+    coef_t.npy     float64 (n_features, n_classes), coef_ transposed for X @ coef_t
+    intercept.npy  float64 (n_classes,) or (1,) for binary models
+    meta.json      class labels, vectorizer settings, shapes, training fingerprint
+
+CompactIntentModel.load() memory-maps the arrays, so loading is a few page
+mappings and every worker process shares the same physical pages. Nothing
+is unpickled, so a model directory on shared storage can't execute code.
+predict_proba() repeats sklearn's arithmetic step for step (counts -> tf-idf
+-> l2 -> sparse @ dense -> softmax/expit) and matches the pipeline to
+floating-point rounding.
+"""
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+FORMAT_VERSION = 1
+_ARRAYS = ("vocab", "idf", "coef_t", "intercept")
+
+
+def supports(model) -> bool:
+    """True for a fitted Pipeline of a plain word n-gram TfidfVectorizer and a (softmax) LogisticRegression."""
+    from sklearn.linear_model import LogisticRegression
+    steps = getattr(model, "named_steps", {})
+    vec, clf = steps.get("vec"), steps.get("clf")
+    return (
+        vec is not None and hasattr(vec, "vocabulary_") and hasattr(vec, "use_idf")
+        and vec.analyzer == "word" and vec.preprocessor is None and vec.tokenizer is None
+        and vec.stop_words is None and vec.strip_accents is None and not vec.binary
+        and isinstance(clf, LogisticRegression) and hasattr(clf, "coef_")
+        and getattr(clf, "multi_class", "auto") != "ovr"
+    )
+
+
+def export_pipeline(model, path: Path, fingerprint: Optional[str] = None) -> None:
+    """Write a fitted TfidfVectorizer + LogisticRegression pipeline to `path`."""
+    if not supports(model):
+        raise ValueError("only TfidfVectorizer (plain word n-grams) + LogisticRegression pipelines can be exported")
+    vec, clf = model.named_steps["vec"], model.named_steps["clf"]
+    terms = [t.encode("utf-8") for t in vec.get_feature_names_out()]  # sorted == column order
+    arrays = {
+        "vocab": np.array(terms, dtype=f"S{max(map(len, terms), default=1)}"),
+        "idf": np.asarray(vec.idf_ if vec.use_idf else np.ones(len(terms)), dtype=np.float64),
+        "coef_t": np.ascontiguousarray(clf.coef_.T, dtype=np.float64),
+        "intercept": np.asarray(clf.intercept_, dtype=np.float64),
+    }
+    meta = {
+        "format": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "classes": [str(c) for c in clf.classes_],
+        "n_features": len(terms),
+        "lowercase": vec.lowercase,
+        "token_pattern": vec.token_pattern,
+        "ngram_range": list(vec.ngram_range),
+        "norm": vec.norm,
+        "use_idf": vec.use_idf,
+        "sublinear_tf": vec.sublinear_tf,
+    }
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name in _ARRAYS:
+        tmp = path / f"{name}.tmp.npy"
+        np.save(tmp, arrays[name])
+        os.replace(tmp, path / f"{name}.npy")
+    # meta.json last: a directory without it (or with stale shapes) doesn't load
+    tmp = path / "meta.tmp.json"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path / "meta.json")
+
+
+def word_ngrams(text: str, token_re, ngram_range: Tuple[int, int], lowercase: bool = True) -> List[str]:
+    """Word n-grams exactly as TfidfVectorizer's default word analyzer produces them."""
+    if lowercase:
+        text = text.lower()
+    tokens = token_re.findall(text)
+    lo, hi = ngram_range
+    if hi == 1:
+        return tokens if lo == 1 else []
+    grams = list(tokens) if lo == 1 else []
+    n_tok = len(tokens)
+    for n in range(max(lo, 2), min(hi, n_tok) + 1):
+        grams.extend(" ".join(tokens[i:i + n]) for i in range(n_tok - n + 1))
+    return grams
+
+
+def exists(path: Path) -> bool:
+    return (Path(path) / "meta.json").exists()
+
+
+class CompactIntentModel:
+    """Read-only predictor over an exported model; duck-types the Pipeline's predict API."""
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.vocab = arrays["vocab"]
+        self.idf = arrays["idf"]
+        self.coef_t = arrays["coef_t"]
+        self.intercept = arrays["intercept"]
+        self.meta = meta
+        self.classes_ = np.array(meta["classes"])
+        self.fingerprint_ = meta.get("fingerprint")
+        self._token_re = re.compile(meta["token_pattern"])
+        self._ngram_range = tuple(meta["ngram_range"])
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "CompactIntentModel":
+        path = Path(path)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported compact model format {meta.get('format')!r}")
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in _ARRAYS}
+        n_features, n_classes = meta["n_features"], len(meta["classes"])
+        if (arrays["vocab"].shape != (n_features,) or arrays["idf"].shape != (n_features,)
+                or arrays["coef_t"].shape != (n_features, 1 if n_classes == 2 else n_classes)):
+            raise ValueError(f"compact model at {path} is incomplete or inconsistent")
+        return cls(arrays, meta)
+
+    # -- feature extraction (TfidfVectorizer.transform) --
+    def analyze(self, text: str) -> List[str]:
+        return word_ngrams(text, self._token_re, self._ngram_range, self.meta["lowercase"])
+
+    def lookup(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(ascending column ids, counts) of the in-vocabulary terms."""
+        counts = Counter(terms)
+        width = self.vocab.dtype.itemsize
+        keys = sorted(t.encode("utf-8") for t in counts)
+        keys = [k for k in keys if len(k) <= width]  # longer terms can't be in the vocabulary
+        if not keys:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        arr = np.array(keys, dtype=self.vocab.dtype)
+        pos = np.searchsorted(self.vocab, arr)
+        pos[pos == len(self.vocab)] = 0
+        found = self.vocab[pos] == arr
+        cols = pos[found]
+        vals = np.array([counts[k.decode("utf-8")] for k, f in zip(keys, found) if f], dtype=np.float64)
+        return cols, vals
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            cols, vals = self.lookup(self.analyze(text))
+            if self.meta["sublinear_tf"]:
+                vals = np.log(vals) + 1
+            if self.meta["use_idf"]:
+                vals = vals * self.idf[cols]
+            if self.meta["norm"] == "l2" and len(vals):
+                vals = vals / np.sqrt(np.dot(vals, vals))
+            elif self.meta["norm"] == "l1" and len(vals):
+                vals = vals / np.abs(vals).sum()
+            indices.append(cols)
+            data.append(vals)
+            indptr.append(indptr[-1] + len(cols))
+        return sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int64),
+                indptr,
+            ),
+            shape=(len(texts), len(self.vocab)),
+        )
+
+    # -- classifier (LogisticRegression) --
+    def decision_function(self, texts: List[str]) -> np.ndarray:
+        scores = self.transform(texts) @ self.coef_t + self.intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        scores = self.decision_function(texts)
+        if scores.ndim == 1:
+            prob = 1.0 / (1.0 + np.exp(-scores))
+            return np.vstack([1 - prob, prob]).T
+        scores = scores - scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
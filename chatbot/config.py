@@ -2,11 +2,103 @@ import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "data" / "banking_knowledge.db"
+DB_PATH = Path(os.environ.get("BANKING_DB_PATH", BASE_DIR / "data" / "banking_knowledge.db"))
+ARCHIVE_DIR = BASE_DIR / "data" / "archive"  # monthly partitions of old interactions
+INTERACTION_RETENTION_DAYS = 90             # see db.archive_interactions
+
+# SQLite connection tuning (see db.connect)
+SQLITE_TIMEOUT = 5.0              # seconds to wait on a locked database
+SQLITE_CACHE_SIZE_KB = 16384      # page cache per connection
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+SQLITE_STATEMENT_CACHE = 128      # prepared statements kept per connection
+STREAM_CHUNK_SIZE = 10000         # rows per page for the streaming readers (db.iter_*)
+
+# Write-behind logging of interactions/feedback (see writebehind.py)
+WRITE_BEHIND = True
+WRITE_BEHIND_MAX_QUEUE = 10000    # rows buffered before record_* calls block
+WRITE_BEHIND_BATCH = 256          # flush when this many rows are waiting...
+WRITE_BEHIND_INTERVAL = 0.5       # ...or when the oldest has waited this many seconds
+WRITE_BEHIND_ID_BLOCK = 1000      # interaction ids reserved per round-trip
+WRITE_BEHIND_ORPHAN_FLUSHES = 20  # flushes to keep retrying feedback whose interaction isn't written yet
+
+# Knowledge cache: seconds between cheap kb_meta.version checks
+KB_CHECK_INTERVAL = 5.0
+
+# Text normalization (see nlp.py)
+NORMALIZE_CACHE_SIZE = 65536   # whole cleaned messages
+LEMMA_CACHE_SIZE = 131072      # individual tokens
+FAST_TOKENIZER = True          # skip Punkt/Treebank for already-cleaned ASCII text
+NORMALIZE_PARALLEL_MIN = 200000  # distinct messages before normalize_many() uses a process pool
+NORMALIZE_WORKERS = 0           # processes for that pool; 0 = one per core, 1 = never fan out
 
 # ML artifacts
-MODEL_DIR = BASE_DIR / "data"
+MODEL_DIR = Path(os.environ.get("BANKING_MODEL_DIR", BASE_DIR / "data"))
 VECTORIZER_PATH = MODEL_DIR / "vectorizer.pkl"
+# Versioned model artifacts + MANIFEST.json, see artifacts.py
+MODEL_ARTIFACTS_DIR = MODEL_DIR / "models"
+MODEL_KEEP_VERSIONS = 3              # published versions kept on disk (older ones are deleted)
+MODEL_HOT_RELOAD = True              # servers swap in newly published versions without restarting
+MODEL_RELOAD_CHECK_INTERVAL = 1.0    # seconds between stat()s of the manifest on the request path
+# Pre-versioning locations, still loaded when nothing has been published yet
 MODEL_PATH = MODEL_DIR / "intent_model.pkl"
+COMPACT_MODEL_DIR = MODEL_DIR / "intent_model"   # .npy export, see compact.py
+# "compact" saves the .npy export (memory-mapped, no unpickling); "pickle" a pickled Pipeline
+MODEL_FORMAT = os.environ.get("BANKING_MODEL_FORMAT", "compact")
+ONLINE_MODEL_PATH = MODEL_DIR / "intent_model_online.pkl"
+TUNED_PARAMS_PATH = MODEL_DIR / "intent_model.params.json"  # best hyperparameters from tuning.py
+
+# Training mode for startup, :train and /api/train:
+#   "full"        refit TF-IDF + LogisticRegression from scratch (training.py)
+#   "incremental" fold only new feedback corrections into a hashing + SGD model (online.py)
+TRAINING_MODE = os.environ.get("BANKING_TRAINING_MODE", "full")
+ONLINE_UPDATE_EPOCHS = 5        # partial_fit passes over each batch of new corrections
+ONLINE_REBUILD_EVERY = 500      # corrections folded in before a forced full rebuild
+
+# Intent classifier layout for "full" training (see hierarchy.py):
+#   "flat"          one softmax over every intent
+#   "hierarchical"  a coarse model picks intent groups, one small model per group picks the intent
+#   "auto"          hierarchical once there are HIERARCHY_MIN_INTENTS intents
+INTENT_CLASSIFIER = os.environ.get("BANKING_INTENT_CLASSIFIER", "auto")
+HIERARCHY_MIN_INTENTS = 200
+HIERARCHY_GROUP_SIZE = 40       # intents per group on average (groups = intents / this)
+HIERARCHY_BEAM = 5              # most groups whose intents are scored for a message
+HIERARCHY_CALIBRATION_SHARE = 0.2  # rows held out to fit the confidence calibration (Platt map); 0 = uncalibrated
+INTENT_TOP_K = 3                # candidates inference.top_intents() returns
+
+# Hyperparameter search (see tuning.py)
+TUNING_CV_FOLDS = 5     # stratified folds (fewer if an intent has fewer examples)
+TUNING_N_JOBS = -1      # worker processes for the search; -1 = all cores
+
+# Micro-batching of concurrent chat requests (see batching.py)
+MICROBATCH_MAX_SIZE = 32
+MICROBATCH_MAX_WAIT = 0.005     # seconds to wait for more messages after the first
+
+# Async server (app_async.py)
+ASYNC_CPU_WORKERS = int(os.environ.get("BANKING_ASYNC_WORKERS", "0"))  # prediction processes; 0 = one per core
+ASYNC_DB_THREADS = 4            # threads for logging/feedback calls that may touch SQLite
+
+# Retrieval over approved learned Q&A (see retrieval.py)
+LEARNED_INDEX_DIR = MODEL_DIR / "learned_index"
+RETRIEVAL_THRESHOLD = 0.8       # cosine similarity needed to answer from a learned Q&A
+RETRIEVAL_CHECK_INTERVAL = 5.0  # seconds between checks for newly approved rows
+RETRIEVAL_MERGE_EVERY = 1024    # buffered additions before they're merged into the main index
+
+# Typo correction before smalltalk/retrieval/prediction (see spelling.py)
+SPELL_CORRECTION = True
+SPELL_MAX_EDIT = 2              # edits allowed per corrected token
+SPELL_PREFIX_LENGTH = 7         # only this many leading characters are indexed
+SPELL_MIN_LENGTH = 3            # shorter tokens are never corrected
+SPELL_SHORT_LENGTH = 4          # tokens up to this long get one edit, and only to a classifier word
+ENGLISH_WORDS_PATH = BASE_DIR / "data" / "english_words.txt"  # never corrected; see spelling.english_words
+
+# Response cache in front of the pipeline (see response_cache.py)
+RESPONSE_CACHE = True
+RESPONSE_CACHE_SIZE = 10000      # normalized messages kept per process (LRU)
+RESPONSE_CACHE_TTL = 300.0       # seconds an entry may be served
+RESPONSE_CACHE_SHARED = os.environ.get("BANKING_RESPONSE_CACHE_SHARED", "0") == "1"
+RESPONSE_CACHE_PATH = MODEL_DIR / "response_cache.db"  # shared store for all worker processes
+
+# Hot-path timers and confidence histograms (see metrics.py); read at import time
+METRICS_ENABLED = os.environ.get("BANKING_METRICS", "1") != "0"
 
 CONFIDENCE_THRESHOLD = 0.45  # below this, ask user to teach
@@ -0,0 +1,254 @@
+"""
+Streaming export/import of the logged data, for offline training.
+
+    python -m chatbot.dataio export interactions --out exports/ [--format csv|jsonl|parquet]
+                                                 [--rows-per-file 1000000] [--after-id N]
+    python -m chatbot.dataio export feedback --out exports/
+    python -m chatbot.dataio export labeled --out exports/     # (text, intent) training pairs
+    python -m chatbot.dataio import labeled.csv more/ [--text-col text --intent-col intent]
+
+Export reads the tables with the keyset-paginated db.iter_* readers and
+writes numbered part files (interactions-00000.csv, ...) of at most
+--rows-per-file rows. Import streams CSV/JSONL/Parquet files row by row into
+intent_examples with db.insert_examples (executemany, one transaction per
+--batch rows). Both run at constant memory however large the data is.
+Parquet needs pyarrow (`pip install pyarrow`).
+"""
+import argparse
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import db
+from .config import STREAM_CHUNK_SIZE
+
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "parquet": ".parquet"}
+TEXT_COLUMNS = ("text", "example", "user_text", "input")
+INTENT_COLUMNS = ("intent", "correction_intent", "expected_intent")  # bot_intent is a prediction, not a label
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Parquet support needs pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+# ---------------------------
+# Datasets
+# ---------------------------
+def labeled_rows(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+    """The training pairs (training.training_rows), streamed: examples, then approved corrections."""
+    for r in db.iter_examples(chunk_size=chunk_size):
+        yield {"text": r["example"], "intent": r["intent"], "source": "example"}
+    for r in db.iter_feedback(chunk_size=chunk_size):
+        if r["approved"] == 1 and r["correction_intent"]:
+            yield {"text": r["user_text"], "intent": r["correction_intent"], "source": "feedback"}
+
+
+DATASETS = {
+    "interactions": lambda after_id: db.iter_interactions(after_id),
+    "feedback": lambda after_id: db.iter_feedback(after_id),
+    "labeled": lambda after_id: labeled_rows(),
+}
+
+
+# ---------------------------
+# Export
+# ---------------------------
+class ChunkedWriter:
+    """Writes dict rows to prefix-00000.ext, prefix-00001.ext, ... with at most rows_per_file rows each."""
+
+    def __init__(self, out_dir: Path, prefix: str, fmt: str, rows_per_file: int):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r}")
+        self.out_dir = Path(out_dir)
+        self.prefix = prefix
+        self.fmt = fmt
+        self.rows_per_file = rows_per_file
+        self.files: List[Path] = []
+        self.rows = 0
+        self._in_file = 0
+        self._handle = None
+        self._writer = None
+        self._buffer: List[Dict] = []  # parquet: one row group
+
+    def write(self, row: Dict) -> None:
+        if self._writer is None or self._in_file >= self.rows_per_file:
+            self._open(list(row))
+        if self.fmt == "csv":
+            self._writer.writerow(row)
+        elif self.fmt == "jsonl":
+            self._handle.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self._buffer.append(row)
+            if len(self._buffer) >= STREAM_CHUNK_SIZE:
+                self._flush_parquet()
+        self._in_file += 1
+        self.rows += 1
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        if self.fmt == "parquet":
+            self._flush_parquet()
+            self._writer.close()
+        else:
+            self._handle.close()
+        self._writer = self._handle = None
+
+    def _open(self, columns: List[str]) -> None:
+        self.close()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"{self.prefix}-{len(self.files):05d}{FORMATS[self.fmt]}"
+        self.files.append(path)
+        self._in_file = 0
+        if self.fmt == "csv":
+            self._handle = open(path, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._handle, fieldnames=columns)
+            self._writer.writeheader()
+        elif self.fmt == "jsonl":
+            self._handle = open(path, "w", encoding="utf-8")
+            self._writer = self._handle
+        else:
+            self._writer = _ParquetParts(path)
+
+    def _flush_parquet(self) -> None:
+        if self._buffer:
+            self._writer.write(self._buffer)
+            self._buffer = []
+
+
+class _ParquetParts:
+    """A ParquetWriter opened on the first row group, when the schema can be inferred."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._writer = None
+
+    def write(self, rows: List[Dict]) -> None:
+        pa = _pyarrow()
+        table = pa.Table.from_pylist(rows, schema=self._writer.schema if self._writer else None)
+        if self._writer is None:
+            # a column that is all NULL in the first row group is typed as text, not null
+            schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                for f in table.schema])
+            table = table.cast(schema)
+            self._writer = pa.parquet.ParquetWriter(str(self.path), schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+def export(dataset: str, out_dir: Path, fmt: str = "csv", rows_per_file: int = 1_000_000,
+           after_id: int = 0) -> ChunkedWriter:
+    if fmt == "parquet":
+        _pyarrow()
+    from .writebehind import flush_pending
+    flush_pending()  # include rows this process still has queued
+    writer = ChunkedWriter(out_dir, dataset, fmt, rows_per_file)
+    try:
+        for row in DATASETS[dataset](after_id):
+            writer.write(row)
+    finally:
+        writer.close()
+    return writer
+
+
+# ---------------------------
+# Import
+# ---------------------------
+def input_files(paths: Iterable[str]) -> List[Path]:
+    """Files as given, plus the CSV/JSONL/Parquet files inside any directories (sorted)."""
+    files = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            files.extend(sorted(f for f in p.iterdir() if f.suffix in FORMATS.values()))
+        else:
+            files.append(p)
+    return files
+
+
+def read_rows(path: Path, fmt: Optional[str] = None) -> Iterator[Dict]:
+    """Stream dict rows from a CSV, JSONL or Parquet file (format from the extension by default)."""
+    fmt = fmt or next((f for f, ext in FORMATS.items() if ext == Path(path).suffix), None)
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "parquet":
+        pq = _pyarrow().parquet
+        for batch in pq.ParquetFile(str(path)).iter_batches(batch_size=STREAM_CHUNK_SIZE):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"can't tell the format of {path}; pass --format")
+
+
+def _pick(columns: Iterable[str], wanted: Optional[str], candidates: Tuple[str, ...], what: str, path: Path) -> str:
+    columns = list(columns)
+    if wanted:
+        if wanted not in columns:
+            raise SystemExit(f"{path}: no column {wanted!r}")
+        return wanted
+    for name in candidates:
+        if name in columns:
+            return name
+    raise SystemExit(f"{path}: no {what} column (looked for {', '.join(candidates)}); pass --{what}-col")
+
+
+def labeled_pairs(files: Iterable[Path], fmt: Optional[str] = None, text_col: Optional[str] = None,
+                  intent_col: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """(example, intent) pairs from labeled files; rows with an empty text or intent are skipped."""
+    for path in files:
+        text_key = intent_key = None
+        for row in read_rows(path, fmt):
+            if text_key is None:
+                text_key = _pick(row, text_col, TEXT_COLUMNS, "text", path)
+                intent_key = _pick(row, intent_col, INTENT_COLUMNS, "intent", path)
+            text = str(row.get(text_key) or "").strip()
+            intent = str(row.get(intent_key) or "").strip()
+            if text and intent:
+                yield text, intent
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Streaming export/import of interactions, feedback and training data.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="write a table to chunked CSV/JSONL/Parquet files")
+    exp.add_argument("dataset", choices=list(DATASETS))
+    exp.add_argument("--out", required=True, help="output directory")
+    exp.add_argument("--format", choices=list(FORMATS), default="csv")
+    exp.add_argument("--rows-per-file", type=int, default=1_000_000)
+    exp.add_argument("--after-id", type=int, default=0, help="only rows with a larger id (interactions/feedback)")
+    imp = sub.add_parser("import", help="add labeled files to intent_examples")
+    imp.add_argument("paths", nargs="+", help="files or directories of files")
+    imp.add_argument("--format", choices=list(FORMATS), help="default: from the file extension")
+    imp.add_argument("--text-col", help=f"default: first of {', '.join(TEXT_COLUMNS)}")
+    imp.add_argument("--intent-col", help=f"default: first of {', '.join(INTENT_COLUMNS)}")
+    imp.add_argument("--batch", type=int, default=50000, help="rows per transaction")
+    args = ap.parse_args()
+
+    db.init_db()
+    if args.cmd == "export":
+        writer = export(args.dataset, Path(args.out), args.format, args.rows_per_file, args.after_id)
+        print(f"Exported {writer.rows} {args.dataset} rows to {len(writer.files)} file(s) in {args.out}.")
+    else:
+        files = input_files(args.paths)
+        read, inserted = db.insert_examples(
+            labeled_pairs(files, args.format, args.text_col, args.intent_col), args.batch)
+        print(f"Read {read} labeled rows from {len(files)} file(s); added {inserted} new examples.")
+        if inserted:
+            print("The training data changed: the next start (or :train) retrains the model.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,22 @@
+import atexit
+import json
+import logging
 import sqlite3
-from pathlib import Path
-from typing import Optional, List, Dict
-from .config import DB_PATH
+import threading
+import weakref
+from typing import Optional, List, Dict, Iterable, Iterator, Tuple
+from .matcher import SmalltalkMatcher
+from .config import (
+    ARCHIVE_DIR,
+    DB_PATH,
+    SQLITE_TIMEOUT,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+    SQLITE_STATEMENT_CACHE,
+    STREAM_CHUNK_SIZE,
+)
+
+log = logging.getLogger(__name__)
 
 SCHEMA = """
 PRAGMA foreign_keys = ON;
@@ -59,8 +74,142 @@ CREATE TABLE IF NOT EXISTS feedback (
     created_at TEXT NOT NULL,
     FOREIGN KEY(interaction_id) REFERENCES interactions(id) ON DELETE CASCADE
 );
+
+-- Bumped by triggers whenever facts/smalltalk change, so caches
+-- (see knowledge.py) can detect edits with a single-row read.
+CREATE TABLE IF NOT EXISTS kb_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO kb_meta(id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS facts_ai AFTER INSERT ON facts
+BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS facts_au AFTER UPDATE ON facts
+BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS facts_ad AFTER DELETE ON facts
+BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS smalltalk_ai AFTER INSERT ON smalltalk
+BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS smalltalk_au AFTER UPDATE ON smalltalk
+BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS smalltalk_ad AFTER DELETE ON smalltalk
+BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END;
 """
 
+# Versioned schema changes on top of SCHEMA, tracked in PRAGMA user_version.
+# Append new (version, statements) entries; never edit ones that have shipped.
+MIGRATIONS = [
+    (1, (
+        # approved feedback in id order (an index implicitly ends in rowid), plus the
+        # interaction_id lookup used by the FK cascade and retention
+        "CREATE INDEX IF NOT EXISTS idx_feedback_approved ON feedback(approved)",
+        "CREATE INDEX IF NOT EXISTS idx_feedback_interaction ON feedback(interaction_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_learned_approved ON user_learned_qa(approved, id)",
+        "CREATE INDEX IF NOT EXISTS idx_interactions_created_at ON interactions(created_at)",
+    )),
+    (2, (
+        # Older init_db() re-inserted every seed row on each start: dedupe, then enforce
+        "DELETE FROM intent_examples WHERE id NOT IN "
+        "(SELECT MIN(id) FROM intent_examples GROUP BY intent_id, example)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_intent_examples ON intent_examples(intent_id, example)",
+        # Only exact copies go: rows that give a pattern another response may be edits
+        # and are kept (see smalltalk_conflicts)
+        "DELETE FROM smalltalk WHERE id NOT IN (SELECT MIN(id) FROM smalltalk GROUP BY pattern, response)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_smalltalk ON smalltalk(pattern, response)",
+    )),
+    (3, (
+        # Change log of servable learned answers (approved user_learned_qa rows and
+        # approved feedback with a corrected_answer), consumed by retrieval.py
+        """CREATE TABLE IF NOT EXISTS learned_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,          -- 'learned' (user_learned_qa) or 'feedback'
+            source_id INTEGER NOT NULL,
+            approved INTEGER NOT NULL      -- 1 = now servable, 0 = withdrawn
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS learned_qa_ai AFTER INSERT ON user_learned_qa
+        WHEN NEW.approved = 1
+        BEGIN INSERT INTO learned_events(source, source_id, approved) VALUES ('learned', NEW.id, 1); END""",
+        """CREATE TRIGGER IF NOT EXISTS learned_qa_au AFTER UPDATE OF approved ON user_learned_qa
+        WHEN COALESCE(NEW.approved, 0) <> COALESCE(OLD.approved, 0)
+        BEGIN INSERT INTO learned_events(source, source_id, approved)
+              VALUES ('learned', NEW.id, COALESCE(NEW.approved, 0)); END""",
+        """CREATE TRIGGER IF NOT EXISTS feedback_answer_ai AFTER INSERT ON feedback
+        WHEN NEW.approved = 1 AND NEW.corrected_answer IS NOT NULL
+        BEGIN INSERT INTO learned_events(source, source_id, approved) VALUES ('feedback', NEW.id, 1); END""",
+        """CREATE TRIGGER IF NOT EXISTS feedback_answer_au AFTER UPDATE OF approved ON feedback
+        WHEN NEW.corrected_answer IS NOT NULL AND COALESCE(NEW.approved, 0) <> COALESCE(OLD.approved, 0)
+        BEGIN INSERT INTO learned_events(source, source_id, approved)
+              VALUES ('feedback', NEW.id, COALESCE(NEW.approved, 0)); END""",
+        "INSERT INTO learned_events(source, source_id, approved) "
+        "SELECT 'learned', id, 1 FROM user_learned_qa WHERE approved = 1 ORDER BY id",
+        "INSERT INTO learned_events(source, source_id, approved) "
+        "SELECT 'feedback', id, 1 FROM feedback WHERE approved = 1 AND corrected_answer IS NOT NULL ORDER BY id",
+    )),
+    (4, (
+        # Reply per intent, rendered from facts by knowledge.py (was an if-chain in inference.py)
+        """CREATE TABLE IF NOT EXISTS response_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            intent TEXT UNIQUE NOT NULL,
+            template TEXT NOT NULL,        -- reply text; {fact_key} is replaced by that fact's value
+            defaults TEXT,                 -- JSON {fact_key: value} for facts that are missing or empty
+            fallback TEXT,                 -- whole reply when a needed fact has neither
+            updated_at TEXT NOT NULL
+        )""",
+        "CREATE TRIGGER IF NOT EXISTS templates_ai AFTER INSERT ON response_templates "
+        "BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS templates_au AFTER UPDATE ON response_templates "
+        "BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS templates_ad AFTER DELETE ON response_templates "
+        "BEGIN UPDATE kb_meta SET version = version + 1 WHERE id = 1; END",
+    )),
+    (5, (
+        # Corrected answers from feedback were served as soon as they were posted. They
+        # now wait for their own review (answer_approved, see approve_feedback); approved
+        # keeps meaning the row's rating and intent correction count for training
+        "ALTER TABLE feedback ADD COLUMN answer_approved INTEGER NOT NULL DEFAULT 0",
+        "DROP TRIGGER IF EXISTS feedback_answer_ai",
+        "DROP TRIGGER IF EXISTS feedback_answer_au",
+        """CREATE TRIGGER IF NOT EXISTS feedback_answer_ai AFTER INSERT ON feedback
+        WHEN NEW.answer_approved = 1 AND NEW.corrected_answer IS NOT NULL
+        BEGIN INSERT INTO learned_events(source, source_id, approved) VALUES ('feedback', NEW.id, 1); END""",
+        """CREATE TRIGGER IF NOT EXISTS feedback_answer_au AFTER UPDATE OF answer_approved ON feedback
+        WHEN NEW.corrected_answer IS NOT NULL AND NEW.answer_approved <> OLD.answer_approved
+        BEGIN INSERT INTO learned_events(source, source_id, approved)
+              VALUES ('feedback', NEW.id, NEW.answer_approved); END""",
+        # withdraw the answers migration 3 indexed without review
+        "INSERT INTO learned_events(source, source_id, approved) "
+        "SELECT 'feedback', id, 0 FROM feedback WHERE approved = 1 AND corrected_answer IS NOT NULL ORDER BY id",
+    )),
+    (6, (
+        # Change log of intent corrections that count for training (approved feedback
+        # with a correction_intent), consumed by online.py. An edit to a counted row
+        # logs its withdrawal and then, if it still counts, its return.
+        """CREATE TABLE IF NOT EXISTS correction_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            feedback_id INTEGER NOT NULL,
+            approved INTEGER NOT NULL      -- 1 = now counts, 0 = withdrawn
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS feedback_correction_ai AFTER INSERT ON feedback
+        WHEN NEW.approved = 1 AND COALESCE(NEW.correction_intent, '') <> ''
+        BEGIN INSERT INTO correction_events(feedback_id, approved) VALUES (NEW.id, 1); END""",
+        """CREATE TRIGGER IF NOT EXISTS feedback_correction_au AFTER UPDATE OF approved, correction_intent ON feedback
+        WHEN COALESCE(NEW.approved, 0) <> COALESCE(OLD.approved, 0)
+          OR COALESCE(NEW.correction_intent, '') <> COALESCE(OLD.correction_intent, '')
+        BEGIN
+            INSERT INTO correction_events(feedback_id, approved)
+            SELECT OLD.id, 0 WHERE OLD.approved = 1 AND COALESCE(OLD.correction_intent, '') <> '';
+            INSERT INTO correction_events(feedback_id, approved)
+            SELECT NEW.id, 1 WHERE NEW.approved = 1 AND COALESCE(NEW.correction_intent, '') <> '';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS feedback_correction_ad AFTER DELETE ON feedback
+        WHEN OLD.approved = 1 AND COALESCE(OLD.correction_intent, '') <> ''
+        BEGIN INSERT INTO correction_events(feedback_id, approved) VALUES (OLD.id, 0); END""",
+        "INSERT INTO correction_events(feedback_id, approved) "
+        "SELECT id, 1 FROM feedback WHERE approved = 1 AND COALESCE(correction_intent, '') <> '' ORDER BY id",
+    )),
+]
+
 SEED = [
     ("account_types", [
         "what account do you have", "type of account", "list account type",
@@ -88,6 +237,9 @@ SMALLTALK = [
     ("%good morning%", "Good morning! How can I help?"),
     ("%thank%", "You're welcome! Anything else?"),
     ("%bye%", "Goodbye! Have a great day."),
+    # Patterns match whole words, so inflected forms need their own rows
+    ("%thanks%", "You're welcome! Anything else?"),
+    ("%goodbye%", "Goodbye! Have a great day."),
 ]
 
 FACTS = [
@@ -99,110 +251,289 @@ FACTS = [
     ("branch_hours_weekend", "Sat: 9:00–12:00; Sun: Closed"),
 ]
 
+# (intent, template, defaults, fallback); see knowledge.compile_templates
+TEMPLATES = [
+    ("account_types", "We currently offer: {account_types}.", None,
+     "We offer Savings, Current, and FD accounts."),
+    ("loan_rates", "Loan interest rates — Personal: {loan_personal_rate}, Home: {loan_home_rate}, "
+     "Auto: {loan_auto_rate}.",
+     {"loan_personal_rate": "N/A", "loan_home_rate": "N/A", "loan_auto_rate": "N/A"}, None),
+    ("branch_hours", "Branch hours — Weekdays: {branch_hours_weekday}. Weekends: {branch_hours_weekend}.",
+     {"branch_hours_weekday": "Mon–Fri: 9–3", "branch_hours_weekend": "Sat: 9–12; Sun: Closed"}, None),
+    ("atm_availability", "ATMs are available 24/7 at most branches. Please share your city to suggest nearby ATMs.",
+     None, None),
+    ("greeting", "Hello! I’m your banking assistant. How can I help?", None, None),
+    ("goodbye", "Goodbye! Happy to help anytime.", None, None),
+    ("thanks", "You're welcome! Anything else I can do?", None, None),
+]
+
 
 # ---------------------------
 # Connection & Initialization
 # ---------------------------
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+
 def connect():
+    """
+    Open a new, tuned connection. Most code should use get_connection(),
+    which hands out one long-lived connection per thread.
+    """
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    con = sqlite3.connect(DB_PATH)
+    con = sqlite3.connect(
+        DB_PATH,
+        timeout=SQLITE_TIMEOUT,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        check_same_thread=False,  # only the owning thread uses it; close_all() may close it
+    )
     con.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        con.execute(pragma)
     return con
 
 
+class ConnectionPool:
+    """
+    Hands out one long-lived connection per thread.
+
+    Reusing the connection keeps sqlite3's prepared-statement cache warm.
+    A connection is closed when its thread goes away, or for every thread
+    at once by close_all() (registered with atexit).
+    """
+
+    def __init__(self, factory=connect):
+        self._factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._finalizers = set()
+        self._generation = 0
+
+    def get(self) -> sqlite3.Connection:
+        slot = getattr(self._local, "slot", None)
+        if slot is None or slot.generation != self._generation:
+            slot = _Slot(self._factory(), self._generation)
+            fin = weakref.finalize(slot, slot.con.close)
+            with self._lock:
+                self._finalizers = {f for f in self._finalizers if f.alive}
+                self._finalizers.add(fin)
+            self._local.slot = slot
+        return slot.con
+
+    def close_all(self) -> None:
+        with self._lock:
+            finalizers, self._finalizers = self._finalizers, set()
+            self._generation += 1
+        for fin in finalizers:
+            try:
+                fin()
+            except sqlite3.Error:
+                pass
+
+
+class _Slot:
+    __slots__ = ("con", "generation", "__weakref__")
+
+    def __init__(self, con, generation):
+        self.con = con
+        self.generation = generation
+
+
+_pool = ConnectionPool()
+get_connection = _pool.get
+close_all = _pool.close_all
+atexit.register(close_all)
+
+
+def apply_migrations(con: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Bring the schema up to the latest MIGRATIONS version; returns it.
+    Runs in one IMMEDIATE transaction, so concurrent starters don't race.
+    """
+    con = con or get_connection()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        current = con.execute("PRAGMA user_version").fetchone()[0]
+        for version, statements in MIGRATIONS:
+            if version > current:
+                for stmt in statements:
+                    con.execute(stmt)
+                con.execute(f"PRAGMA user_version = {int(version)}")
+                current = version
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    return current
+
+
 def init_db():
-    con = connect()
+    con = get_connection()
     cur = con.cursor()
     cur.executescript(SCHEMA)
-
-    # Seed intents & examples
-    for intent_name, examples in SEED:
-        cur.execute(
-            "INSERT OR IGNORE INTO intents(name, description) VALUES (?, ?)",
-            (intent_name, f"Intent for {intent_name}")
-        )
-        cur.execute("SELECT id FROM intents WHERE name=?", (intent_name,))
-        intent_id_row = cur.fetchone()
-        if intent_id_row:
-            intent_id = intent_id_row[0]
-            for ex in examples:
-                cur.execute(
-                    "INSERT INTO intent_examples(intent_id, example) VALUES (?, ?)",
-                    (intent_id, ex)
+    before = con.execute("PRAGMA user_version").fetchone()[0]
+    apply_migrations(con)
+    if before < 2:
+        for pattern, responses in smalltalk_conflicts().items():
+            log.warning("smalltalk pattern %r has %d responses; only the first is served", pattern, len(responses))
+
+    with con:
+        # Seed intents & examples
+        for intent_name, examples in SEED:
+            cur.execute(
+                "INSERT OR IGNORE INTO intents(name, description) VALUES (?, ?)",
+                (intent_name, f"Intent for {intent_name}")
+            )
+            cur.execute("SELECT id FROM intents WHERE name=?", (intent_name,))
+            intent_id_row = cur.fetchone()
+            if intent_id_row:
+                intent_id = intent_id_row[0]
+                # Unique (intent_id, example): restarts don't change the
+                # training data (or its fingerprint, see training.py)
+                cur.executemany(
+                    "INSERT OR IGNORE INTO intent_examples(intent_id, example) VALUES (?, ?)",
+                    [(intent_id, ex) for ex in examples]
                 )
 
-    # Seed smalltalk
-    for pattern, resp in SMALLTALK:
-        cur.execute(
-            "INSERT INTO smalltalk(pattern, response) VALUES (?, ?)",
-            (pattern, resp)
+        # Seed smalltalk (only missing patterns: edited responses survive restarts)
+        cur.executemany(
+            "INSERT INTO smalltalk(pattern, response) SELECT ?, ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM smalltalk WHERE pattern = ?)",
+            [(pattern, response, pattern) for pattern, response in SMALLTALK]
         )
 
-    # Seed facts
-    from datetime import datetime
-    now = datetime.utcnow().isoformat()
-    for k, v in FACTS:
-        cur.execute(
-            "INSERT OR REPLACE INTO facts(key, value, updated_at) VALUES (?, ?, ?)",
-            (k, v, now)
+        # Seed facts (only missing keys: edited values survive restarts)
+        from datetime import datetime
+        now = datetime.utcnow().isoformat()
+        cur.executemany(
+            "INSERT OR IGNORE INTO facts(key, value, updated_at) VALUES (?, ?, ?)",
+            [(k, v, now) for k, v in FACTS]
         )
 
-    con.commit()
-    con.close()
+        # Seed reply templates (only missing intents, like facts)
+        cur.executemany(
+            "INSERT OR IGNORE INTO response_templates(intent, template, defaults, fallback, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(intent, template, json.dumps(defaults, ensure_ascii=False) if defaults else None, fallback, now)
+             for intent, template, defaults, fallback in TEMPLATES]
+        )
 
 
 # ---------------------------
 # Query helpers
 # ---------------------------
 def get_smalltalk_matches(text_norm: str) -> Optional[str]:
-    con = connect()
-    cur = con.cursor()
-    cur.execute("SELECT pattern, response FROM smalltalk")
-    for row in cur.fetchall():
-        patt = row["pattern"].lower().strip("%")
-        if patt and patt in text_norm:
-            return row["response"]
-    return None
+    """Uncached whole-word match; the chat path uses knowledge.match_smalltalk."""
+    return SmalltalkMatcher(get_smalltalk_rows()).match(text_norm)
 
 
 def get_fact(key: str) -> Optional[str]:
-    con = connect()
-    cur = con.cursor()
-    cur.execute("SELECT value FROM facts WHERE key=?", (key,))
-    r = cur.fetchone()
+    r = get_connection().execute("SELECT value FROM facts WHERE key=?", (key,)).fetchone()
     return r[0] if r else None
 
 
+def get_kb_version() -> int:
+    """Change counter for facts, smalltalk and response templates (maintained by triggers)."""
+    r = get_connection().execute("SELECT version FROM kb_meta WHERE id=1").fetchone()
+    return r[0] if r else 0
+
+
+def get_all_facts() -> Dict[str, str]:
+    cur = get_connection().execute("SELECT key, value FROM facts")
+    return {r["key"]: r["value"] for r in cur.fetchall()}
+
+
+def get_response_templates() -> List[tuple]:
+    """(intent, template, defaults JSON or None, fallback or None) for every intent with a reply."""
+    cur = get_connection().execute("SELECT intent, template, defaults, fallback FROM response_templates")
+    return [(r["intent"], r["template"], r["defaults"], r["fallback"]) for r in cur.fetchall()]
+
+
+def get_smalltalk_rows() -> List[tuple]:
+    """(pattern, response) pairs in table order, which is match priority."""
+    cur = get_connection().execute("SELECT pattern, response FROM smalltalk ORDER BY id")
+    return [(r["pattern"], r["response"]) for r in cur.fetchall()]
+
+
+def smalltalk_conflicts() -> Dict[str, List[str]]:
+    """
+    Patterns with more than one response, each mapped to its responses in
+    table order (only the first is ever served). Left for a human to resolve.
+    """
+    cur = get_connection().execute("""
+        SELECT pattern, response FROM smalltalk
+        WHERE pattern IN (SELECT pattern FROM smalltalk GROUP BY pattern HAVING COUNT(*) > 1)
+        ORDER BY pattern, id
+    """)
+    conflicts: Dict[str, List[str]] = {}
+    for r in cur.fetchall():
+        conflicts.setdefault(r["pattern"], []).append(r["response"])
+    return conflicts
+
+
 # ---------------------------
 # Learning & Feedback helpers
 # ---------------------------
 def record_user_learning(question: str, answer: str) -> None:
-    con = connect()
-    cur = con.cursor()
+    con = get_connection()
     from datetime import datetime
-    cur.execute(
-        "INSERT INTO user_learned_qa(question, answer, created_at) VALUES (?, ?, ?)",
-        (question, answer, datetime.utcnow().isoformat())
-    )
-    con.commit()
+    with con:
+        con.execute(
+            "INSERT INTO user_learned_qa(question, answer, created_at) VALUES (?, ?, ?)",
+            (question, answer, datetime.utcnow().isoformat())
+        )
 
 
 def list_user_learned(only_unapproved: bool = True) -> List[Dict]:
-    con = connect()
-    cur = con.cursor()
-    if only_unapproved:
-        cur.execute("""
-            SELECT id, question, answer, approved, created_at
-            FROM user_learned_qa
-            WHERE approved=0
-            ORDER BY id DESC
-        """)
-    else:
-        cur.execute("""
-            SELECT id, question, answer, approved, created_at
-            FROM user_learned_qa
-            ORDER BY id DESC
-        """)
+    return list(iter_user_learned(only_unapproved))
+
+
+def iter_user_learned(only_unapproved: bool = True, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+    """list_user_learned() as a stream, newest first, `chunk_size` rows per query."""
+    where = "approved=0 AND " if only_unapproved else ""
+    return _keyset(f"""
+        SELECT id, question, answer, approved, created_at
+        FROM user_learned_qa
+        WHERE {where}id < ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, chunk_size, descending=True)
+
+
+def approve_user_learning(learned_id: int, approved: bool = True) -> bool:
+    """Mark a taught Q&A as reviewed (False if there's no such row); approved rows are served by retrieval.py."""
+    con = get_connection()
+    with con:
+        cur = con.execute(
+            "UPDATE user_learned_qa SET approved=? WHERE id=?",
+            (1 if approved else 0, learned_id)
+        )
+    return cur.rowcount > 0
+
+
+def get_learned_events(after_id: int = 0, limit: int = 10000) -> List[Dict]:
+    """
+    learned_events newer than after_id with the question/answer text they
+    refer to, oldest first.
+    """
+    cur = get_connection().execute("""
+        SELECT e.id, e.source, e.source_id, e.approved,
+               COALESCE(q.question, i.user_text) AS question,
+               COALESCE(q.answer, f.corrected_answer) AS answer
+        FROM learned_events e
+        LEFT JOIN user_learned_qa q ON e.source = 'learned' AND q.id = e.source_id
+        LEFT JOIN feedback f ON e.source = 'feedback' AND f.id = e.source_id
+        LEFT JOIN interactions i ON i.id = f.interaction_id
+        WHERE e.id > ?
+        ORDER BY e.id
+        LIMIT ?
+    """, (after_id, limit))
     return [dict(r) for r in cur.fetchall()]
 
 
@@ -212,15 +543,14 @@ def record_interaction(
     confidence: Optional[float],
     bot_answer: str
 ) -> int:
-    con = connect()
-    cur = con.cursor()
+    con = get_connection()
     from datetime import datetime
-    cur.execute(
-        "INSERT INTO interactions(user_text, bot_intent, confidence, bot_answer, created_at) "
-        "VALUES (?, ?, ?, ?, ?)",
-        (user_text, bot_intent, confidence or 0.0, bot_answer, datetime.utcnow().isoformat())
-    )
-    con.commit()
+    with con:
+        cur = con.execute(
+            "INSERT INTO interactions(user_text, bot_intent, confidence, bot_answer, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_text, bot_intent, confidence or 0.0, bot_answer, datetime.utcnow().isoformat())
+        )
     return cur.lastrowid
 
 
@@ -230,35 +560,350 @@ def record_feedback(
     correction_intent: Optional[str],
     corrected_answer: Optional[str]
 ) -> None:
-    con = connect()
-    cur = con.cursor()
+    con = get_connection()
     from datetime import datetime
-    cur.execute(
-        "INSERT INTO feedback(interaction_id, helpful, correction_intent, corrected_answer, approved, created_at) "
-        "VALUES (?, ?, ?, ?, ?, ?)",
-        (
-            interaction_id,
-            (1 if helpful else 0) if helpful is not None else None,
-            correction_intent,
-            corrected_answer,
-            1,
-            datetime.utcnow().isoformat()
+    with con:
+        con.execute(
+            "INSERT INTO feedback(interaction_id, helpful, correction_intent, corrected_answer, approved, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                interaction_id,
+                (1 if helpful else 0) if helpful is not None else None,
+                correction_intent,
+                corrected_answer,
+                1,
+                datetime.utcnow().isoformat()
+            )
         )
-    )
-    con.commit()
+
+
+def list_feedback_answers(only_unapproved: bool = True) -> List[Dict]:
+    """Feedback rows carrying a corrected_answer (by default those waiting for review), newest first."""
+    where = "AND f.answer_approved = 0 " if only_unapproved else ""
+    cur = get_connection().execute(f"""
+        SELECT f.id, i.user_text AS question, f.corrected_answer AS answer, f.answer_approved, f.created_at
+        FROM feedback f
+        JOIN interactions i ON i.id = f.interaction_id
+        WHERE f.corrected_answer IS NOT NULL {where}
+        ORDER BY f.id DESC
+    """)
+    return [dict(r) for r in cur.fetchall()]
+
+
+def approve_feedback(feedback_id: int, approved: bool = True) -> bool:
+    """
+    Review a feedback row's corrected_answer (False if there's no such row).
+    Approved answers are served by retrieval.py; the row's rating and intent
+    correction (feedback.approved) are not affected.
+    """
+    con = get_connection()
+    with con:
+        cur = con.execute(
+            "UPDATE feedback SET answer_approved=? WHERE id=?",
+            (1 if approved else 0, feedback_id)
+        )
+    return cur.rowcount > 0
+
+
+def approve_correction(feedback_id: int, approved: bool = True) -> bool:
+    """
+    Review a feedback row's rating and intent correction (False if there's
+    no such row). Only approved rows count for training; the change reaches
+    the incremental model through correction_events.
+    """
+    con = get_connection()
+    with con:
+        cur = con.execute(
+            "UPDATE feedback SET approved=? WHERE id=?",
+            (1 if approved else 0, feedback_id)
+        )
+    return cur.rowcount > 0
+
+
+INSERT_INTERACTION_SQL = (
+    "INSERT INTO interactions(id, user_text, bot_intent, confidence, bot_answer, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_FEEDBACK_SQL = (
+    "INSERT INTO feedback(interaction_id, helpful, correction_intent, corrected_answer, approved, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def reserve_interaction_ids(count: int) -> int:
+    """
+    Reserve `count` consecutive interaction ids and return the first.
+
+    Moves the AUTOINCREMENT counter (sqlite_sequence) past the block inside
+    an IMMEDIATE transaction, so neither plain record_interaction() calls
+    nor other processes can ever be handed an id from it.
+    """
+    con = get_connection()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        row = con.execute("SELECT seq FROM sqlite_sequence WHERE name='interactions'").fetchone()
+        if row is None:
+            last = con.execute("SELECT COALESCE(MAX(id), 0) FROM interactions").fetchone()[0]
+            con.execute("INSERT INTO sqlite_sequence(name, seq) VALUES ('interactions', ?)", (last + count,))
+        else:
+            last = row[0]
+            con.execute("UPDATE sqlite_sequence SET seq=? WHERE name='interactions'", (last + count,))
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    return last + 1
+
+
+def insert_log_rows(
+    interactions: List[tuple],
+    feedback: List[tuple],
+    orphans: Optional[List[tuple]] = None
+) -> int:
+    """
+    Bulk-insert pre-built interaction and feedback rows (see INSERT_*_SQL)
+    in one transaction. If the batch violates a constraint (e.g. feedback for
+    an unknown interaction), rows are retried one by one and bad ones are
+    skipped. Returns the number of rows that could not be written.
+
+    When `orphans` is given, feedback rows rejected only because their
+    interaction does not exist yet are appended to it instead of being
+    counted, so the caller can try them again later.
+    """
+    con = get_connection()
+    try:
+        with con:
+            con.executemany(INSERT_INTERACTION_SQL, interactions)
+            con.executemany(INSERT_FEEDBACK_SQL, feedback)
+        return 0
+    except sqlite3.IntegrityError:
+        pass
+    failed = 0
+    for sql, rows in ((INSERT_INTERACTION_SQL, interactions), (INSERT_FEEDBACK_SQL, feedback)):
+        for row in rows:
+            try:
+                with con:
+                    con.execute(sql, row)
+            except sqlite3.IntegrityError as e:
+                if orphans is not None and sql is INSERT_FEEDBACK_SQL and "FOREIGN KEY" in str(e):
+                    orphans.append(row)
+                else:
+                    failed += 1
+    return failed
 
 
 def get_feedback_training_data() -> List[Dict]:
     """
     Returns approved feedback items joined with their original user_text.
     """
-    con = connect()
-    cur = con.cursor()
-    cur.execute("""
-        SELECT i.user_text, f.correction_intent, f.corrected_answer, f.helpful
+    return list(iter_feedback_training_data())
+
+
+def iter_feedback_training_data(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+    """get_feedback_training_data() as a stream, newest first."""
+    return _keyset("""
+        SELECT f.id, i.user_text, f.correction_intent, f.corrected_answer, f.helpful
         FROM feedback f
         JOIN interactions i ON i.id = f.interaction_id
-        WHERE f.approved = 1
+        WHERE f.approved = 1 AND f.id < ?
         ORDER BY f.id DESC
-    """)
+        LIMIT ?
+    """, chunk_size, descending=True)
+
+
+def get_feedback_corrections() -> Tuple[List[Dict], int]:
+    """
+    All approved intent corrections, oldest first, plus the last
+    correction_events id they reflect (the watermark for
+    get_correction_events, see online.py). Both come from one read
+    transaction, so no event is missed or applied twice.
+    """
+    con = get_connection()
+    con.execute("BEGIN")
+    try:
+        watermark = con.execute("SELECT COALESCE(MAX(id), 0) FROM correction_events").fetchone()[0]
+        rows = con.execute("""
+            SELECT f.id, i.user_text, f.correction_intent
+            FROM feedback f
+            JOIN interactions i ON i.id = f.interaction_id
+            WHERE f.approved = 1 AND f.correction_intent IS NOT NULL AND f.correction_intent <> ''
+            ORDER BY f.id
+        """).fetchall()
+    finally:
+        con.rollback()
+    return [dict(r) for r in rows], watermark
+
+
+def get_correction_events(after_id: int = 0) -> List[Dict]:
+    """
+    correction_events newer than after_id with the feedback row's current
+    text and intent (NULL once the row is gone), oldest first.
+    """
+    cur = get_connection().execute("""
+        SELECT e.id, e.feedback_id, e.approved, i.user_text, f.correction_intent
+        FROM correction_events e
+        LEFT JOIN feedback f ON f.id = e.feedback_id
+        LEFT JOIN interactions i ON i.id = f.interaction_id
+        WHERE e.id > ?
+        ORDER BY e.id
+    """, (after_id,))
     return [dict(r) for r in cur.fetchall()]
+
+
+# ---------------------------
+# Streaming readers / bulk import (see dataio.py)
+# ---------------------------
+def _keyset(sql: str, chunk_size: int, after_id: int = 0, descending: bool = False) -> Iterator[Dict]:
+    """
+    Run `sql` (taking a bound id and a LIMIT, and returning `id` first) page by
+    page, each page continuing from the last id seen. Every page is its own
+    short query, so memory stays at one chunk and no read snapshot is held
+    open between pages (which would stop WAL checkpoints on a busy database).
+    """
+    con = get_connection()
+    last = (1 << 63) - 1 if descending else after_id
+    while True:
+        rows = con.execute(sql, (last, chunk_size)).fetchall()
+        for r in rows:
+            yield dict(r)
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+
+def iter_interactions(after_id: int = 0, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+    """Interactions with id > after_id, oldest first."""
+    return _keyset("""
+        SELECT id, user_text, bot_intent, confidence, bot_answer, created_at
+        FROM interactions
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    """, chunk_size, after_id)
+
+
+def iter_feedback(after_id: int = 0, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+    """Feedback rows with id > after_id and the user_text they refer to, oldest first."""
+    return _keyset("""
+        SELECT f.id, f.interaction_id, i.user_text, i.bot_intent, f.helpful,
+               f.correction_intent, f.corrected_answer, f.approved, f.answer_approved, f.created_at
+        FROM feedback f
+        JOIN interactions i ON i.id = f.interaction_id
+        WHERE f.id > ?
+        ORDER BY f.id
+        LIMIT ?
+    """, chunk_size, after_id)
+
+
+def iter_examples(after_id: int = 0, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+    """intent_examples rows with id > after_id and their intent name, oldest first."""
+    return _keyset("""
+        SELECT e.id, e.example, i.name AS intent
+        FROM intent_examples e
+        JOIN intents i ON i.id = e.intent_id
+        WHERE e.id > ?
+        ORDER BY e.id
+        LIMIT ?
+    """, chunk_size, after_id)
+
+
+def insert_examples(pairs: Iterable[Tuple[str, str]], batch_size: int = 50000) -> Tuple[int, int]:
+    """
+    Bulk-add (example, intent) pairs to intent_examples, creating missing
+    intents. Reads `pairs` lazily and commits every `batch_size` rows, so an
+    input of any size is loaded at constant memory. Pairs already present
+    are skipped (unique index). Returns (rows read, rows inserted).
+    """
+    con = get_connection()
+    read = inserted = 0
+    batch: List[Tuple[str, str]] = []
+
+    def flush():
+        nonlocal inserted
+        before = con.total_changes
+        with con:
+            con.executemany(
+                "INSERT OR IGNORE INTO intents(name, description) VALUES (?, 'Intent for ' || ?)",
+                {(intent, intent) for _, intent in batch},
+            )
+            intents_added = con.total_changes - before
+            con.executemany(
+                "INSERT OR IGNORE INTO intent_examples(intent_id, example) "
+                "SELECT id, ? FROM intents WHERE name = ?",
+                batch,
+            )
+        inserted += con.total_changes - before - intents_added
+        batch.clear()
+
+    for example, intent in pairs:
+        batch.append((example, intent))
+        read += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return read, inserted
+
+
+# ---------------------------
+# Retention
+# ---------------------------
+def archive_interactions(before: str, archive_dir=ARCHIVE_DIR, batch_size: int = 50000) -> int:
+    """
+    Move interactions created before the ISO timestamp `before` out of the
+    main database into monthly partition files (archive_dir/interactions_YYYY_MM.db).
+    Interactions that have feedback stay, since they are training data.
+    Works in batches of `batch_size` rows so each transaction stays short.
+    Returns the number of rows moved.
+    """
+    from pathlib import Path
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    con = get_connection()
+    months = [r[0] for r in con.execute(
+        "SELECT DISTINCT substr(created_at, 1, 7) FROM interactions WHERE created_at < ?",
+        (before,)
+    ).fetchall()]
+
+    moved = 0
+    for month in months:
+        lo, hi = month, min(_next_month(month), before)
+        con.execute("ATTACH DATABASE ? AS arch", (str(archive_dir / f"interactions_{month.replace('-', '_')}.db"),))
+        try:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS arch.interactions (
+                    id INTEGER PRIMARY KEY,
+                    user_text TEXT NOT NULL,
+                    bot_intent TEXT,
+                    confidence REAL,
+                    bot_answer TEXT,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            while True:
+                with con:
+                    ids = [r[0] for r in con.execute("""
+                        SELECT i.id FROM interactions i
+                        WHERE i.created_at >= ? AND i.created_at < ?
+                          AND NOT EXISTS (SELECT 1 FROM feedback f WHERE f.interaction_id = i.id)
+                        LIMIT ?
+                    """, (lo, hi, batch_size)).fetchall()]
+                    if not ids:
+                        break
+                    con.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids(id INTEGER PRIMARY KEY)")
+                    con.execute("DELETE FROM archive_ids")
+                    con.executemany("INSERT INTO archive_ids(id) VALUES (?)", [(i,) for i in ids])
+                    con.execute(
+                        "INSERT OR IGNORE INTO arch.interactions "
+                        "SELECT * FROM interactions WHERE id IN (SELECT id FROM archive_ids)"
+                    )
+                    con.execute("DELETE FROM interactions WHERE id IN (SELECT id FROM archive_ids)")
+                moved += len(ids)
+        finally:
+            con.execute("DETACH DATABASE arch")
+    return moved
+
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
@@ -0,0 +1,253 @@
+"""
+Two-stage intent classifier for large intent catalogues.
+
+A flat softmax scores every intent for every message, so both training and
+prediction cost grow with the number of intents. HierarchicalIntentModel
+splits the work in two:
+
+1. Intents are grouped by what their examples say. The mean tf-idf vectors
+   of the intents are clustered with k-means into groups of about
+   HIERARCHY_GROUP_SIZE intents, and no group is allowed to grow past 1.5x
+   that size. No hand-made taxonomy is needed.
+2. A coarse LogisticRegression over the whole vocabulary predicts the group.
+3. One LogisticRegression per group picks among that group's intents. It is
+   trained on the group's rows and only the columns those rows contain.
+
+An intent's score is P(group | text) * P(intent | group, text). Groups are
+visited from most to least likely, and the search stops once k intents
+score above the next group's probability, because no intent can score
+higher than its own group. The top k is therefore exact, and usually only
+one or two groups are scored. HIERARCHY_BEAM caps the number of groups for
+ambiguous messages.
+
+Logistic regression with few examples per intent is far from calibrated:
+over thousands of intents even a correct top score is often below 0.1. fit()
+therefore holds out HIERARCHY_CALIBRATION_SHARE of the rows, trains on the
+rest, and fits a Platt map (a logistic curve over the logit of the top score)
+from the held-out top-1 scores to whether they were right. The served model is
+then trained on all rows. A caller that already holds rows out (training.py
+does, for its report) can fit the map with calibrate() and pass it to fit(),
+which then trains once. top_k() reports the mapped confidence, so "0.8"
+means right about 80% of the time and CONFIDENCE_THRESHOLD keeps its meaning.
+The map is increasing, so it never changes the order of intents.
+
+Messages are featurized by lean.LeanIntentModel (the TfidfVectorizer's
+arithmetic without sklearn's overhead). There is no compact export; the
+model is published as a pickle.
+"""
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import normalize
+
+from .config import HIERARCHY_BEAM, HIERARCHY_CALIBRATION_SHARE, HIERARCHY_GROUP_SIZE, INTENT_TOP_K
+from .lean import LeanIntentModel
+
+MAX_GROUP_FACTOR = 1.5  # largest group, relative to the average
+_EPS = 1e-12
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = np.exp(scores - scores.max())
+    return scores / scores.sum()
+
+
+def _softmax_weights(clf) -> Tuple[np.ndarray, np.ndarray]:
+    """(coef_t, intercept) with a column per class; binary models get a zero column, so softmax == expit."""
+    coef, intercept = clf.coef_, clf.intercept_
+    if coef.shape[0] == 1:
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([[0.0], intercept])
+    return np.ascontiguousarray(coef.T, dtype=np.float64), np.asarray(intercept, dtype=np.float64)
+
+
+def top_k_of(probas: np.ndarray, classes: Sequence, k: int) -> List[Tuple[str, float]]:
+    """The k most probable (label, probability) pairs of a probability row, best first."""
+    k = min(k, len(probas))
+    top = np.argpartition(-probas, k - 1)[:k] if k < len(probas) else np.arange(len(probas))
+    top = top[np.argsort(-probas[top], kind="stable")]
+    return [(str(classes[j]), float(probas[j])) for j in top]
+
+
+def group_intents(X: sparse.csr_matrix, y: np.ndarray, n_classes: int, group_size: int,
+                  random_state: int = 42) -> np.ndarray:
+    """Group id per class (0..n_groups-1) from balanced k-means over the classes' mean tf-idf vectors."""
+    n_groups = max(1, min(n_classes, round(n_classes / group_size)))
+    if n_groups == 1:
+        return np.zeros(n_classes, dtype=np.intp)
+    members = sparse.csr_matrix((np.ones(len(y)), (y, np.arange(len(y)))), shape=(n_classes, len(y)))
+    centroids = normalize(members @ X)
+    centers = KMeans(n_clusters=n_groups, n_init=1, random_state=random_state).fit(centroids).cluster_centers_
+    # Plain k-means on text leaves a few huge clusters; cap the size so no second stage approaches
+    # the flat model. Classes closest to a center are placed first.
+    sims = np.asarray(centroids @ centers.T)
+    cap = math.ceil(MAX_GROUP_FACTOR * n_classes / n_groups)
+    groups = np.empty(n_classes, dtype=np.intp)
+    sizes = np.zeros(n_groups, dtype=np.intp)
+    for c in np.argsort(-sims.max(axis=1), kind="stable"):
+        g = next(g for g in np.argsort(-sims[c]) if sizes[g] < cap)
+        groups[c] = g
+        sizes[g] += 1
+    return np.unique(groups, return_inverse=True)[1]  # no gaps left by empty clusters
+
+
+class HierarchicalIntentModel:
+    """Intent groups first, then the intents of the likeliest groups (see module docstring)."""
+
+    def __init__(self, C: float = 1.0, ngram_range: Tuple[int, int] = (1, 2), min_df: int = 1,
+                 group_size: int = HIERARCHY_GROUP_SIZE, calibration_share: float = HIERARCHY_CALIBRATION_SHARE,
+                 max_iter: int = 1000):
+        self.C = C
+        self.ngram_range = tuple(ngram_range)
+        self.min_df = min_df
+        self.group_size = group_size
+        self.calibration_share = calibration_share
+        self.max_iter = max_iter
+
+    def _classifier(self, solver: str = "lbfgs") -> LogisticRegression:
+        return LogisticRegression(max_iter=self.max_iter, C=self.C, solver=solver, random_state=42)
+
+    def fit(self, texts: List[str], labels: List[str],
+            calibration: Optional[Tuple[float, float]] = None) -> "HierarchicalIntentModel":
+        """
+        Train both stages on all rows. `calibration` is a Platt map fitted
+        elsewhere (see calibrate()); without one, calibration_share of the
+        rows is held out to fit it, which costs a second training run.
+        """
+        texts = list(texts)
+        vec = TfidfVectorizer(ngram_range=self.ngram_range, min_df=self.min_df)
+        X = vec.fit_transform(texts)
+        self.classes_, y = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+        groups = group_intents(X, y, len(self.classes_), self.group_size)
+
+        self.calibration_ = (1.0, 0.0)  # identity map
+        counts = np.bincount(y)
+        n_held = math.ceil(self.calibration_share * len(y))
+        if calibration is not None:
+            self.calibration_ = tuple(calibration)
+        elif self.calibration_share > 0 and counts.min() >= 2 and len(counts) <= n_held <= len(y) - len(counts):
+            train, held = train_test_split(np.arange(len(y)), test_size=n_held, random_state=42, stratify=y)
+            self._fit_stages(vec, X[train], y[train], groups)
+            self.calibration_ = self._fit_calibration([texts[i] for i in held], y[held])
+        self._fit_stages(vec, X, y, groups)
+        return self
+
+    def _fit_stages(self, vec: TfidfVectorizer, X: sparse.csr_matrix, y: np.ndarray, groups: np.ndarray) -> None:
+        n_groups = int(groups.max()) + 1
+        row_groups = groups[y]
+        if n_groups > 1:
+            # saga: same optimum, but far faster than lbfgs with many groups x many sparse columns
+            coef_t, intercept = _softmax_weights(self._classifier("saga").fit(X, row_groups))
+        else:
+            coef_t, intercept = np.zeros((X.shape[1], 1)), np.zeros(1)
+        self.coarse = LeanIntentModel.from_vectorizer(vec, coef_t, intercept, np.arange(n_groups))
+
+        self.group_classes_, self.group_cols_, self.group_coef_t_, self.group_intercept_ = [], [], [], []
+        for g in range(n_groups):
+            members = np.flatnonzero(groups == g)
+            if len(members) == 1:
+                cols, coef_t, intercept = np.empty(0, dtype=np.intp), np.zeros((0, 1)), np.zeros(1)
+            else:
+                rows = X[row_groups == g]
+                cols = np.unique(rows.indices)  # weights of columns the group never sees stay 0
+                coef_t, intercept = _softmax_weights(self._classifier().fit(rows[:, cols], y[row_groups == g]))
+            self.group_classes_.append(members)
+            # a sentinel past the last column keeps searchsorted() positions in range
+            self.group_cols_.append(np.append(cols, X.shape[1]).astype(np.intp))
+            self.group_coef_t_.append(coef_t)
+            self.group_intercept_.append(intercept)
+
+    def calibrate(self, texts: List[str], labels: List[str]) -> Tuple[float, float]:
+        """The Platt map for messages this model was not trained on (it is not applied here)."""
+        ids = {label: i for i, label in enumerate(self.classes_)}
+        return self._fit_calibration(list(texts), np.array([ids.get(label, -1) for label in labels]))
+
+    def _fit_calibration(self, texts: List[str], y: np.ndarray) -> Tuple[float, float]:
+        """Platt map (slope, intercept) from the logit of held-out top-1 scores to P(correct)."""
+        top = [self._top(text, 1)[0] for text in texts]
+        hit = np.array([c == true for (c, _), true in zip(top, y)])
+        if hit.all() or not hit.any():
+            return 1.0, 0.0
+        p = np.clip([p for _, p in top], _EPS, 1 - _EPS)
+        x = np.log(p / (1 - p))[:, None]
+        clf = LogisticRegression(C=1e4).fit(x, hit)
+        slope, intercept = float(clf.coef_[0, 0]), float(clf.intercept_[0])
+        return (slope, intercept) if slope > 0 else (1.0, 0.0)
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.group_classes_)
+
+    @property
+    def vocabulary(self) -> dict:
+        return self.coarse.vocabulary
+
+    def describe(self) -> str:
+        sizes = [len(m) for m in self.group_classes_]
+        return (f"Hierarchical classifier: {len(self.classes_)} intents in {self.n_groups} groups "
+                f"(largest {max(sizes)}), at most {HIERARCHY_BEAM} groups scored per message.")
+
+    def calibrated(self, score: float) -> float:
+        slope, intercept = self.calibration_
+        score = min(max(score, _EPS), 1 - _EPS)
+        return 1.0 / (1.0 + math.exp(-(slope * math.log(score / (1 - score)) + intercept)))
+
+    def _group_proba(self, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        cols, vals = self.coarse.features(text)
+        return cols, vals, _softmax(vals @ self.coarse.coef_t[cols] + self.coarse.intercept)
+
+    def _intent_scores(self, g: int, cols: np.ndarray, vals: np.ndarray, p_group: float) -> np.ndarray:
+        """P(group) * P(intent | group) for the intents of group g."""
+        gcols = self.group_cols_[g]
+        pos = gcols.searchsorted(cols)
+        hit = gcols[pos] == cols
+        scores = vals[hit] @ self.group_coef_t_[g][pos[hit]] + self.group_intercept_[g]
+        scores = np.exp(scores - scores.max())
+        return scores * (p_group / scores.sum())
+
+    def _top(self, text: str, k: int, beam: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        The k best (class id, uncalibrated score) pairs, visiting groups from
+        the likeliest until the k-th best beats the next group's probability.
+        """
+        cols, vals, p_group = self._group_proba(text)
+        order = np.argsort(-p_group)[:HIERARCHY_BEAM if beam is None else beam].tolist()
+        ids, scores, kth = [], [], -1.0
+        for rank, g in enumerate(order):
+            p = self._intent_scores(g, cols, vals, p_group[g])
+            if k == 1:  # the hot path: keep only the best so far
+                j = int(p.argmax())
+                if p[j] > kth:
+                    ids, kth = [(int(self.group_classes_[g][j]), float(p[j]))], float(p[j])
+            else:
+                ids.append(self.group_classes_[g])
+                scores.append(p)
+                best = np.concatenate(scores)
+                kth = float(np.partition(best, len(best) - k)[len(best) - k]) if len(best) >= k else -1.0
+            if rank + 1 < len(order) and kth >= p_group[order[rank + 1]]:
+                break
+        if k == 1:
+            return ids
+        return [(int(c), score) for c, score in top_k_of(np.concatenate(scores), np.concatenate(ids), k)]
+
+    def top_k(self, text: str, k: int = INTENT_TOP_K, beam: Optional[int] = None) -> List[Tuple[str, float]]:
+        """The k likeliest (intent, calibrated confidence) pairs for one normalized message, best first."""
+        return [(str(self.classes_[c]), self.calibrated(score)) for c, score in self._top(text, k, beam)]
+
+    def predict_proba(self, texts: List[str], beam: Optional[int] = None) -> np.ndarray:
+        """Uncalibrated P(group) * P(intent | group) per intent; 0 for the groups outside the beam."""
+        out = np.zeros((len(texts), len(self.classes_)))
+        for i, text in enumerate(texts):
+            cols, vals, p_group = self._group_proba(text)
+            for g in np.argsort(-p_group)[:HIERARCHY_BEAM if beam is None else beam]:
+                out[i, self.group_classes_[g]] = self._intent_scores(g, cols, vals, p_group[g])
+        return out
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        return np.array([self.classes_[self._top(text, 1)[0][0]] for text in texts])
@@ -1,48 +1,154 @@
-from typing import Tuple, Optional
+import time
+from typing import Dict, List, Tuple, Optional
 from .nlp import normalize
-from .db import get_fact, get_smalltalk_matches
-from .config import CONFIDENCE_THRESHOLD
+from .knowledge import match_smalltalk, response_for
+from . import hierarchy, lean, metrics, response_cache, retrieval, spelling
+from .config import CONFIDENCE_THRESHOLD, INTENT_TOP_K
 
-# For business logic mapping from intent to responses
+# Replies come from the response_templates registry (knowledge.py), pre-rendered per intent
+@metrics.timed("facts")
 def respond_for_intent(intent: str) -> Optional[str]:
-    if intent == "account_types":
-        facts = get_fact("account_types")
-        return f"We currently offer: {facts}." if facts else "We offer Savings, Current, and FD accounts."
-    if intent == "loan_rates":
-        personal = get_fact("loan_personal_rate") or "N/A"
-        home = get_fact("loan_home_rate") or "N/A"
-        auto = get_fact("loan_auto_rate") or "N/A"
-        return f"Loan interest rates — Personal: {personal}, Home: {home}, Auto: {auto}."
-    if intent == "branch_hours":
-        wd = get_fact("branch_hours_weekday") or "Mon–Fri: 9–3"
-        we = get_fact("branch_hours_weekend") or "Sat: 9–12; Sun: Closed"
-        return f"Branch hours — Weekdays: {wd}. Weekends: {we}."
-    if intent == "atm_availability":
-        return "ATMs are available 24/7 at most branches. Please share your city to suggest nearby ATMs."
-    if intent == "greeting":
-        return "Hello! I’m your banking assistant. How can I help?"
-    if intent == "goodbye":
-        return "Goodbye! Happy to help anytime."
-    if intent == "thanks":
-        return "You're welcome! Anything else I can do?"
-    return None
+    return response_for(intent)
 
 def smalltalk_or_none(text_norm: str) -> Optional[str]:
-    return get_smalltalk_matches(text_norm)
+    return match_smalltalk(text_norm)
 
 def infer_intent_and_answer(model, user_text: str) -> Tuple[Optional[str], Optional[str], float]:
     text_norm = normalize(user_text)
-    # smalltalk first
+    if not response_cache.ENABLED:
+        return _infer_normalized(model, text_norm)
+    # repeated (or near-identical) messages are answered from the response cache
+    cached = response_cache.get(model, text_norm)
+    if cached is not None:
+        return _replay(cached)
+    t0 = time.perf_counter()
+    entry = _infer_entry(model, text_norm)
+    response_cache.put(model, text_norm, entry, time.perf_counter() - t0)
+    return entry[:3]
+
+def _replay(entry: response_cache.Entry) -> Tuple[Optional[str], Optional[str], float]:
+    """A cached response; a replayed prediction still counts in the confidence metrics."""
+    intent, answer, confidence, predicted = entry
+    if predicted is not None and metrics.ENABLED:
+        metrics.observe_confidence(predicted, confidence)
+    return intent, answer, confidence
+
+def _infer_normalized(model, text_norm: str) -> Tuple[Optional[str], Optional[str], float]:
+    return _infer_entry(model, text_norm)[:3]
+
+def _infer_entry(model, text_norm: str) -> response_cache.Entry:
+    """The response plus the classifier's top intent, or None when smalltalk/learned answered."""
+    # smalltalk first, on the text as typed: a "correction" can make a greeting out of "him"
     st = smalltalk_or_none(text_norm)
     if st:
-        return "smalltalk", st, 1.0
-    # ML prediction
-    probas = model.predict_proba([text_norm])[0]
-    labels = model.classes_
-    top_idx = probas.argmax()
-    top_label = labels[top_idx]
-    confidence = float(probas[top_idx])
+        return "smalltalk", st, 1.0, None
+    fixed = _correct_spelling(model, text_norm)
+    # then answers users taught us for (nearly) this exact question
+    hit = _lookup_learned(text_norm, fixed)
+    if hit:
+        return "learned", hit[0], hit[1], None
+    # ML prediction, through the lean predictor when the model has one
+    label, confidence = _predict_one(model, text_norm)
+    if fixed != text_norm and confidence < CONFIDENCE_THRESHOLD:
+        label, confidence = _prefer_corrected((label, confidence), _predict_one(model, fixed))
+    return (*_answer_for(label, confidence), label)
+
+def _prefer_corrected(typed: Tuple[str, float], corrected: Tuple[str, float]) -> Tuple[str, float]:
+    """The corrected text's prediction only if it gets an answer the text as typed doesn't."""
+    return corrected if typed[1] < CONFIDENCE_THRESHOLD <= corrected[1] else typed
+
+def top_intents(model, user_text: str, k: int = INTENT_TOP_K) -> List[Tuple[str, float]]:
+    """The k likeliest intents for a message with their confidences, best first (no threshold applied)."""
+    text_norm = normalize(user_text)
+    top = _top_intents(model, text_norm, k)
+    fixed = _correct_spelling(model, text_norm)
+    if fixed != text_norm and top[0][1] < CONFIDENCE_THRESHOLD:
+        corrected = _top_intents(model, fixed, k)
+        if corrected[0][1] >= CONFIDENCE_THRESHOLD:
+            return corrected
+    return top
+
+@metrics.timed("spelling")
+def _correct_spelling(model, text_norm: str) -> str:
+    index = spelling.for_model(model)
+    return index.correct(text_norm) if index is not None else text_norm
+
+def _lookup_learned(text_norm: str, fixed: str):
+    # learned questions may use words the spelling dictionary lacks, so try the text as typed first
+    return retrieval.lookup(text_norm) or (retrieval.lookup(fixed) if fixed != text_norm else None)
+
+def _top_intents(model, text_norm: str, k: int) -> List[Tuple[str, float]]:
+    # the two-stage model only scores its likeliest intent groups (hierarchy.py)
+    if isinstance(model, hierarchy.HierarchicalIntentModel):
+        return model.top_k(text_norm, k)
+    fast = lean.for_model(model)
+    probas = fast.proba_one(text_norm) if fast is not None else model.predict_proba([text_norm])[0]
+    return hierarchy.top_k_of(probas, model.classes_, k)
+
+@metrics.timed("predict")
+def _predict_one(model, text_norm: str) -> Tuple[str, float]:
+    return _top_intents(model, text_norm, 1)[0]
+
+@metrics.timed("predict_batch")
+def _predict_many(model, texts_norm: List[str]) -> List[Tuple[str, float]]:
+    if isinstance(model, hierarchy.HierarchicalIntentModel):
+        return [model.top_k(t, 1)[0] for t in texts_norm]
+    probas = (lean.for_model(model) or model).predict_proba(texts_norm)
+    top = probas.argmax(axis=1)
+    return [(str(model.classes_[j]), float(probas[row, j])) for row, j in enumerate(top)]
+
+def _answer_for(label: str, confidence: float) -> Tuple[Optional[str], Optional[str], float]:
+    if metrics.ENABLED:
+        metrics.observe_confidence(label, confidence)
     if confidence < CONFIDENCE_THRESHOLD:
         return None, None, confidence
-    answer = respond_for_intent(top_label)
-    return top_label, answer, confidence
+    return label, respond_for_intent(label), confidence
+
+def infer_batch(model, texts: List[str]) -> List[Dict]:
+    """
+    Score many messages at once. Cached responses, spelling, smalltalk and
+    learned answers are resolved per message; everything else is classified in a
+    single predict_proba call (the lean predictor's when available; the two-stage
+    model scores them one by one). Returns one dict per input, in order:
+    {"text", "intent", "answer", "confidence"}.
+    """
+    norms = [normalize(t) for t in texts]
+    fixed = list(norms)
+    results: List[Optional[Dict]] = [None] * len(texts)
+    pending, computed = [], []
+    predicted: Dict[int, str] = {}
+    for i, text_norm in enumerate(norms):
+        cached = response_cache.get(model, text_norm) if response_cache.ENABLED else None
+        if cached is not None:
+            intent, answer, conf = _replay(cached)
+            results[i] = {"text": texts[i], "intent": intent, "answer": answer, "confidence": conf}
+            continue
+        computed.append(i)
+        st = smalltalk_or_none(text_norm)
+        if st:
+            results[i] = {"text": texts[i], "intent": "smalltalk", "answer": st, "confidence": 1.0}
+            continue
+        fixed[i] = _correct_spelling(model, text_norm)
+        hit = _lookup_learned(text_norm, fixed[i])
+        if hit:
+            results[i] = {"text": texts[i], "intent": "learned", "answer": hit[0], "confidence": hit[1]}
+        else:
+            pending.append(i)
+
+    if pending:
+        predictions = _predict_many(model, [norms[i] for i in pending])
+        # typos: the corrected text, where it gets an answer the text as typed doesn't
+        retry = [j for j, i in enumerate(pending) if fixed[i] != norms[i] and predictions[j][1] < CONFIDENCE_THRESHOLD]
+        if retry:
+            for j, corrected in zip(retry, _predict_many(model, [fixed[pending[j]] for j in retry])):
+                predictions[j] = _prefer_corrected(predictions[j], corrected)
+        for i, (label, confidence) in zip(pending, predictions):
+            predicted[i] = label
+            intent, answer, conf = _answer_for(label, confidence)
+            results[i] = {"text": texts[i], "intent": intent, "answer": answer, "confidence": conf}
+
+    if response_cache.ENABLED:
+        for i in computed:
+            r = results[i]
+            response_cache.put(model, norms[i], (r["intent"], r["answer"], r["confidence"], predicted.get(i)))
+    return results
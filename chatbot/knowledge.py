@@ -0,0 +1,147 @@
+import json
+import string
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from . import db, metrics
+from .config import KB_CHECK_INTERVAL
+from .matcher import SmalltalkMatcher
+
+
+class _Snapshot(NamedTuple):
+    version: int
+    facts: Dict[str, str]
+    smalltalk: SmalltalkMatcher
+    responses: Dict[str, str]            # intent -> reply, already rendered
+    template_errors: Dict[str, str]      # intent -> why its template was rejected
+
+
+def template_fields(template: str) -> Tuple[str, ...]:
+    """
+    The fact keys a template declares through its {fact_key} placeholders.
+    Only plain names are allowed (no attributes, indexes, conversions or
+    format specs), so rendering is simple substitution.
+    """
+    fields = []
+    for _, name, spec, conversion in string.Formatter().parse(template):
+        if name is None:
+            continue
+        if not name.isidentifier() or spec or conversion:
+            raise ValueError(f"placeholder {{{name}{'!' + conversion if conversion else ''}"
+                             f"{':' + spec if spec else ''}}} is not a plain fact key")
+        fields.append(name)
+    return tuple(dict.fromkeys(fields))
+
+
+def compile_templates(
+    rows: Iterable[Tuple[str, str, Optional[str], Optional[str]]],
+    facts: Dict[str, str],
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Render every (intent, template, defaults JSON, fallback) row against
+    `facts`: returns ({intent: reply}, {intent: error}).
+
+    A placeholder takes the fact's value, or its default when the fact is
+    missing or empty; if neither exists the intent answers with its
+    fallback, and without one it has no reply (like an unknown intent).
+    Malformed rows are reported in the errors and fall back the same way.
+    """
+    responses, errors = {}, {}
+    for intent, template, defaults, fallback in rows:
+        try:
+            fields = template_fields(template)
+            defaults = json.loads(defaults) if defaults else {}
+            if not isinstance(defaults, dict):
+                raise ValueError("defaults must be a JSON object")
+        except ValueError as e:
+            errors[intent] = str(e)
+            if fallback:
+                responses[intent] = fallback
+            continue
+        values = {}
+        for key in fields:
+            value = facts.get(key) or defaults.get(key)
+            if not value:
+                break
+            values[key] = str(value)
+        else:
+            responses[intent] = template.format_map(values)
+            continue
+        if fallback:
+            responses[intent] = fallback
+    return responses, errors
+
+
+class KnowledgeCache:
+    """
+    Process-local copy of the facts, smalltalk and response_templates tables.
+
+    They are loaded once and reloaded only when kb_meta.version (bumped by
+    triggers on every change) moves. Templates are rendered against the facts
+    at load time, so answering an intent is one dict lookup; a reload swaps
+    facts, smalltalk and replies together in a single assignment. The
+    version is read at most once per check_interval seconds, so a
+    steady-state chat turn does no SQL at all. Call refresh() to force a
+    reload.
+    """
+
+    def __init__(self, check_interval: float = KB_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._next_check = 0.0
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._load()
+
+    def invalidate(self) -> None:
+        """Make the next lookup re-check the version."""
+        self._next_check = 0.0
+
+    @property
+    def version(self) -> int:
+        return self._current().version
+
+    def get_fact(self, key: str) -> Optional[str]:
+        return self._current().facts.get(key)
+
+    def match_smalltalk(self, text_norm: str) -> Optional[str]:
+        return self._current().smalltalk.match(text_norm)
+
+    def response_for(self, intent: str) -> Optional[str]:
+        return self._current().responses.get(intent)
+
+    @property
+    def template_errors(self) -> Dict[str, str]:
+        return dict(self._current().template_errors)
+
+    # -- internals --
+    def _current(self) -> _Snapshot:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() < self._next_check:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is None or db.get_kb_version() != snap.version:
+                snap = self._load()
+            self._next_check = time.monotonic() + self.check_interval
+            return snap
+
+    def _load(self) -> _Snapshot:
+        # Version first: an edit landing mid-load leaves us one version
+        # behind, so the next check reloads again rather than missing it.
+        version = db.get_kb_version()
+        smalltalk = SmalltalkMatcher(db.get_smalltalk_rows())
+        facts = db.get_all_facts()
+        responses, errors = compile_templates(db.get_response_templates(), facts)
+        self._snapshot = _Snapshot(version, facts, smalltalk, responses, errors)
+        return self._snapshot
+
+
+kb = KnowledgeCache()
+get_fact = kb.get_fact
+match_smalltalk = metrics.timed("smalltalk")(kb.match_smalltalk)
+response_for = kb.response_for
+refresh = kb.refresh
@@ -0,0 +1,162 @@
+"""
+Lean intent predictor for the single-message hot path.
+
+Pipeline.predict_proba on one message goes through input validation, the
+vectorizer's analyzer closures, a CSR build and a sparse-dense product over
+the full coefficient matrix. LeanIntentModel does only the arithmetic: the
+message's n-grams are looked up in a plain dict, the few matching rows of
+coef_ (stored transposed) are gathered and dotted with the tf-idf weights,
+and a NumPy softmax turns the scores into probabilities.
+
+for_model() returns the lean predictor for a served model (a Pipeline or a
+CompactIntentModel), built once per model and checked against the model's
+own predict_proba before it is used; models it can't reproduce (e.g. the
+incremental hashing + SGD model) get None and keep using predict_proba.
+"""
+import re
+import threading
+import weakref
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from . import compact
+
+VERIFY_TOLERANCE = 1e-9
+VERIFY_TEXTS = [
+    "", "hello", "what are your loan rates", "when is the branch open on saturday",
+    "is there an atm near me", "thanks bye", "an entirely unknown sentence",
+]
+
+
+class LeanIntentModel:
+    def __init__(self, vocabulary: dict, idf: np.ndarray, coef_t: np.ndarray, intercept: np.ndarray,
+                 classes, settings: dict, fingerprint: Optional[str] = None):
+        self.vocabulary = vocabulary          # n-gram -> column
+        self.idf = idf
+        self.coef_t = coef_t                  # (n_features, n_classes), or (n_features, 1) if binary
+        self.intercept = intercept
+        self.classes_ = np.asarray(classes)
+        self.settings = settings
+        self.fingerprint_ = fingerprint
+        self._token_re = re.compile(settings["token_pattern"])
+        self._ngram_range = tuple(settings["ngram_range"])
+
+    @classmethod
+    def from_pipeline(cls, model) -> "LeanIntentModel":
+        if not compact.supports(model):
+            raise ValueError("not a TfidfVectorizer + LogisticRegression pipeline")
+        vec, clf = model.named_steps["vec"], model.named_steps["clf"]
+        return cls.from_vectorizer(
+            vec, np.ascontiguousarray(clf.coef_.T, dtype=np.float64), np.asarray(clf.intercept_, dtype=np.float64),
+            clf.classes_, getattr(model, "fingerprint_", None))
+
+    @classmethod
+    def from_vectorizer(cls, vec, coef_t: np.ndarray, intercept: np.ndarray, classes,
+                        fingerprint: Optional[str] = None) -> "LeanIntentModel":
+        """A fitted TfidfVectorizer's featurization with the given (n_features, n_classes) weights."""
+        n_features = len(vec.vocabulary_)
+        return cls(
+            vocabulary={term: int(col) for term, col in vec.vocabulary_.items()},
+            idf=np.asarray(vec.idf_ if vec.use_idf else np.ones(n_features), dtype=np.float64),
+            coef_t=coef_t,
+            intercept=intercept,
+            classes=classes,
+            settings={"lowercase": vec.lowercase, "token_pattern": vec.token_pattern,
+                      "ngram_range": list(vec.ngram_range), "norm": vec.norm,
+                      "use_idf": vec.use_idf, "sublinear_tf": vec.sublinear_tf},
+            fingerprint=fingerprint,
+        )
+
+    @classmethod
+    def from_compact(cls, model: "compact.CompactIntentModel") -> "LeanIntentModel":
+        """Share the compact model's (memory-mapped) arrays; only the vocabulary dict is built."""
+        vocabulary = {term.decode("utf-8"): col for col, term in enumerate(model.vocab.tolist())}
+        return cls(vocabulary, model.idf, model.coef_t, model.intercept, model.classes_,
+                   model.meta, model.fingerprint_)
+
+    def features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(columns, tf-idf weights) of one message, normalized like the vectorizer."""
+        counts = {}
+        vocab = self.vocabulary
+        for gram in compact.word_ngrams(text, self._token_re, self._ngram_range, self.settings["lowercase"]):
+            col = vocab.get(gram)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        cols = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        vals = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if not len(cols):
+            return cols, vals
+        if self.settings["sublinear_tf"]:
+            vals = np.log(vals) + 1
+        if self.settings["use_idf"]:
+            vals *= self.idf[cols]
+        if self.settings["norm"] == "l2":
+            vals /= np.sqrt(vals @ vals)
+        elif self.settings["norm"] == "l1":
+            vals /= np.abs(vals).sum()
+        return cols, vals
+
+    def proba_one(self, text: str) -> np.ndarray:
+        """Class probabilities for one (already normalized) message."""
+        cols, vals = self.features(text)
+        scores = vals @ self.coef_t[cols] + self.intercept
+        if scores.shape[0] == 1:
+            p = 1.0 / (1.0 + np.exp(-scores[0]))
+            return np.array([1.0 - p, p])
+        scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        if not len(texts):
+            return np.empty((0, len(self.classes_)))
+        return np.vstack([self.proba_one(t) for t in texts])
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+    def verify(self, model, texts: List[str], tol: float = VERIFY_TOLERANCE) -> float:
+        """Max |difference| from model.predict_proba over texts; ValueError beyond tol."""
+        if list(map(str, self.classes_)) != list(map(str, model.classes_)):
+            raise ValueError("class labels differ")
+        diff = float(np.abs(self.predict_proba(texts) - model.predict_proba(texts)).max())
+        if diff > tol:
+            raise ValueError(f"lean predictor differs from the model by {diff:.3g}")
+        return diff
+
+
+_lean: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lean_lock = threading.Lock()
+
+
+def for_model(model) -> Optional[LeanIntentModel]:
+    """The verified lean predictor for `model`, or None if it can't be reproduced."""
+    if model is None or isinstance(model, LeanIntentModel):
+        return model
+    try:
+        return _lean[model]
+    except KeyError:
+        pass
+    except TypeError:  # not weak-referenceable: don't rebuild on every call
+        return None
+    with _lean_lock:
+        if model not in _lean:
+            _lean[model] = _build(model)
+        return _lean[model]
+
+
+def _build(model) -> Optional[LeanIntentModel]:
+    try:
+        if isinstance(model, compact.CompactIntentModel):
+            lean = LeanIntentModel.from_compact(model)
+        elif compact.supports(model):
+            lean = LeanIntentModel.from_pipeline(model)
+        else:
+            return None
+        # a spread of the model's own n-grams, so the check exercises real coefficients
+        terms = list(lean.vocabulary)[:: max(1, len(lean.vocabulary) // 60)]
+        probes = VERIFY_TEXTS + [" ".join(terms[i:i + 6]) for i in range(0, len(terms), 6)]
+        lean.verify(model, probes)
+    except ValueError:
+        return None
+    return lean
@@ -0,0 +1,80 @@
+"""
+Database maintenance.
+
+    python -m chatbot.maintenance migrate
+    python -m chatbot.maintenance archive [--days 90]
+    python -m chatbot.maintenance learned
+    python -m chatbot.maintenance approve ID [--revoke]
+    python -m chatbot.maintenance answers
+    python -m chatbot.maintenance approve-answer ID [--revoke]
+    python -m chatbot.maintenance approve-correction ID [--revoke]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from .db import (
+    init_db,
+    archive_interactions,
+    list_user_learned,
+    approve_user_learning,
+    list_feedback_answers,
+    approve_feedback,
+    approve_correction,
+    smalltalk_conflicts,
+)
+from .config import ARCHIVE_DIR, INTERACTION_RETENTION_DAYS
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Database maintenance tasks.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("migrate", help="create tables, apply pending migrations and seed data")
+    arch = sub.add_parser("archive", help="move old interactions into monthly archive files")
+    arch.add_argument("--days", type=int, default=INTERACTION_RETENTION_DAYS,
+                      help="keep interactions newer than this many days")
+    sub.add_parser("learned", help="list taught Q&A waiting for review")
+    appr = sub.add_parser("approve", help="serve a taught Q&A from the retrieval index")
+    appr.add_argument("id", type=int)
+    appr.add_argument("--revoke", action="store_true", help="stop serving it instead")
+    sub.add_parser("answers", help="list corrected answers from feedback waiting for review")
+    appr_fb = sub.add_parser("approve-answer", help="serve a corrected answer from feedback")
+    appr_fb.add_argument("id", type=int)
+    appr_fb.add_argument("--revoke", action="store_true", help="stop serving it instead")
+    appr_ic = sub.add_parser("approve-correction", help="train on a feedback row's rating and intent correction")
+    appr_ic.add_argument("id", type=int)
+    appr_ic.add_argument("--revoke", action="store_true", help="stop training on it instead")
+    args = ap.parse_args()
+
+    init_db()  # always brings the schema up to date first
+    if args.cmd == "migrate":
+        print("Schema is up to date.")
+        for pattern, responses in smalltalk_conflicts().items():
+            print(f"Smalltalk pattern {pattern!r} has {len(responses)} responses (only the first is served):")
+            for response in responses:
+                print(f"    {response}")
+    elif args.cmd == "archive":
+        cutoff = (datetime.utcnow() - timedelta(days=args.days)).isoformat()
+        moved = archive_interactions(cutoff)
+        print(f"Archived {moved} interactions older than {cutoff} to {ARCHIVE_DIR}.")
+    elif args.cmd == "learned":
+        for row in list_user_learned():
+            print(f"{row['id']:>6}  Q: {row['question']}\n        A: {row['answer']}")
+    elif args.cmd == "approve":
+        if not approve_user_learning(args.id, approved=not args.revoke):
+            raise SystemExit(f"No learned Q&A with id {args.id}.")
+        print(f"{'Revoked' if args.revoke else 'Approved'} learned Q&A {args.id}.")
+    elif args.cmd == "answers":
+        for row in list_feedback_answers():
+            print(f"{row['id']:>6}  Q: {row['question']}\n        A: {row['answer']}")
+    elif args.cmd == "approve-answer":
+        if not approve_feedback(args.id, approved=not args.revoke):
+            raise SystemExit(f"No feedback with id {args.id}.")
+        print(f"{'Revoked' if args.revoke else 'Approved'} feedback answer {args.id}.")
+    elif args.cmd == "approve-correction":
+        if not approve_correction(args.id, approved=not args.revoke):
+            raise SystemExit(f"No feedback with id {args.id}.")
+        print(f"{'Revoked' if args.revoke else 'Approved'} feedback correction {args.id}.")
+
+
+if __name__ == "__main__":
+    main()
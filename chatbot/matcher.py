@@ -0,0 +1,77 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def pattern_tokens(pattern: str) -> Tuple[str, ...]:
+    """'%good morning%' -> ('good', 'morning'). The % wildcards only mark word edges."""
+    return tuple(_NON_WORD.sub(" ", pattern.lower()).split())
+
+
+class SmalltalkMatcher:
+    """
+    Aho–Corasick automaton over word tokens, built once from smalltalk rows.
+
+    Patterns match whole words only ("hi" no longer fires on "this"), and a
+    scan costs O(tokens in the message) regardless of how many patterns
+    exist. When several patterns match, the earliest row wins, the same
+    priority as the old row-by-row loop.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, str]]):
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]  # lowest row index ending here (incl. via fail links)
+        self.responses: List[str] = []
+
+        for pattern, response in rows:
+            tokens = pattern_tokens(pattern)
+            if not tokens:
+                continue
+            prio = len(self.responses)
+            self.responses.append(response)
+            node = 0
+            for tok in tokens:
+                nxt = self._goto[node].get(tok)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][tok] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                node = nxt
+            if self._best[node] is None:
+                self._best[node] = prio  # first row with this pattern wins
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def _link(self) -> None:
+        queue = list(self._goto[0].values())
+        for node in queue:  # BFS; appending while iterating is intended
+            for tok, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and tok not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(tok, 0)
+                self._fail[child] = target if target != child else 0
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+                queue.append(child)
+
+    def match(self, text_norm: str) -> Optional[str]:
+        goto, fail, best = self._goto, self._fail, self._best
+        node, found = 0, None
+        for tok in text_norm.split():
+            while node and tok not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(tok, 0)
+            prio = best[node]
+            if prio is not None and (found is None or prio < found):
+                found = prio
+                if found == 0:
+                    break
+        return None if found is None else self.responses[found]
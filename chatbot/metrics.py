@@ -0,0 +1,223 @@
+"""
+In-process metrics for the chat hot path.
+
+Stages are timed with the monotonic perf_counter by wrapping the functions
+that make up a chat turn:
+
+    normalize      nlp.normalize
+    smalltalk      knowledge.match_smalltalk
+    spelling       typo correction (spelling.py)
+    retrieval      retrieval.lookup
+    predict        the classifier call (lean predictor, two-stage top_k or predict_proba)
+    predict_batch  the same for a micro-batch (infer_batch)
+    facts          inference.respond_for_intent (the response template registry)
+    log            writebehind.record_interaction (enqueue, or the insert)
+    db_commit      one batched write-behind transaction
+
+Durations go into fixed-bucket histograms; every classifier prediction also
+adds its confidence to a per-intent histogram and, below
+CONFIDENCE_THRESHOLD, to that intent's low-confidence counter. A prediction
+replayed from the response cache counts too, so these follow the traffic
+whether or not the cache is warm.
+
+The switch is METRICS_ENABLED (env BANKING_METRICS=0 turns it off). It is
+read when the instrumented modules are imported: when off, timed() returns
+the function itself, so there is no wrapper and no timer call left on the
+hot path. Metrics are per process; with several workers, scrape each.
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import CONFIDENCE_THRESHOLD, METRICS_ENABLED
+
+ENABLED = METRICS_ENABLED
+
+# Upper bounds in seconds; the hot-path stages take microseconds, DB commits milliseconds
+DURATION_BUCKETS = (
+    5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.45, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+
+
+class Histogram:
+    """Prometheus-style histogram: per-bucket counts (non-cumulative here), sum and count."""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (inf if past the last bound)."""
+        counts, _ = self.snapshot()
+        rank, seen = q * sum(counts), 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            seen += n
+            if n and seen >= rank:
+                return bound
+        return 0.0
+
+
+_stages: Dict[str, Histogram] = {}
+_confidence: Dict[str, Histogram] = {}
+_low_confidence: Dict[str, int] = {}
+_collectors: List[Callable[[], List[str]]] = []
+_lock = threading.Lock()
+
+
+def _histogram(table: Dict[str, Histogram], key: str, bounds: Tuple[float, ...]) -> Histogram:
+    h = table.get(key)
+    if h is None:
+        with _lock:
+            h = table.setdefault(key, Histogram(bounds))
+    return h
+
+
+def observe(stage: str, seconds: float) -> None:
+    _histogram(_stages, stage, DURATION_BUCKETS).observe(seconds)
+
+
+def timed(stage: str):
+    """Decorator recording each call's duration under `stage`; a no-op when metrics are off."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        hist = _histogram(_stages, stage, DURATION_BUCKETS)
+        clock, bounds, counts, lock = time.perf_counter, hist.bounds, hist.counts, hist._lock
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - t0
+                i = bisect_left(bounds, elapsed)  # Histogram.observe, inlined
+                with lock:
+                    counts[i] += 1
+                    hist.sum += elapsed
+        return wrapper
+    return decorate
+
+
+def observe_confidence(intent: str, confidence: float) -> None:
+    """Record a classifier prediction (its top intent, before the threshold is applied)."""
+    _histogram(_confidence, intent, CONFIDENCE_BUCKETS).observe(confidence)
+    if confidence < CONFIDENCE_THRESHOLD:
+        with _lock:
+            _low_confidence[intent] = _low_confidence.get(intent, 0) + 1
+
+
+def register_collector(fn: Callable[[], List[str]]) -> None:
+    """Add a function returning extra Prometheus lines (e.g. another module's counters) to the export."""
+    _collectors.append(fn)
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _confidence.clear()
+        _low_confidence.clear()
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def _fmt(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, label: str, table: Dict[str, Histogram]) -> List[str]:
+    lines = []
+    for key, hist in sorted(table.items()):
+        counts, total = hist.snapshot()
+        cumulative = 0
+        for bound, n in zip(hist.bounds + (float("inf"),), counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{label}="{_label(key)}",le="{_fmt(bound)}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}="{_label(key)}"}} {_fmt(total)}')
+        lines.append(f'{name}_count{{{label}="{_label(key)}"}} {cumulative}')
+    return lines
+
+
+def prometheus_text() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = [
+        "# HELP chatbot_stage_duration_seconds Time spent in each stage of a chat turn.",
+        "# TYPE chatbot_stage_duration_seconds histogram",
+        *_histogram_lines("chatbot_stage_duration_seconds", "stage", _stages),
+        "# HELP chatbot_intent_confidence Classifier confidence of the top intent.",
+        "# TYPE chatbot_intent_confidence histogram",
+        *_histogram_lines("chatbot_intent_confidence", "intent", _confidence),
+        "# HELP chatbot_low_confidence_total Predictions below CONFIDENCE_THRESHOLD, by top intent.",
+        "# TYPE chatbot_low_confidence_total counter",
+    ]
+    with _lock:
+        low = dict(_low_confidence)
+    for intent in sorted(_confidence):
+        lines.append(f'chatbot_low_confidence_total{{intent="{_label(intent)}"}} {low.get(intent, 0)}')
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> Dict[str, Dict]:
+    """Per-stage and per-intent figures for humans (the :stats command)."""
+    stages = {}
+    for stage, hist in sorted(_stages.items()):
+        counts, total = hist.snapshot()
+        n = sum(counts)
+        stages[stage] = {
+            "count": n,
+            "mean_us": total / n * 1e6 if n else 0.0,
+            "p50_us": hist.quantile(0.5) * 1e6,
+            "p99_us": hist.quantile(0.99) * 1e6,
+        }
+    with _lock:
+        low = dict(_low_confidence)
+    intents = {}
+    for intent, hist in sorted(_confidence.items()):
+        counts, total = hist.snapshot()
+        n = sum(counts)
+        intents[intent] = {
+            "count": n,
+            "mean_confidence": total / n if n else 0.0,
+            "low_confidence_rate": low.get(intent, 0) / n if n else 0.0,
+        }
+    return {"stages": stages, "intents": intents}
+
+
+def format_summary(stats: Optional[Dict] = None) -> str:
+    stats = stats or summary()
+    if not ENABLED:
+        return "Metrics are disabled (BANKING_METRICS=0)."
+    lines = [f"{'stage':<13} {'calls':>7} {'mean us':>9} {'p50 us<=':>9} {'p99 us<=':>9}"]
+    for stage, s in stats["stages"].items():
+        lines.append(f"{stage:<13} {s['count']:>7} {s['mean_us']:>9.1f} {s['p50_us']:>9.0f} {s['p99_us']:>9.0f}")
+    if stats["intents"]:
+        lines.append(f"\n{'intent':<20} {'predictions':>11} {'mean conf':>9} {'low conf':>9}")
+        for intent, s in stats["intents"].items():
+            lines.append(f"{intent:<20} {s['count']:>11} {s['mean_confidence']:>9.2f} "
+                         f"{s['low_confidence_rate']:>9.1%}")
+    return "\n".join(lines)
@@ -1,33 +1,223 @@
+import os
 import re
-from typing import List
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
-import nltk
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from . import metrics
+from .config import (
+    NORMALIZE_CACHE_SIZE,
+    LEMMA_CACHE_SIZE,
+    FAST_TOKENIZER,
+    NORMALIZE_PARALLEL_MIN,
+    NORMALIZE_WORKERS,
+)
+
+# NLTK and WordNet are loaded on first use (or by warmup()), never at import,
+# and nothing on the request path downloads data.
+_lemmatizer = None
+_lemmatizer_lock = threading.Lock()
+_missing = set()  # NLTK resources found missing on the request path
+
+NLTK_RESOURCES = {
+    "wordnet": ("corpora/wordnet", "wordnet"),
+    "omw-1.4": ("corpora/omw-1.4", "omw-1.4"),
+    "words": ("corpora/words", "words"),  # English word list; spelling.py never "corrects" these
+    "punkt": ("tokenizers/punkt", "punkt"),
+    "punkt_tab": ("tokenizers/punkt_tab", "punkt_tab"),
+}
+
+_CLEAN_RE = re.compile(r"[^a-z0-9\s]")
+
+# After cleaning, the only thing word_tokenize still does to [a-z0-9 ] text is
+# split these Treebank contractions (Punkt finds no sentence breaks).
+_TREEBANK_SPLITS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
+
+_fast_tokenizer = FAST_TOKENIZER
+
+
+class _IdentityLemmatizer:
+    """Stand-in when WordNet is unavailable: keeps tokens as they are."""
+
+    def lemmatize(self, word: str) -> str:
+        return word
+
+
+def _get_lemmatizer():
+    global _lemmatizer
+    if _lemmatizer is None:
+        with _lemmatizer_lock:
+            if _lemmatizer is None:
+                from nltk.stem import WordNetLemmatizer
+                lem = WordNetLemmatizer()
+                try:
+                    lem.lemmatize("rates")  # force the lazy corpus load under the lock
+                except LookupError:
+                    _missing.add("wordnet")
+                    lem = _IdentityLemmatizer()
+                _lemmatizer = lem
+    return _lemmatizer
 
-lemmatizer = WordNetLemmatizer()
 
 def _safe_word_tokenize(text: str):
+    from nltk.tokenize import word_tokenize
     try:
         return word_tokenize(text)
     except LookupError:
-        # Try to fetch missing tokenizers on the fly
-        for pkg in ("punkt", "punkt_tab"):
-            try:
-                nltk.download(pkg, quiet=True)
-            except Exception:
-                pass
-        try:
-            return word_tokenize(text)
-        except Exception:
-            # Last-resort regex fallback: split on non-word chars
-            return re.findall(r"[A-Za-z0-9]+", text.lower())
+        # No download here (this runs per request); see warmup().
+        _missing.add("punkt")
+        return re.findall(r"[A-Za-z0-9]+", text.lower())
+
+
+def _fast_word_tokenize(text: str) -> List[str]:
+    """Same tokens as word_tokenize, for text already reduced to [a-z0-9\\s]."""
+    tokens = []
+    for tok in text.split():
+        split = _TREEBANK_SPLITS.get(tok)
+        if split:
+            tokens.extend(split)
+        else:
+            tokens.append(tok)
+    return tokens
+
 
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemma(token: str) -> str:
+    return _get_lemmatizer().lemmatize(token)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_clean(text: str) -> str:
+    tokens = _fast_word_tokenize(text) if _fast_tokenizer else _safe_word_tokenize(text)
+    return " ".join(_lemma(t) for t in tokens)
+
+
+@metrics.timed("normalize")
 def normalize(text: str) -> str:
     text = text.lower().strip()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    tokens = _safe_word_tokenize(text)
-    lemmas = [lemmatizer.lemmatize(t) for t in tokens]
-    return " ".join(lemmas)
+    text = _CLEAN_RE.sub(" ", text)
+    return _normalize_clean(text)
+
+
+def normalize_many(texts: Iterable[str], workers: Optional[int] = NORMALIZE_WORKERS) -> List[str]:
+    """
+    [normalize(t) for t in texts], for whole training corpora.
+
+    Each distinct message is cleaned and tokenized once, and each distinct
+    token across the corpus is lemmatized once (into a local table, so the
+    serving caches aren't flushed by a bulk job). With more than
+    NORMALIZE_PARALLEL_MIN distinct messages and workers != 1, tokenizing
+    and lemmatizing fan out over a process pool (workers=0: one per core).
+    The output is identical to calling normalize() row by row.
+    """
+    texts = list(texts)
+    cleaned = {raw: _CLEAN_RE.sub(" ", raw.lower().strip()) for raw in dict.fromkeys(texts)}
+    unique = list(dict.fromkeys(cleaned.values()))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(unique) > NORMALIZE_PARALLEL_MIN:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        step = -(-len(unique) // (workers * 4))
+        chunks = [unique[i:i + step] for i in range(0, len(unique), step)]
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            done = [out for part in pool.map(_normalize_unique, chunks, [_fast_tokenizer] * len(chunks))
+                    for out in part]
+    else:
+        done = _normalize_unique(unique, _fast_tokenizer)
+
+    by_clean = dict(zip(unique, done))
+    return [by_clean[cleaned[raw]] for raw in texts]
+
+
+def _normalize_unique(texts: List[str], fast: bool) -> List[str]:
+    """_normalize_clean over distinct cleaned texts, lemmatizing each distinct token once."""
+    lemmatize = _get_lemmatizer().lemmatize
+    if not fast:
+        token_lists = [_safe_word_tokenize(t) for t in texts]
+        lemmas = {tok: lemmatize(tok) for tok in {tok for tokens in token_lists for tok in tokens}}
+        return [" ".join([lemmas[t] for t in tokens]) for tokens in token_lists]
+    # Fast tokenizer: a whitespace word maps to a fixed output (its lemma, or
+    # the lemmas of its Treebank parts), so one table lookup per word suffices
+    split_texts = [t.split() for t in texts]
+    words = {w for ws in split_texts for w in ws}
+    out = {w: " ".join([lemmatize(p) for p in _TREEBANK_SPLITS.get(w, (w,))]) for w in words}
+    return [" ".join([out[w] for w in ws]) for ws in split_texts]
+
 
 def tokenize(text: str) -> List[str]:
     return normalize(text).split()
+
+
+def warmup(download: bool = False) -> Dict[str, bool]:
+    """
+    Load NLTK, WordNet, the English word list and (if used) Punkt before
+    serving, optionally downloading whatever is missing. Returns
+    {resource: available}.
+    """
+    global _lemmatizer
+    import nltk
+
+    needed = ["wordnet", "omw-1.4", "words"]
+    if not _fast_tokenizer:
+        needed += ["punkt", "punkt_tab"]
+
+    status = {}
+    for name in needed:
+        path, pkg = NLTK_RESOURCES[name]
+        try:
+            nltk.data.find(path)
+            status[name] = True
+        except LookupError:
+            ok = False
+            if download:
+                try:
+                    ok = nltk.download(pkg, quiet=True)
+                except Exception:
+                    ok = False
+            status[name] = bool(ok)
+
+    with _lemmatizer_lock:
+        if isinstance(_lemmatizer, _IdentityLemmatizer) and status.get("wordnet"):
+            _lemmatizer = None  # retry now that WordNet is there
+            clear_caches()
+    _missing.clear()
+    normalize("warming up the banking assistant")
+    for name in _missing:
+        status[name] = False
+    return status
+
+
+def set_fast_tokenizer(enabled: bool) -> None:
+    """Switch between the split-based fast path and NLTK's word_tokenize."""
+    global _fast_tokenizer
+    _fast_tokenizer = bool(enabled)
+    _normalize_clean.cache_clear()
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """Hit/miss counters of the normalization and lemma caches."""
+    stats = {}
+    for name, fn in (("normalize", _normalize_clean), ("lemma", _lemma)):
+        info = fn.cache_info()
+        total = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "hit_rate": info.hits / total if total else 0.0,
+        }
+    return stats
+
+
+def clear_caches() -> None:
+    _normalize_clean.cache_clear()
+    _lemma.cache_clear()
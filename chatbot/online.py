@@ -0,0 +1,138 @@
+"""
+Incremental intent model.
+
+Hashing features need no fitted vocabulary, so an SGD classifier can be
+updated with partial_fit on just the intent corrections approved since the
+last update. Approvals are read from the correction_events log (see db.py)
+after an event-id watermark, so corrections approved long after they were
+posted are picked up too. A full rebuild over all training rows still happens
+when intent_examples change, when a correction is withdrawn or edited (SGD
+can't unlearn a row), when one names an intent the model has never seen, or
+every ONLINE_REBUILD_EVERY rows.
+Every saved model is also published as an artifact version, so serving
+processes reload it like a fully retrained one.
+"""
+import copy
+import hashlib
+import json
+import os
+import pickle
+import random
+from typing import List, Tuple
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+
+from . import artifacts
+from .nlp import normalize_many
+from .db import get_feedback_corrections, get_correction_events
+from .training import example_rows
+from .config import ONLINE_MODEL_PATH, ONLINE_UPDATE_EPOCHS, ONLINE_REBUILD_EVERY
+
+N_FEATURES = 2 ** 16
+
+
+def _build_pipeline() -> Pipeline:
+    return Pipeline([
+        ("vec", HashingVectorizer(ngram_range=(1, 2), n_features=N_FEATURES, alternate_sign=False)),
+        ("clf", SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42)),
+    ])
+
+
+def _examples_fingerprint(pairs: List[Tuple[str, str]]) -> str:
+    h = hashlib.sha256()
+    for text, label in pairs:
+        h.update(json.dumps([text, label]).encode())
+    return h.hexdigest()
+
+
+def _fit_epochs(model: Pipeline, X: List[str], y: List[str], epochs: int) -> None:
+    """Shuffled partial_fit passes over a batch of new rows."""
+    vec, clf = model.named_steps["vec"], model.named_steps["clf"]
+    rows = list(zip(X, y))
+    rng = random.Random(42)
+    for _ in range(epochs):
+        rng.shuffle(rows)
+        clf.partial_fit(vec.transform([t for t, _ in rows]), [l for _, l in rows])
+
+
+def rebuild(save: bool = True) -> Tuple[Pipeline, str]:
+    """Train the incremental model from scratch on all training rows."""
+    examples = example_rows()
+    corrections, watermark = get_feedback_corrections()
+    pairs = examples + [(c["user_text"], c["correction_intent"]) for c in corrections]
+    if not pairs:
+        raise RuntimeError("No training data found.")
+
+    X = normalize_many(t for t, _ in pairs)
+    y = [l for _, l in pairs]
+    model = _build_pipeline().fit(X, y)
+
+    model.watermark_ = watermark
+    model.watermark_source_ = "correction_events"
+    model.examples_fp_ = _examples_fingerprint(examples)
+    model.rows_since_rebuild_ = 0
+    report = f"Full rebuild on {len(pairs)} rows, {len(set(y))} intents (watermark={model.watermark_})."
+    if save:
+        _save(model, len(pairs), report)
+    return model, report
+
+
+def update(model: Pipeline, save: bool = True) -> Tuple[Pipeline, str]:
+    """
+    Fold in corrections approved after model.watermark_ (a correction_events id).
+    Falls back to rebuild() when an incremental update can't be exact enough.
+    """
+    if getattr(model, "watermark_", None) is None:
+        return rebuild(save)
+    if getattr(model, "watermark_source_", None) != "correction_events":
+        return rebuild(save)  # saved before the event log: its watermark was a feedback id
+    if model.examples_fp_ != _examples_fingerprint(example_rows()):
+        return rebuild(save)
+
+    events = get_correction_events(model.watermark_)
+    if not events:
+        return model, f"No new corrections since watermark={model.watermark_}."
+    if any(not e["approved"] for e in events):
+        return rebuild(save)  # a learned correction was revoked, edited or deleted
+    new = [e for e in events if e["user_text"] is not None]
+    labels = [c["correction_intent"] for c in new]
+    if not set(labels) <= set(model.classes_):
+        return rebuild(save)  # SGD can't grow new classes in place
+    if model.rows_since_rebuild_ + len(new) >= ONLINE_REBUILD_EVERY:
+        return rebuild(save)
+
+    X = normalize_many(c["user_text"] for c in new)
+    model = copy.deepcopy(model)  # the caller may still be serving the old one
+    _fit_epochs(model, X, labels, ONLINE_UPDATE_EPOCHS)
+    model.watermark_ = events[-1]["id"]
+    model.rows_since_rebuild_ += len(new)
+    report = f"Folded in {len(new)} new corrections (watermark={model.watermark_})."
+    if save:
+        _save(model, len(new), report)
+    return model, report
+
+
+def _save(model: Pipeline, rows: int, report: str) -> None:
+    # Published for the serving processes first (see artifacts.py), then kept
+    # as this module's own state, written via temp file + rename
+    artifacts.publish(model, rows, report)
+    tmp = ONLINE_MODEL_PATH.with_name(ONLINE_MODEL_PATH.name + f".tmp-{os.getpid()}")
+    with open(tmp, "wb") as f:
+        pickle.dump(model, f)
+    os.replace(tmp, ONLINE_MODEL_PATH)
+
+
+def load() -> Pipeline:
+    with open(ONLINE_MODEL_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+def load_or_rebuild() -> Tuple[Pipeline, str]:
+    """Load the saved incremental model and catch it up, or rebuild it."""
+    try:
+        model = load()
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return rebuild(save=True)
+    return update(model, save=True)
@@ -0,0 +1,256 @@
+"""
+Response cache in front of the answering pipeline.
+
+Chat traffic repeats itself ("branch hours", "loan rate", "hi"), so
+infer_intent_and_answer() first looks the normalized message up here and
+only runs smalltalk -> retrieval -> predict -> facts on a miss. Keying on the
+normalized text makes near-duplicates share an entry: messages that differ
+only in case, punctuation, spacing or word inflection normalize alike.
+
+Entries hold (intent, answer, confidence, predicted) in a bounded LRU with
+a TTL. `predicted` is the classifier's top intent when the classifier made
+the reply (None for smalltalk and learned answers), so a hit can be counted
+in the confidence metrics like the prediction it replays. Each entry
+belongs to a generation made of the model's training fingerprint, the
+knowledge-base version (kb_meta, bumped on any facts, smalltalk or response
+template change) and the learned-answer index version. When any of them
+moves, for example after a retrain or a facts edit, the old entries are
+dropped.
+
+With RESPONSE_CACHE_SHARED, misses fall through to a SQLite file
+(RESPONSE_CACHE_PATH) shared by every worker process on the host, so one
+worker's answer is a hit for the others. The shared store is best effort:
+a locked or broken file counts as a miss and never fails a chat turn.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics, retrieval
+from .knowledge import kb
+from .config import (
+    RESPONSE_CACHE,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_SHARED,
+    RESPONSE_CACHE_PATH,
+    SQLITE_TIMEOUT,
+)
+
+ENABLED = RESPONSE_CACHE and RESPONSE_CACHE_SIZE > 0
+
+Response = Tuple[Optional[str], Optional[str], float]
+Entry = Tuple[Optional[str], Optional[str], float, Optional[str]]  # Response + the classifier's top intent
+
+
+class SharedStore:
+    """The cross-process tier: one SQLite table keyed on the normalized text."""
+
+    PRUNE_EVERY = 1000  # puts between sweeps of expired / other-generation rows
+    SCHEMA_VERSION = 1  # bump when the table changes; older files are emptied, not migrated
+
+    def __init__(self, path: Path, ttl: float = RESPONSE_CACHE_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        self._puts = 0
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(str(self.path), timeout=SQLITE_TIMEOUT, check_same_thread=False)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = OFF")  # it's a cache: losing the tail on a crash is fine
+            with con:
+                if con.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                    con.execute("DROP TABLE IF EXISTS response_cache")
+                con.execute("""
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        key TEXT PRIMARY KEY,
+                        generation TEXT NOT NULL,
+                        intent TEXT,
+                        answer TEXT,
+                        confidence REAL NOT NULL,
+                        predicted TEXT,
+                        expires REAL NOT NULL
+                    ) WITHOUT ROWID
+                """)
+                con.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self._local.con = con
+        return con
+
+    def get(self, key: str, generation: str) -> Optional[Entry]:
+        try:
+            row = self._con().execute(
+                "SELECT intent, answer, confidence, predicted FROM response_cache "
+                "WHERE key = ? AND generation = ? AND expires > ?",
+                (key, generation, time.time()),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return None if row is None else (row[0], row[1], row[2], row[3])
+
+    def put(self, key: str, generation: str, value: Entry) -> None:
+        now = time.time()
+        try:
+            con = self._con()
+            with con:
+                con.execute(
+                    "INSERT OR REPLACE INTO response_cache"
+                    "(key, generation, intent, answer, confidence, predicted, expires) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, generation, value[0], value[1], value[2], value[3], now + self.ttl),
+                )
+                self._puts += 1
+                if self._puts % self.PRUNE_EVERY == 0:
+                    con.execute("DELETE FROM response_cache WHERE expires <= ? OR generation <> ?",
+                                (now, generation))
+        except sqlite3.Error:
+            pass
+
+    def clear(self) -> None:
+        try:
+            con = self._con()
+            with con:
+                con.execute("DELETE FROM response_cache")
+        except sqlite3.Error:
+            pass
+
+
+class ResponseCache:
+    """Bounded LRU + TTL of normalized text -> (intent, answer, confidence, predicted), per generation."""
+
+    def __init__(
+        self,
+        max_size: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        shared: Optional[SharedStore] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, Tuple[float, Entry]]" = OrderedDict()
+        self._generation: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+            "hit_seconds": 0.0, "miss_seconds": 0.0,
+        }
+
+    @staticmethod
+    def generation(model) -> Tuple[str, bool]:
+        """(generation, shareable): models without a training fingerprint are only cached per process."""
+        fingerprint = getattr(model, "fingerprint_", None)
+        tag = fingerprint or f"id:{id(model)}"
+        return f"{tag}|{kb.version}|{retrieval.index.version}", fingerprint is not None
+
+    def get(self, model, text_norm: str) -> Optional[Entry]:
+        t0 = time.perf_counter()
+        generation, shareable = self.generation(model)
+        now = time.monotonic()
+        with self._lock:
+            self._switch(generation)
+            entry = self._entries.get(text_norm)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(text_norm)
+                self._stats["hits"] += 1
+                self._stats["hit_seconds"] += time.perf_counter() - t0
+                return entry[1]
+        if self.shared is not None and shareable:
+            value = self.shared.get(text_norm, generation)
+            if value is not None:
+                self._store(text_norm, value, now)
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                    self._stats["hit_seconds"] += time.perf_counter() - t0
+                return value
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, model, text_norm: str, value: Entry, seconds: float = 0.0) -> None:
+        """Store a computed response; `seconds` is what computing it took (for the stats)."""
+        generation, shareable = self.generation(model)
+        with self._lock:
+            self._switch(generation)
+            self._stats["miss_seconds"] += seconds
+        self._store(text_norm, value, time.monotonic())
+        if self.shared is not None and shareable:
+            self.shared.put(text_norm, generation, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _store(self, key: str, value: Entry, now: float) -> None:
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _switch(self, generation: str) -> None:
+        # caller holds the lock
+        if generation != self._generation:
+            if self._generation is not None:
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["size"] = len(self._entries)
+        hits = s["hits"] + s["shared_hits"]
+        lookups = hits + s["misses"]
+        s["hit_rate"] = hits / lookups if lookups else 0.0
+        s["mean_hit_us"] = s.pop("hit_seconds") / hits * 1e6 if hits else 0.0
+        s["mean_miss_us"] = s.pop("miss_seconds") / s["misses"] * 1e6 if s["misses"] else 0.0
+        return s
+
+
+cache = ResponseCache(shared=SharedStore(RESPONSE_CACHE_PATH) if RESPONSE_CACHE_SHARED else None)
+get = cache.get
+put = cache.put
+stats = cache.stats
+
+
+def format_stats() -> str:
+    if not ENABLED:
+        return "Response cache is disabled (RESPONSE_CACHE = False)."
+    s = stats()
+    shared = f", {s['shared_hits']} from the shared store" if cache.shared is not None else ""
+    return (f"response cache: {s['hit_rate']:.1%} hit rate ({s['hits']} hits{shared}, {s['misses']} misses), "
+            f"{s['size']}/{cache.max_size} entries, hit {s['mean_hit_us']:.1f} us vs miss "
+            f"{s['mean_miss_us']:.1f} us, {s['invalidations']} invalidations")
+
+
+def _prometheus() -> List[str]:
+    s = stats()
+    lines = []
+    for name, kind, help_text, value in (
+        ("hits_total", "counter", "Answers served from the local cache.", s["hits"]),
+        ("shared_hits_total", "counter", "Answers served from the shared store.", s["shared_hits"]),
+        ("misses_total", "counter", "Messages that went through the full pipeline.", s["misses"]),
+        ("evictions_total", "counter", "Entries dropped to stay within RESPONSE_CACHE_SIZE.", s["evictions"]),
+        ("invalidations_total", "counter", "Cache flushes after a retrain or knowledge-base change.",
+         s["invalidations"]),
+        ("entries", "gauge", "Entries in the local cache.", s["size"]),
+        ("hit_latency_seconds_mean", "gauge", "Mean lookup time of a hit.", s["mean_hit_us"] / 1e6),
+        ("miss_latency_seconds_mean", "gauge", "Mean time to compute a missed answer.", s["mean_miss_us"] / 1e6),
+    ):
+        lines += [f"# HELP chatbot_response_cache_{name} {help_text}",
+                  f"# TYPE chatbot_response_cache_{name} {kind}",
+                  f"chatbot_response_cache_{name} {value}"]
+    return lines
+
+
+if ENABLED:
+    metrics.register_collector(_prometheus)
@@ -0,0 +1,400 @@
+"""
+Nearest-neighbour retrieval over approved learned Q&A.
+
+Questions users taught the bot (approved user_learned_qa rows, and approved
+feedback carrying a corrected_answer) are hashed into L2-normalized word
+uni/bigram vectors. The main index keeps them row-major (CSR, for exact
+scoring) together with inverted posting lists (question rows per feature).
+
+lookup() only needs neighbours above a similarity threshold t, so it probes
+the query's rarest features first and stops once the weight left unprobed
+has norm below t: a question sharing none of the probed features can't
+reach t (Cauchy-Schwarz, both vectors have unit norm). The few candidates
+found are then scored exactly. Common words are therefore never walked, and
+lookup cost stays flat as the index grows.
+
+New rows land in a small delta matrix that is scanned directly and merged
+into the main index every RETRIEVAL_MERGE_EVERY additions, at which point
+the index is saved as .npy files that later processes memory-map. Each save
+goes to a directory of its own, and CURRENT.json is then pointed at it under
+a file lock (the way artifacts.publish() swaps the model manifest), unless
+another process already saved a newer index. Saved files are never
+rewritten, so a reader maps one complete save whatever runs alongside it,
+and nothing memory-mapped is ever replaced. Changes
+arrive through the learned_events table (see db.py), so catching up after a
+restart or another process's approval only replays new events.
+
+Only the first lookup in a process catches up synchronously. After that,
+lookups never wait on the database or the disk: every
+RETRIEVAL_CHECK_INTERVAL seconds one of them starts a background refresh
+(replay, merge, save) and keeps answering from the current snapshot.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.utils import murmurhash3_32
+
+from . import artifacts, db, metrics
+from .nlp import normalize
+from .config import (
+    LEARNED_INDEX_DIR,
+    RETRIEVAL_THRESHOLD,
+    RETRIEVAL_CHECK_INTERVAL,
+    RETRIEVAL_MERGE_EVERY,
+)
+
+N_FEATURES = 2 ** 18
+_ARRAYS = ("data", "indices", "indptr", "post_ptr", "post_rows")
+CURRENT = "CURRENT.json"  # {"path": <save directory>, "watermark": ...}
+CURRENT_LOCK = "CURRENT.lock"
+_SAVE_PREFIX = "index-"
+_KEEP_SAVES = 3  # older saves are deleted; a process that mapped one keeps its maps (POSIX)
+
+
+def vectorize(text_norm: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(sorted feature ids, unit-norm weights) of a normalized text's words and word pairs."""
+    toks = text_norm.split()
+    grams = toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]
+    if not grams:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    ids = np.fromiter(
+        (murmurhash3_32(g, positive=True) % N_FEATURES for g in grams), dtype=np.int32, count=len(grams)
+    )
+    ids, counts = np.unique(ids, return_counts=True)
+    weights = counts.astype(np.float32)
+    weights /= np.sqrt(weights @ weights)
+    return ids, weights
+
+
+def _matrix(vectors: List[Tuple[np.ndarray, np.ndarray]]) -> sparse.csr_matrix:
+    indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(ids) for ids, _ in vectors])
+    indices = np.concatenate([ids for ids, _ in vectors]) if vectors else np.empty(0, dtype=np.int32)
+    data = np.concatenate([w for _, w in vectors]) if vectors else np.empty(0, dtype=np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(vectors), N_FEATURES))
+
+
+def _score(m: sparse.csr_matrix, rows: np.ndarray, ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Dot products of the given rows of m with the sparse query (ids, weights), in plain numpy."""
+    starts = m.indptr[rows]
+    lens = m.indptr[rows + 1] - starts
+    total = int(lens.sum())
+    if not total:
+        return np.zeros(len(rows), dtype=np.float32)
+    # positions of every stored entry of the selected rows, row by row
+    offsets = np.cumsum(lens) - lens
+    at = np.arange(total) - np.repeat(offsets - starts, lens)
+    feats = m.indices[at]
+    pos = np.minimum(np.searchsorted(ids, feats), len(ids) - 1)
+    contrib = np.where(ids[pos] == feats, weights[pos] * m.data[at], 0.0)
+    return np.bincount(np.repeat(np.arange(len(rows)), lens), weights=contrib, minlength=len(rows))
+
+
+class _State(NamedTuple):
+    docs: sparse.csr_matrix     # base rows x features
+    post_ptr: np.ndarray        # feature -> slice of post_rows
+    post_rows: np.ndarray       # base row ids, grouped by feature
+    delta: sparse.csr_matrix    # delta rows x features
+    keys: List[tuple]           # (source, source_id) per row, base rows first; append-only
+    answers: List[str]          # append-only, so older snapshots stay valid
+    deleted: frozenset          # row numbers that no longer serve
+    watermark: int              # last learned_events.id applied
+    position: dict              # key -> live row (writers only)
+
+
+def _empty_state() -> _State:
+    empty = _matrix([])
+    return _State(
+        docs=empty, post_ptr=np.zeros(N_FEATURES + 1, dtype=np.int64), post_rows=np.empty(0, dtype=np.int32),
+        delta=empty, keys=[], answers=[], deleted=frozenset(), watermark=0, position={},
+    )
+
+
+class LearnedAnswerIndex:
+    """
+    Readers use whatever _State is current; writers (refresh/add_many) build a
+    new one under a lock and swap it in. keys/answers are only ever appended
+    to, so a reader's older snapshot never sees its rows change.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = LEARNED_INDEX_DIR,
+        merge_every: int = RETRIEVAL_MERGE_EVERY,
+        from_db: bool = True,
+    ):
+        self.path = Path(path) if path else None
+        self.merge_every = merge_every
+        self.from_db = from_db  # False: fed only through add_many() (and what's saved at path)
+        self._lock = threading.Lock()
+        self._state: Optional[_State] = None
+        self._next_check = 0.0
+        self.last_error: Optional[str] = None
+
+    def __len__(self) -> int:
+        st = self._state or _empty_state()
+        return len(st.position)
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        """Changes whenever the servable answers do (watermark, rows ever added)."""
+        st = self._current()
+        return st.watermark, len(st.keys)
+
+    # -- lookups --
+    def search(self, text_norm: str, k: int = 1, min_score: float = 0.0) -> List[Tuple[float, str, tuple]]:
+        """
+        Top-k (cosine, answer, key) for an already-normalized question. With
+        min_score > 0, only neighbours scoring at least min_score are found,
+        which lets the search skip common words (see the module docstring).
+        """
+        st = self._current()
+        if not st.position:
+            return []
+        ids, weights = vectorize(text_norm)
+        if not len(ids):
+            return []
+
+        n_base = st.docs.shape[0]
+        rows, scores = [], []
+        if n_base:
+            cands = self._candidates(st, ids, weights, min_score)
+            rows.append(cands)
+            scores.append(_score(st.docs, cands, ids, weights))
+        if st.delta.shape[0]:
+            every = np.arange(st.delta.shape[0])
+            rows.append(every + n_base)
+            scores.append(_score(st.delta, every, ids, weights))
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        scores = np.minimum(np.concatenate(scores), 1.0)  # float32 rounding can land just above 1
+        keep = scores >= max(min_score, 1e-9)
+        if st.deleted:
+            keep &= np.fromiter((r not in st.deleted for r in rows), dtype=bool, count=len(rows))
+        rows, scores = rows[keep], scores[keep]
+        if not len(rows):
+            return []
+
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), st.answers[rows[i]], st.keys[rows[i]]) for i in top]
+
+    def lookup(self, text_norm: str, threshold: float = RETRIEVAL_THRESHOLD) -> Optional[Tuple[str, float]]:
+        """(answer, similarity) of the closest learned question, if similar enough."""
+        hits = self.search(text_norm, k=1, min_score=threshold)
+        if hits:
+            return hits[0][1], hits[0][0]
+        return None
+
+    @staticmethod
+    def _candidates(st: _State, ids: np.ndarray, weights: np.ndarray, min_score: float) -> np.ndarray:
+        """Base rows sharing a probed feature: rarest first, until the rest can't reach min_score."""
+        df = st.post_ptr[ids + 1] - st.post_ptr[ids]
+        order = np.argsort(df, kind="stable")
+        # rest[i] = norm of the query weight left after probing the first i features
+        rest = np.sqrt(np.cumsum((weights[order] ** 2)[::-1])[::-1])
+        n_probe = len(order)
+        if min_score > 0:
+            below = np.flatnonzero(rest < min_score)
+            n_probe = int(below[0]) if len(below) else len(order)
+        parts = [st.post_rows[st.post_ptr[f]:st.post_ptr[f + 1]] for f in ids[order[:n_probe]]]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        cands = np.sort(np.concatenate(parts))
+        return cands[np.r_[True, cands[1:] != cands[:-1]]] if len(cands) else cands
+
+    # -- updates --
+    def refresh(self) -> int:
+        """Apply learned_events newer than the watermark; returns how many."""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        st = self._state or self._load()
+        applied = 0
+        while True:
+            events = db.get_learned_events(st.watermark)
+            if not events:
+                break
+            st = self._apply(st, events)
+            applied += len(events)
+        if st.delta.shape[0] >= self.merge_every:
+            st = self._merge(st)
+            self._save(st)
+        self._state = st
+        self._next_check = time.monotonic() + RETRIEVAL_CHECK_INTERVAL
+        return applied
+
+    def _refresh_async(self) -> None:
+        """refresh() on a background thread, unless a refresh or save already holds the lock."""
+        if not self._lock.acquire(blocking=False):
+            return
+        self._next_check = time.monotonic() + RETRIEVAL_CHECK_INTERVAL
+        threading.Thread(target=self._background_refresh, name="retrieval-refresh", daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self._refresh()
+            self.last_error = None
+        except Exception as e:  # keep serving the current snapshot; the next check retries
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            self._lock.release()
+
+    def add_many(self, rows: Iterable[Tuple[tuple, str, str]]) -> None:
+        """Index (key, question, answer) rows directly, bypassing learned_events."""
+        with self._lock:
+            st = self._state or self._load()
+            st = self._apply(st, [{"id": st.watermark, "source": key[0], "source_id": key[1],
+                                   "approved": 1, "question": q, "answer": a} for key, q, a in rows])
+            if st.delta.shape[0] >= self.merge_every:
+                st = self._merge(st)
+            self._state = st
+
+    def save(self) -> None:
+        """Merge any buffered rows and write the index to self.path."""
+        with self._lock:
+            st = self._merge(self._state or self._load())
+            self._save(st)
+            self._state = st
+
+    def _current(self) -> _State:
+        st = self._state
+        if st is None:
+            with self._lock:
+                if self._state is None:
+                    if self.from_db:
+                        self._refresh()  # first use in this process: catch up before answering
+                    else:
+                        self._state = self._load()
+            return self._state
+        if self.from_db and time.monotonic() >= self._next_check:
+            self._refresh_async()
+        return st
+
+    def _apply(self, st: _State, events: List[dict]) -> _State:
+        if not events:
+            return st
+        keys, answers, position = st.keys, st.answers, st.position
+        deleted = set(st.deleted)
+        new_vectors = []
+        for ev in events:
+            key = (ev["source"], ev["source_id"])
+            old = position.pop(key, None)
+            if old is not None:
+                deleted.add(old)
+            if ev["approved"] and ev["question"] and ev["answer"]:
+                position[key] = len(keys)
+                keys.append(key)
+                answers.append(ev["answer"])
+                new_vectors.append(vectorize(normalize(ev["question"])))
+        delta = st.delta
+        if new_vectors:
+            delta = sparse.vstack([delta, _matrix(new_vectors)], format="csr")
+        return st._replace(delta=delta, deleted=frozenset(deleted), watermark=events[-1]["id"])
+
+    def _merge(self, st: _State) -> _State:
+        """Fold the delta into the main index, dropping deleted rows, and rebuild the postings."""
+        docs = sparse.vstack([st.docs, st.delta], format="csr")
+        keep = np.setdiff1d(np.arange(docs.shape[0]), np.fromiter(st.deleted, dtype=np.int64))
+        docs = docs[keep]
+        inv = docs.T.tocsr()
+        keys = [st.keys[i] for i in keep]
+        return _State(
+            docs=docs,
+            post_ptr=inv.indptr.astype(np.int64),
+            post_rows=inv.indices.astype(np.int32),
+            delta=_matrix([]),
+            keys=keys,
+            answers=[st.answers[i] for i in keep],
+            deleted=frozenset(),
+            watermark=st.watermark,
+            position={key: i for i, key in enumerate(keys)},
+        )
+
+    # -- persistence --
+    def _save(self, st: _State) -> None:
+        """Write the merged main index to a new directory and point CURRENT.json at it."""
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        arrays = {"data": st.docs.data, "indices": st.docs.indices, "indptr": st.docs.indptr,
+                  "post_ptr": st.post_ptr, "post_rows": st.post_rows}
+        tmp = artifacts.tmp_path(self.path)
+        tmp.mkdir()
+        try:
+            for name in _ARRAYS:
+                np.save(tmp / f"{name}.npy", arrays[name])
+            meta = {"watermark": st.watermark, "rows": st.docs.shape[0],
+                    "keys": [list(k) for k in st.keys], "answers": st.answers}
+            with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            with artifacts.file_lock(self.path / CURRENT_LOCK):
+                if self._read_current().get("watermark", -1) > st.watermark:
+                    return  # another process saved a newer index
+                target = self.path / (_SAVE_PREFIX + tmp.name.rsplit("-", 1)[-1])
+                os.rename(tmp, target)
+                artifacts.write_json_atomic(self.path / CURRENT, {"path": target.name, "watermark": st.watermark})
+                # mtimes date from writing, before the lock, so target need not be the newest
+                older = sorted((p for p in self.path.glob(_SAVE_PREFIX + "*") if p != target),
+                               key=lambda p: p.stat().st_mtime)
+                for old in older[:max(0, len(older) - (_KEEP_SAVES - 1))]:
+                    shutil.rmtree(old, ignore_errors=True)  # on Windows a mapped save may stay
+                for legacy in ["meta.json", *(f"{name}.npy" for name in _ARRAYS)]:
+                    try:
+                        (self.path / legacy).unlink(missing_ok=True)  # the layout before CURRENT.json
+                    except OSError:
+                        pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)  # gone already unless it was not published
+        artifacts.remove_stale_tmp(self.path)
+
+    def _read_current(self) -> dict:
+        try:
+            with open(self.path / CURRENT, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self) -> _State:
+        """Memory-map the saved main index if there is one; events after it are replayed."""
+        current = self._read_current() if self.path is not None else {}
+        if "path" not in current:
+            return _empty_state()
+        saved = self.path / current["path"]
+        try:
+            with open(saved / "meta.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = {name: np.load(saved / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+            docs = sparse.csr_matrix(
+                (arrays["data"], arrays["indices"], arrays["indptr"]), shape=(meta["rows"], N_FEATURES)
+            )
+        except (OSError, ValueError, KeyError):
+            return _empty_state()
+        if docs.shape[0] != len(meta["keys"]) or len(arrays["post_ptr"]) != N_FEATURES + 1:
+            return _empty_state()
+        keys = [tuple(k) for k in meta["keys"]]
+        return _State(
+            docs=docs,
+            post_ptr=arrays["post_ptr"],
+            post_rows=arrays["post_rows"],
+            delta=_matrix([]),
+            keys=keys,
+            answers=meta["answers"],
+            deleted=frozenset(),
+            watermark=meta["watermark"],
+            position={key: i for i, key in enumerate(keys)},
+        )
+
+
+index = LearnedAnswerIndex()
+lookup = metrics.timed("retrieval")(index.lookup)
+refresh = index.refresh
@@ -0,0 +1,91 @@
+"""
+Offline scoring: run infer_batch over a CSV of messages.
+
+    python -m chatbot.score tests/test_cases.csv [--out predictions.csv] [--batch-size 512]
+
+The input needs an `input` column; if it also has `expected_intent`, the
+accuracy is printed, scored like chatbot.bench: a smalltalk reply counts for
+greeting/goodbye/thanks, and a blank expected intent means the message must
+go unanswered. Rows are read and scored in batches, so large files
+are processed at constant memory.
+"""
+import argparse
+import csv
+import sys
+
+from .bench import _correct
+from .db import init_db
+from .inference import infer_batch
+from .training import load_model
+
+OUT_FIELDS = ["input", "expected_intent", "intent", "confidence", "answer"]
+
+
+def _batches(reader, size):
+    batch = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_file(model, path, out=None, batch_size: int = 512):
+    """Score every row of `path`; returns (rows scored, rows correct, rows labelled)."""
+    total = correct = labelled = 0
+    writer = None
+    if out is not None:
+        writer = csv.DictWriter(out, fieldnames=OUT_FIELDS)
+        writer.writeheader()
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for batch in _batches(csv.DictReader(f), batch_size):
+            results = infer_batch(model, [row["input"] for row in batch])
+            for row, res in zip(batch, results):
+                total += 1
+                expected = (row.get("expected_intent") or "").strip()
+                if "expected_intent" in row:
+                    labelled += 1
+                    correct += _correct(expected or None, res["intent"])
+                if writer:
+                    writer.writerow({
+                        "input": row["input"],
+                        "expected_intent": expected,
+                        "intent": res["intent"] or "",
+                        "confidence": f"{res['confidence']:.4f}",
+                        "answer": res["answer"] or "",
+                    })
+    return total, correct, labelled
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Score a CSV of messages with the saved intent model.")
+    ap.add_argument("csv", help="file with an `input` column (and optionally `expected_intent`)")
+    ap.add_argument("--out", help="write per-row predictions to this CSV ('-' for stdout)")
+    ap.add_argument("--batch-size", type=int, default=512)
+    args = ap.parse_args()
+
+    init_db()
+    model = load_model()
+
+    out = None
+    if args.out == "-":
+        out = sys.stdout
+    elif args.out:
+        out = open(args.out, "w", newline="", encoding="utf-8")
+    try:
+        total, correct, labelled = score_file(model, args.csv, out, args.batch_size)
+    finally:
+        if out not in (None, sys.stdout):
+            out.close()
+
+    msg = f"Scored {total} rows."
+    if labelled:
+        msg += f" Accuracy: {correct}/{labelled} = {correct / labelled:.2%}"
+    print(msg, file=sys.stderr if out is sys.stdout else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from . import artifacts, lean, spelling
+from .inference import infer_batch
+from .training import retrain, load_model, load_or_train_model
+from .config import ASYNC_CPU_WORKERS, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT, MODEL_HOT_RELOAD
+
+
+class ModelHolder:
+    """
+    The model a server process answers with.
+
+    Request threads only read `holder.get()`; nothing mutates the model they
+    get back. Retraining runs on a background thread and publishes the new
+    model with a single reference assignment, so in-flight requests finish
+    on the old model and later ones see the new one. Only one retrain runs
+    at a time.
+
+    With MODEL_HOT_RELOAD, get() also watches the artifact manifest (a
+    throttled stat, see artifacts.ManifestWatcher). When another process
+    publishes a newer version, it is loaded on a background thread and
+    swapped in the same way, so every worker serves a retrain within about
+    MODEL_RELOAD_CHECK_INTERVAL plus the load time.
+    """
+
+    def __init__(self, model=None, hot_reload: bool = MODEL_HOT_RELOAD):
+        lean.for_model(model)  # build the lean predictor before the first request needs it
+        spelling.for_model(model)
+        self._model = model
+        self._train_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher = artifacts.ManifestWatcher() if hot_reload else None
+        self.version = 0 if model is None else 1
+        self.last_report: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def from_disk(cls) -> "ModelHolder":
+        """Same startup policy as the CLI: cached/trained model, else whatever is on disk."""
+        try:
+            model, report = load_or_train_model()
+        except Exception:
+            model, report = load_model(), "Loaded existing model from disk."
+        holder = cls(model)
+        holder.last_report = report
+        return holder
+
+    def get(self):
+        watcher = self._watcher
+        if watcher is not None and watcher.due():
+            manifest = watcher.poll()
+            if manifest is not None and manifest["version"] > self.artifact_version:
+                self._reload_async(manifest)
+        return self._model
+
+    @property
+    def artifact_version(self) -> int:
+        return getattr(self._model, "artifact_version_", 0)
+
+    @property
+    def training(self) -> bool:
+        return self._train_lock.locked()
+
+    def retrain_async(self, full: bool = False) -> bool:
+        """Start a background retrain; False if one is already running."""
+        if not self._train_lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._retrain, args=(full,), name="retrain", daemon=True).start()
+        return True
+
+    def _retrain(self, full: bool) -> None:
+        try:
+            model, report = retrain(self._model, full=full)
+            self._swap(model)
+            self.last_report, self.last_error = report, None
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            self._train_lock.release()
+
+    def _reload_async(self, manifest: dict) -> None:
+        if not self._reload_lock.acquire(blocking=False):
+            return  # already loading; the watcher reports the newest manifest again if this one is stale
+        threading.Thread(target=self._reload, args=(manifest,), name="model-reload", daemon=True).start()
+
+    def _reload(self, manifest: dict) -> None:
+        try:
+            if manifest["version"] > self.artifact_version:
+                self._swap(artifacts.load(manifest))
+                self.last_report = f"Loaded published model v{manifest['version']}."
+        except Exception as e:
+            self.last_error = f"reloading v{manifest.get('version')}: {e}"
+            self._watcher.reset()  # try again at the next check
+        finally:
+            self._reload_lock.release()
+
+    def _swap(self, model) -> None:
+        lean.for_model(model)      # warm everything the hot path needs first...
+        spelling.for_model(model)
+        self._model = model        # ...then publish with one assignment
+        self.version += 1
+
+    def status(self) -> Dict:
+        return {
+            "training": self.training,
+            "version": self.version,
+            "artifact_version": self.artifact_version,
+            "report": self.last_report,
+            "error": self.last_error,
+        }
+
+
+# ---------------------------
+# Process-pool serving (app_async.py)
+# ---------------------------
+# Each worker process keeps its own ModelHolder (the compact export is
+# memory-mapped, so its pages are shared). Like any holder it watches the
+# artifact manifest, so a retrain published by the training process is
+# loaded in the background and swapped in between batches.
+_worker_holder: Optional[ModelHolder] = None
+
+
+def _worker_init() -> None:
+    from .db import init_db
+    from .nlp import warmup
+    init_db()
+    warmup(download=False)
+
+
+def _worker_infer(texts: List[str]) -> List[Dict]:
+    global _worker_holder
+    if _worker_holder is None:
+        # The parent trained/published the model before starting the pool; this just loads
+        _worker_holder = ModelHolder(load_or_train_model()[0])
+    return infer_batch(_worker_holder.get(), texts)
+
+
+def _worker_retrain(full: bool) -> str:
+    _, report = retrain(full=full)  # publishes the new model for the inference workers
+    return report
+
+
+class ProcessModelPool:
+    """
+    Async front end to a process pool that answers chat messages.
+
+    infer() is awaited by request handlers. Messages are gathered into
+    micro-batches (up to max_size, waiting at most max_wait after the first)
+    and each batch is scored by infer_batch in a worker process, with up to
+    two batches in flight per worker. Retraining runs in its own single-worker
+    pool and publishes a new artifact version, which every inference worker
+    picks up through its ModelHolder without pausing.
+    """
+
+    def __init__(
+        self,
+        workers: int = ASYNC_CPU_WORKERS,
+        max_size: int = MICROBATCH_MAX_SIZE,
+        max_wait: float = MICROBATCH_MAX_WAIT,
+    ):
+        ctx = multiprocessing.get_context("spawn")  # no forking of a process with live threads
+        self.workers = workers or os.cpu_count() or 1
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._ctx = ctx
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_worker_init)
+        self._train_pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._training: Optional[asyncio.Task] = None
+        self.version = 1
+        self.last_report: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(2 * self.workers)
+        self._runner = asyncio.create_task(self._run())
+        # load the model in every worker before the first request
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _worker_infer, [])
+                               for _ in range(self.workers)))
+
+    async def close(self) -> None:
+        if self._runner:
+            self._runner.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._train_pool:
+            self._train_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def infer(self, text: str) -> Dict:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                pass
+            await self._slots.acquire()
+            asyncio.create_task(self._score(batch))
+
+    async def _score(self, batch) -> None:
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._pool, _worker_infer, [text for text, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+        finally:
+            self._slots.release()
+
+    @property
+    def training(self) -> bool:
+        return self._training is not None and not self._training.done()
+
+    def retrain_async(self, full: bool = False) -> bool:
+        """Start a retrain in the training process; False if one is already running."""
+        if self.training:
+            return False
+        if self._train_pool is None:
+            self._train_pool = ProcessPoolExecutor(1, mp_context=self._ctx, initializer=_worker_init)
+        self._training = asyncio.create_task(self._retrain(full))
+        return True
+
+    async def _retrain(self, full: bool) -> None:
+        from .writebehind import flush_pending
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, flush_pending)  # train on feedback this process still has queued
+            report = await loop.run_in_executor(self._train_pool, _worker_retrain, full)
+            self.version += 1
+            self.last_report, self.last_error = report, None
+        except Exception as e:
+            self.last_error = str(e)
+
+    def status(self) -> Dict:
+        return {
+            "training": self.training,
+            "version": self.version,
+            "artifact_version": artifacts.read_manifest().get("version", 0),
+            "report": self.last_report,
+            "error": self.last_error,
+        }
@@ -5,6 +5,7 @@ def main():
     nltk.download('punkt_tab', quiet=True)  # add this line
     nltk.download('wordnet', quiet=True)
     nltk.download('omw-1.4', quiet=True)
+    nltk.download('words', quiet=True)
     print("NLTK resources downloaded.")
 
 if __name__ == "__main__":
@@ -0,0 +1,334 @@
+"""
+Typo correction for normalized messages, using SymSpell's symmetric-delete
+index.
+
+The dictionary has three sources, all normalized the way messages are:
+- the unigrams of the trained vectorizer
+- the words of intent_examples
+- the words of the smalltalk patterns
+
+Every dictionary word is indexed under each string obtained by deleting up to
+SPELL_MAX_EDIT characters from its first SPELL_PREFIX_LENGTH characters. A
+misspelled token generates its own deletes the same way. Any word sharing a
+delete with it is a candidate within the edit limit. Candidates are checked
+with the real (optimal string alignment) distance, and the closest wins, with
+ties going to the more frequent word. A lookup costs a few dozen hash probes,
+however large the dictionary is.
+
+Only tokens that look like typos are corrected. In-vocabulary tokens,
+numbers, tokens shorter than SPELL_MIN_LENGTH and real English words
+(english_words()) are left alone, since "lost" -> "list" or "him" -> "hi"
+would change what was asked. Two edits turn short words into anything, so
+tokens of up to SPELL_SHORT_LENGTH characters get one edit, and only to a
+word the classifier knows ("atn" -> "atm", "helo" -> "hello"). The caller
+(inference.py) still prefers the text as typed whenever the classifier
+already answers it.
+
+The index is saved in the model's artifact directory (artifacts.py) as
+memory-mapped .npy arrays plus meta.json, the same layout as compact.py. It
+is written when the model is published, so workers load it instead of
+rebuilding it. for_model() returns the index saved with a model, and builds
+one in memory for models that have none (e.g. the incremental model).
+"""
+import json
+import os
+import threading
+import weakref
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from .config import (
+    ENGLISH_WORDS_PATH,
+    SPELL_CORRECTION,
+    SPELL_MAX_EDIT,
+    SPELL_MIN_LENGTH,
+    SPELL_PREFIX_LENGTH,
+    SPELL_SHORT_LENGTH,
+)
+
+FORMAT_VERSION = 3  # 3: per-word classifier flag for short tokens; older indexes are rebuilt
+_ARRAYS = ("words", "counts", "known", "keys", "ptr", "refs")
+_TOKEN_CACHE_SIZE = 65536
+
+
+def deletes(word: str, max_edit: int, prefix_length: int) -> Set[str]:
+    """The word's prefix plus every string reachable from it by deleting up to max_edit characters."""
+    word = word[:prefix_length]
+    found, frontier = {word}, {word}
+    for _ in range(max_edit):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent swaps count once); limit + 1 once it exceeds limit."""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Only cells within `limit` of the diagonal can stay within the limit
+    over = limit + 1
+    prev2, prev = None, [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1)
+        cur[0] = i if i <= limit else over
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cb = b[j - 1]
+            d = prev[j - 1] + (ca != cb)
+            if prev[j] + 1 < d:
+                d = prev[j] + 1
+            if cur[j - 1] + 1 < d:
+                d = cur[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and prev2[j - 2] + 1 < d:
+                d = prev2[j - 2] + 1
+            cur[j] = d
+        if min(cur[lo - 1:hi + 1]) > limit:
+            return over
+        prev2, prev = prev, cur
+    return min(prev[-1], over)
+
+
+class SpellingIndex:
+    """Symmetric-delete index over a word -> frequency dictionary."""
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.words = arrays["words"]        # sorted UTF-8 dictionary words
+        self.counts = arrays["counts"]      # frequency per word (tie-breaker)
+        self.known = arrays["known"]        # 1 if the classifier knows the word
+        self.keys = arrays["keys"]          # sorted delete strings
+        self.ptr = arrays["ptr"]            # keys[k] -> refs[ptr[k]:ptr[k + 1]]
+        self.refs = arrays["refs"]          # word ids
+        self.meta = meta
+        self.fingerprint_ = meta.get("fingerprint")
+        self.max_edit = meta["max_edit"]
+        self.prefix_length = meta["prefix_length"]
+        self.min_length = meta["min_length"]
+        self.short_length = meta["short_length"]
+        self._vocab = {w.decode("utf-8") for w in self.words.tolist()}
+        self._cache: Dict[str, str] = {}
+
+    @classmethod
+    def build(
+        cls,
+        word_counts: Dict[str, int],
+        fingerprint: Optional[str] = None,
+        max_edit: int = SPELL_MAX_EDIT,
+        prefix_length: int = SPELL_PREFIX_LENGTH,
+        min_length: int = SPELL_MIN_LENGTH,
+        short_length: int = SPELL_SHORT_LENGTH,
+        known: Optional[Set[str]] = None,
+    ) -> "SpellingIndex":
+        """`known`: the words short tokens may be corrected to (default: all of them)."""
+        words = sorted(w for w in word_counts if w)
+        encoded = [w.encode("utf-8") for w in words]
+        postings: Dict[bytes, List[int]] = {}
+        for wid, word in enumerate(words):
+            for d in deletes(word, max_edit, prefix_length):
+                postings.setdefault(d.encode("utf-8"), []).append(wid)
+        keys = sorted(postings)
+        ptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum([len(postings[k]) for k in keys])
+        arrays = {
+            "words": np.array(encoded, dtype=f"S{max(map(len, encoded), default=1)}"),
+            "counts": np.array([word_counts[w] for w in words], dtype=np.int64),
+            "known": np.array([known is None or w in known for w in words], dtype=np.uint8),
+            "keys": np.array(keys, dtype=f"S{max(map(len, keys), default=1)}"),
+            "ptr": ptr,
+            "refs": np.array([wid for k in keys for wid in postings[k]], dtype=np.int32),
+        }
+        meta = {"format": FORMAT_VERSION, "fingerprint": fingerprint, "max_edit": max_edit,
+                "prefix_length": prefix_length, "min_length": min_length, "short_length": short_length,
+                "n_words": len(words)}
+        return cls(arrays, meta)
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            tmp = path / f"{name}.tmp.npy"
+            np.save(tmp, np.asarray(getattr(self, name)))
+            os.replace(tmp, path / f"{name}.npy")
+        tmp = path / "meta.tmp.json"  # last, as in compact.export_pipeline
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, path / "meta.json")
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "SpellingIndex":
+        path = Path(path)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported spelling index format {meta.get('format')!r}")
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in _ARRAYS}
+        if (arrays["words"].shape != (meta["n_words"],) or arrays["counts"].shape != (meta["n_words"],)
+                or arrays["known"].shape != (meta["n_words"],) or arrays["ptr"].shape != (arrays["keys"].shape[0] + 1,)):
+            raise ValueError(f"spelling index at {path} is incomplete or inconsistent")
+        return cls(arrays, meta)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._vocab
+
+    def correct_token(self, token: str) -> str:
+        """The closest dictionary word within the edit limit, or the token itself."""
+        if token in self._vocab or len(token) < self.min_length or token.isdigit() or token in english_words():
+            return token
+        fixed = self._cache.get(token)
+        if fixed is None:
+            fixed = self._lookup(token)
+            if len(self._cache) >= _TOKEN_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[token] = fixed
+        return fixed
+
+    def correct(self, text_norm: str) -> str:
+        """Correct every out-of-vocabulary token of a normalized message."""
+        tokens = text_norm.split()
+        fixed = [self.correct_token(t) for t in tokens]
+        return text_norm if fixed == tokens else " ".join(fixed)
+
+    def _lookup(self, token: str) -> str:
+        short = len(token) <= self.short_length
+        limit = 1 if short else self.max_edit
+        if not len(self.keys):
+            return token
+        prefix = token[:self.prefix_length]
+        width = self.keys.dtype.itemsize
+        # fewest deletions first: a word at distance d shares a key at most d deletions away
+        probes = sorted((d for d in (d.encode("utf-8") for d in deletes(token, limit, self.prefix_length))
+                         if len(d) <= width), key=len, reverse=True)
+        if not probes:
+            return token
+        keys = np.array(probes, dtype=self.keys.dtype)
+        pos = np.searchsorted(self.keys, keys)
+        pos[pos == len(self.keys)] = 0
+        found = self.keys[pos] == keys
+        best, best_rank, seen = token, None, set()
+        for probe, p, ok in zip(probes, pos.tolist(), found.tolist()):
+            if len(prefix) - len(probe.decode("utf-8")) > limit:
+                break
+            if not ok:
+                continue
+            for wid in self.refs[self.ptr[p]:self.ptr[p + 1]].tolist():
+                if wid in seen:
+                    continue
+                seen.add(wid)
+                if short and not self.known[wid]:
+                    continue
+                word = self.words[wid].decode("utf-8")
+                dist = edit_distance(token, word, limit)
+                if dist <= limit:
+                    rank = (dist, -int(self.counts[wid]), word)
+                    if best_rank is None or rank < best_rank:
+                        best, best_rank = word, rank
+                        limit = dist  # nothing farther can win any more
+        return best
+
+
+# ---------------------------
+# Dictionary for a model
+# ---------------------------
+_english: Optional[frozenset] = None
+_english_lock = threading.Lock()
+
+
+def english_words() -> frozenset:
+    """
+    Words never corrected: scikit-learn's English stop words and the common
+    words shipped in ENGLISH_WORDS_PATH, plus NLTK's words corpus and
+    WordNet's lemmas when they are installed (nlp.warmup downloads them).
+    Loaded once, on first use.
+    """
+    global _english
+    if _english is None:
+        with _english_lock:
+            if _english is None:
+                from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+                words = set(ENGLISH_STOP_WORDS)
+                try:
+                    with open(ENGLISH_WORDS_PATH, encoding="utf-8") as f:
+                        words.update(line.strip() for line in f if not line.startswith("#"))
+                except OSError:
+                    pass
+                try:
+                    from nltk.corpus import words as nltk_words
+                    words.update(w.lower() for w in nltk_words.words())
+                except LookupError:
+                    pass
+                try:
+                    from nltk.corpus import wordnet
+                    words.update(w for w in wordnet.all_lemma_names() if "_" not in w)
+                except LookupError:
+                    pass
+                _english = frozenset(words)
+    return _english
+
+
+def _model_unigrams(model) -> Iterable[str]:
+    from . import compact, hierarchy
+    if isinstance(model, compact.CompactIntentModel):
+        return (t for t in (v.decode("utf-8") for v in model.vocab.tolist()) if " " not in t)
+    if isinstance(model, hierarchy.HierarchicalIntentModel):
+        return (t for t in model.vocabulary if " " not in t)
+    vec = getattr(model, "named_steps", {}).get("vec")
+    vocabulary = getattr(vec, "vocabulary_", None) or {}
+    return (t for t in vocabulary if " " not in t)
+
+
+def dictionary_for(model) -> Dict[str, int]:
+    """word -> frequency from the model's vocabulary, intent_examples and smalltalk patterns."""
+    from .db import get_smalltalk_rows
+    from .nlp import normalize_many
+    from .training import example_rows
+    counts: Counter = Counter()
+    texts = [text for text, _ in example_rows()]
+    texts += [pattern.replace("%", " ") for pattern, _ in get_smalltalk_rows()]
+    for text in normalize_many(texts):
+        counts.update(text.split())
+    for term in _model_unigrams(model):
+        counts[term] += 1
+    return dict(counts)
+
+
+def build_for_model(model) -> SpellingIndex:
+    return SpellingIndex.build(dictionary_for(model), getattr(model, "fingerprint_", None),
+                               known=set(_model_unigrams(model)))
+
+
+_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def for_model(model) -> Optional[SpellingIndex]:
+    """The spelling index for `model`: the one published with it, else built now."""
+    if not SPELL_CORRECTION or model is None:
+        return None
+    english_words()  # load the word lists before the first request needs them
+    try:
+        return _indexes[model]
+    except KeyError:
+        pass
+    except TypeError:  # not weak-referenceable
+        return None
+    with _indexes_lock:
+        if model not in _indexes:
+            _indexes[model] = _load_or_build(model)
+        return _indexes[model]
+
+
+def _load_or_build(model) -> SpellingIndex:
+    artifact_dir = getattr(model, "artifact_dir_", None)
+    if artifact_dir is not None:
+        try:
+            index = SpellingIndex.load(Path(artifact_dir) / "spelling")
+            if index.fingerprint_ == getattr(model, "fingerprint_", None):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+    return build_for_model(model)
@@ -1,77 +1,249 @@
+import hashlib
+import json
+import math
 import pickle
-from typing import Tuple
+from collections import Counter
+from typing import List, Optional, Tuple
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import ComplementNB
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 
-from .nlp import normalize
-from .db import connect, get_feedback_training_data
-from .config import MODEL_PATH
+from .nlp import normalize_many
+from .db import get_connection, iter_feedback_training_data
+from . import artifacts, compact, hierarchy
+from .config import (
+    MODEL_PATH,
+    COMPACT_MODEL_DIR,
+    TUNED_PARAMS_PATH,
+    TRAINING_MODE,
+    INTENT_CLASSIFIER,
+    HIERARCHY_MIN_INTENTS,
+    HIERARCHY_GROUP_SIZE,
+    HIERARCHY_CALIBRATION_SHARE,
+)
 
+# Bump when training/normalization changes so old fingerprints stop matching.
+TRAINING_VERSION = 3
 
-def load_training_data():
-    """
-    Load training data from intent_examples plus approved feedback corrections.
-    Returns X (texts) and y (labels).
-    """
-    con = connect()
-    cur = con.cursor()
-    cur.execute("""
+# Hyperparameters train_model uses unless tuning.py has saved better ones.
+# C=10: with a few examples per intent, C=1 keeps every confidence below
+# CONFIDENCE_THRESHOLD (leave-one-out, answers at C=10 are all correct).
+DEFAULT_PARAMS = {"family": "logreg", "ngram_range": [1, 2], "min_df": 1, "C": 10.0}
+
+
+def tuned_params() -> dict:
+    """DEFAULT_PARAMS overlaid with the winner of the last `python -m chatbot.tuning --save`."""
+    try:
+        with open(TUNED_PARAMS_PATH, encoding="utf-8") as f:
+            return {**DEFAULT_PARAMS, **json.load(f)}
+    except (OSError, ValueError):
+        return dict(DEFAULT_PARAMS)
+
+
+def build_pipeline(params: Optional[dict] = None) -> Pipeline:
+    """The unfitted TF-IDF + classifier pipeline for a set of hyperparameters."""
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    if p["family"] == "logreg":
+        clf = LogisticRegression(max_iter=1000, C=p["C"])
+    elif p["family"] == "nb":
+        clf = ComplementNB(alpha=p.get("alpha", 1.0))
+    else:
+        raise ValueError(f"unknown classifier family {p['family']!r}")
+    return Pipeline([
+        ("vec", TfidfVectorizer(ngram_range=tuple(p["ngram_range"]), min_df=p["min_df"])),
+        ("clf", clf)
+    ])
+
+
+def classifier_layout(n_intents: int) -> str:
+    """"flat" or "hierarchical" for a training set with n_intents intents (see INTENT_CLASSIFIER)."""
+    if INTENT_CLASSIFIER == "auto":
+        return "hierarchical" if n_intents >= HIERARCHY_MIN_INTENTS else "flat"
+    if INTENT_CLASSIFIER not in ("flat", "hierarchical"):
+        raise ValueError(f"unknown INTENT_CLASSIFIER {INTENT_CLASSIFIER!r}")
+    return INTENT_CLASSIFIER
+
+
+def build_model(params: Optional[dict] = None, n_intents: int = 0):
+    """build_pipeline(), or the two-stage model of hierarchy.py for a large intent catalogue."""
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    if classifier_layout(n_intents) == "hierarchical":
+        # Both stages are logistic regressions; a tuned ComplementNB only applies to the flat layout
+        return hierarchy.HierarchicalIntentModel(C=p["C"], ngram_range=p["ngram_range"], min_df=p["min_df"])
+    return build_pipeline(p)
+
+
+def example_rows() -> List[Tuple[str, str]]:
+    """Raw (text, intent) pairs from intent_examples, in insertion order."""
+    # A fixed order keeps training_fingerprint() (and online.py's examples
+    # fingerprint) stable whatever plan SQLite picks for the join
+    cur = get_connection().execute("""
         SELECT i.name as intent, e.example as example
         FROM intent_examples e
         JOIN intents i ON i.id = e.intent_id
+        ORDER BY e.id
     """)
-    rows = cur.fetchall()
-    X = [normalize(r["example"]) for r in rows]
-    y = [r["intent"] for r in rows]
+    return [(r["example"], r["intent"]) for r in cur.fetchall()]
+
+
+def training_rows() -> List[Tuple[str, str]]:
+    """Raw (text, intent) pairs from intent_examples plus approved feedback corrections."""
+    pairs = example_rows()
 
     # Add approved feedback corrections
-    fb = get_feedback_training_data()
-    for item in fb:
+    for item in iter_feedback_training_data():
         if item["correction_intent"]:
-            X.append(normalize(item["user_text"]))
-            y.append(item["correction_intent"])
+            pairs.append((item["user_text"], item["correction_intent"]))
         # Optionally: "fix <answer>" could be mined into KB or smalltalk
 
+    return pairs
+
+
+def load_training_data():
+    """
+    Load training data from intent_examples plus approved feedback corrections.
+    Returns X (texts) and y (labels).
+    """
+    pairs = training_rows()
+    X = normalize_many(text for text, _ in pairs)
+    y = [label for _, label in pairs]
     return X, y
 
 
+def training_fingerprint(pairs: Optional[List[Tuple[str, str]]] = None, params: Optional[dict] = None) -> str:
+    """
+    Content hash of the rows load_training_data() would return (and of the
+    hyperparameters, once tuned). Cheap: it hashes the raw rows and does no
+    normalization or fitting.
+    """
+    if pairs is None:
+        pairs = training_rows()
+    if params is None:
+        params = tuned_params()
+    h = hashlib.sha256(f"v{TRAINING_VERSION}\n".encode())
+    if params != DEFAULT_PARAMS:
+        h.update(json.dumps(params, sort_keys=True).encode() + b"\n")
+    layout = classifier_layout(len({label for _, label in pairs}))
+    if layout != "flat":
+        settings = {"layout": layout, "group_size": HIERARCHY_GROUP_SIZE, "calibration": HIERARCHY_CALIBRATION_SHARE,
+                    "calibrated_on": "report split"}
+        h.update(json.dumps(settings, sort_keys=True).encode() + b"\n")
+    for text, label in pairs:
+        h.update(json.dumps([text, label]).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
 def train_model(save: bool = True) -> Tuple[Pipeline, str]:
     """
-    Train a Logistic Regression intent classifier.
+    Train the intent classifier (Logistic Regression unless tuning picked
+    other hyperparameters; two-stage once classifier_layout() says so).
     Returns the model and a classification report.
     """
-    X, y = load_training_data()
-    if not X:
+    pairs = training_rows()
+    if not pairs:
         raise RuntimeError("No training data found.")
+    X = normalize_many(text for text, _ in pairs)
+    y = [label for _, label in pairs]
+    params = tuned_params()
+    fingerprint = training_fingerprint(pairs, params)
 
-    model = Pipeline([
-        ("vec", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
-        ("clf", LogisticRegression(max_iter=1000))
-    ])
+    counts = Counter(y)
+    model = build_model(params, len(counts))
 
-    # Mini report
-    if len(set(y)) > 1:
+    # Mini report from a held-out split; the served model is then fit on all rows
+    fit_args = {}
+    test_size = max(math.ceil(0.2 * len(y)), len(counts))
+    if len(counts) > 1 and min(counts.values()) >= 2 and len(y) - test_size >= len(counts):
         Xtr, Xte, ytr, yte = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
+            X, y, test_size=test_size, random_state=42, stratify=y
         )
-        model.fit(Xtr, ytr)
+        if isinstance(model, hierarchy.HierarchicalIntentModel):
+            # The report's held-out rows calibrate the two-stage model too, so
+            # neither fit holds out a calibration share of its own
+            model.fit(Xtr, ytr, calibration=(1.0, 0.0))
+            fit_args["calibration"] = model.calibrate(Xte, yte)
+        else:
+            model.fit(Xtr, ytr)
         report = classification_report(yte, model.predict(Xte), zero_division=0)
+    elif len(counts) > 1:
+        report = "Too few examples per intent for a held-out report. Model trained on all rows."
     else:
         # Only one class → train on all, skip report
-        model.fit(X, y)
         report = "Only one intent class present. Model trained without test split."
+    model.fit(X, y, **fit_args)
+    if isinstance(model, hierarchy.HierarchicalIntentModel):
+        report = model.describe() + "\n" + report
+
+    model.fingerprint_ = fingerprint
 
     if save:
-        with open(MODEL_PATH, "wb") as f:
-            pickle.dump(model, f)
+        save_model(model, len(pairs), report)
 
     return model, report
 
 
-def load_model() -> Pipeline:
-    """Load the saved model from disk."""
+def save_model(model: Pipeline, rows: int, report: str) -> int:
+    """
+    Publish a trained model as a new artifact version (compact export when
+    MODEL_FORMAT allows it, else a pickle, plus its spelling index); every
+    serving process picks it up from the manifest. Returns the version.
+    """
+    return artifacts.publish(model, rows, report)
+
+
+def load_model():
+    """
+    Load the currently published model. Before anything has been published,
+    fall back to the pre-versioning files: the compact export in
+    COMPACT_MODEL_DIR, else the pickle at MODEL_PATH.
+    """
+    if artifacts.read_manifest():
+        return artifacts.load()
+    if compact.exists(COMPACT_MODEL_DIR):
+        return compact.CompactIntentModel.load(COMPACT_MODEL_DIR)
     with open(MODEL_PATH, "rb") as f:
         return pickle.load(f)
+
+
+def load_or_train_model() -> Tuple[Pipeline, str]:
+    """
+    Reuse the published model when the training data is unchanged since it
+    was trained (same fingerprint); otherwise train and publish a new one.
+    """
+    if TRAINING_MODE == "incremental":
+        from . import online
+        return online.load_or_rebuild()
+
+    manifest = artifacts.read_manifest()
+    if manifest.get("fingerprint") and manifest["fingerprint"] == training_fingerprint():
+        try:
+            model = artifacts.load(manifest)
+        except Exception:
+            pass  # unreadable model: fall through and retrain
+        else:
+            report = artifacts.read_meta(manifest).get("report", "")
+            return model, f"Training data unchanged; loaded cached model (v{manifest['version']}).\n" + report
+    return train_model(save=True)
+
+
+def retrain(model: Optional[Pipeline] = None, full: bool = False) -> Tuple[Pipeline, str]:
+    """
+    Entry point for :train and /api/train. In "incremental" TRAINING_MODE only
+    new feedback corrections are folded into `model` (unless `full`; without
+    a model, into the saved incremental one); otherwise the pipeline is refit
+    from scratch. Either way the result is published.
+    """
+    from .writebehind import flush_pending
+    flush_pending()  # train on feedback that is still queued, too
+    if TRAINING_MODE == "incremental":
+        from . import online
+        if full:
+            return online.rebuild(save=True)
+        if model is None:
+            return online.load_or_rebuild()
+        return online.update(model, save=True)
+    return train_model(save=True)
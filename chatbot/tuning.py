@@ -0,0 +1,170 @@
+"""
+Cross-validated hyperparameter search for the intent classifier.
+
+    python -m chatbot.tuning [--search grid|random] [--n-iter 20] [--cv 5] [--jobs -1] [--save]
+
+Every candidate (n-gram range, min_df, classifier family and its
+regularization) is scored with stratified k-fold CV; candidates x folds run
+in a joblib process pool. The training rows are loaded and normalized once;
+fitted vectorizers are cached (Pipeline memory), so candidates that differ
+only in the classifier reuse each fold's TF-IDF matrix instead of refitting
+it. --save records the best candidate's hyperparameters, which later
+retrains keep using, and retrains the served model with them right away
+(through training.train_model, so a two-stage layout is built as usual).
+"""
+import argparse
+import json
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+from joblib import Memory
+from scipy.stats import loguniform
+from sklearn.model_selection import GridSearchCV, RandomizedSearchCV, StratifiedKFold
+
+from .db import init_db
+from .training import (
+    DEFAULT_PARAMS,
+    build_pipeline,
+    load_training_data,
+    save_model,
+    train_model,
+)
+from .config import TUNED_PARAMS_PATH, TUNING_CV_FOLDS, TUNING_N_JOBS
+
+NGRAM_RANGES = [(1, 1), (1, 2), (1, 3)]
+MIN_DFS = [1, 2]
+
+# Per family: the estimator to search over and its hyperparameter values (grid)
+# or distribution (random search)
+FAMILIES = {
+    "logreg": ("C", [0.3, 1.0, 3.0, 10.0, 30.0, 100.0], loguniform(0.1, 300)),
+    "nb": ("alpha", [0.03, 0.1, 0.3, 1.0], loguniform(0.01, 3)),
+}
+
+
+def search_space(randomized: bool) -> List[Dict]:
+    """GridSearchCV/RandomizedSearchCV parameter spaces, one per classifier family."""
+    spaces = []
+    for family, (name, grid, dist) in FAMILIES.items():
+        spaces.append({
+            "vec__ngram_range": NGRAM_RANGES,
+            "vec__min_df": MIN_DFS,
+            "clf": [build_pipeline({"family": family}).named_steps["clf"]],
+            f"clf__{name}": dist if randomized else grid,
+        })
+    return spaces
+
+
+def to_params(search_params: Dict) -> Dict:
+    """Search-space parameters -> the flat dict build_pipeline()/tuned_params() use."""
+    clf = search_params["clf"]
+    family = next(f for f in FAMILIES if type(clf) is type(build_pipeline({"family": f}).named_steps["clf"]))
+    name = FAMILIES[family][0]
+    return {
+        "family": family,
+        "ngram_range": list(search_params["vec__ngram_range"]),
+        "min_df": search_params["vec__min_df"],
+        name: float(search_params[f"clf__{name}"]),
+    }
+
+
+def run_search(
+    X: List[str],
+    y: List[str],
+    randomized: bool = False,
+    n_iter: int = 20,
+    cv: int = TUNING_CV_FOLDS,
+    n_jobs: int = TUNING_N_JOBS,
+) -> Tuple[List[Dict], int]:
+    """
+    Score every candidate with stratified k-fold CV. Returns the results
+    (best first) as dicts with params, mean/std accuracy and mean fit time,
+    plus the number of folds actually used.
+    """
+    folds = min(cv, min(Counter(y).values()))
+    if folds < 2 or len(set(y)) < 2:
+        raise RuntimeError("Need at least two intents with two examples each for cross-validation.")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        base = build_pipeline(DEFAULT_PARAMS)
+        base.set_params(memory=Memory(cache_dir, verbose=0))
+        common = dict(
+            cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=42),
+            scoring="accuracy", n_jobs=n_jobs, refit=False, error_score=np.nan,
+        )
+        if randomized:
+            search = RandomizedSearchCV(base, search_space(True), n_iter=n_iter, random_state=42, **common)
+        else:
+            search = GridSearchCV(base, search_space(False), **common)
+        search.fit(X, y)
+
+    res = search.cv_results_
+    results = [
+        {
+            "params": to_params(res["params"][i]),
+            "accuracy": float(res["mean_test_score"][i]),
+            "std": float(res["std_test_score"][i]),
+            "fit_s": float(res["mean_fit_time"][i]),
+        }
+        for i in range(len(res["params"]))
+    ]
+    results.sort(key=lambda r: (-np.nan_to_num(r["accuracy"], nan=-1.0), r["fit_s"]))
+    return results, folds
+
+
+def format_report(results: List[Dict], folds: int, elapsed: float, top: int = 0) -> str:
+    lines = [
+        f"{len(results)} candidates x {folds}-fold CV in {elapsed:.1f}s",
+        f"{'rank':>4}  {'family':<7}{'ngrams':<8}{'min_df':>6}  {'C/alpha':>8}  {'accuracy':>15}  {'fit ms':>7}",
+    ]
+    for rank, r in enumerate(results[:top or None], 1):
+        p = r["params"]
+        reg = p.get("C", p.get("alpha"))
+        lines.append(
+            f"{rank:>4}  {p['family']:<7}{'%d-%d' % tuple(p['ngram_range']):<8}{p['min_df']:>6}  "
+            f"{reg:>8.3g}  {r['accuracy']:>8.3f} ± {r['std']:.3f}  {r['fit_s'] * 1e3:>7.1f}"
+        )
+    return "\n".join(lines)
+
+
+def tune(randomized=False, n_iter=20, cv=TUNING_CV_FOLDS, n_jobs=TUNING_N_JOBS, save=False, top=0):
+    """Run the search; with save, keep the best candidate's hyperparameters and retrain with them."""
+    X, y = load_training_data()  # normalized once, shared by every candidate and fold
+    t0 = time.perf_counter()
+    results, folds = run_search(X, y, randomized, n_iter, cv, n_jobs)
+    report = format_report(results, folds, time.perf_counter() - t0, top)
+
+    model = None
+    if save:
+        with open(TUNED_PARAMS_PATH, "w", encoding="utf-8") as f:
+            json.dump(results[0]["params"], f, indent=2)
+        # Built like every later retrain (build_model: flat or two-stage), so the
+        # served model matches the training_fingerprint() it's published under
+        model, train_report = train_model(save=False)
+        save_model(model, len(y), report + "\n\n" + train_report)
+    return model, results, report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the intent model.")
+    ap.add_argument("--search", choices=["grid", "random"], default="grid")
+    ap.add_argument("--n-iter", type=int, default=20, help="candidates sampled by --search random")
+    ap.add_argument("--cv", type=int, default=TUNING_CV_FOLDS, help="stratified folds")
+    ap.add_argument("--jobs", type=int, default=TUNING_N_JOBS, help="worker processes (-1 = all cores)")
+    ap.add_argument("--top", type=int, default=15, help="rows of the report to print (0 = all)")
+    ap.add_argument("--save", action="store_true", help="keep the best hyperparameters and retrain the served model with them")
+    args = ap.parse_args()
+
+    init_db()
+    model, results, report = tune(args.search == "random", args.n_iter, args.cv, args.jobs, args.save, args.top)
+    print(report)
+    print("\nBest:", json.dumps(results[0]["params"]))
+    if model is not None:
+        print(f"Saved the best model; its hyperparameters are in {TUNED_PARAMS_PATH}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Write-behind logging for interactions and feedback.
+
+record_interaction()/record_feedback() only build the row and put it on a
+bounded in-memory queue; a background thread writes queued rows in batched
+transactions once WRITE_BEHIND_BATCH rows are waiting or the oldest has
+waited WRITE_BEHIND_INTERVAL seconds. Interaction ids are handed out
+immediately from blocks reserved in the database (db.reserve_interaction_ids),
+so callers can attach feedback before the row is written. With several
+workers, that row may sit in another process's queue when our feedback is
+flushed; such feedback is kept and retried for WRITE_BEHIND_ORPHAN_FLUSHES
+flushes, and only then dropped with a warning. The queue is
+drained on close(), which runs at interpreter exit; rows still queued when
+the process is killed are lost.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from . import db, metrics
+from .config import (
+    WRITE_BEHIND,
+    WRITE_BEHIND_MAX_QUEUE,
+    WRITE_BEHIND_BATCH,
+    WRITE_BEHIND_INTERVAL,
+    WRITE_BEHIND_ID_BLOCK,
+    WRITE_BEHIND_ORPHAN_FLUSHES,
+)
+
+log = logging.getLogger(__name__)
+
+_INTERACTION, _FEEDBACK, _FLUSH, _STOP = range(4)
+
+
+class WriteBehindLogger:
+    def __init__(
+        self,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = WRITE_BEHIND_BATCH,
+        flush_interval: float = WRITE_BEHIND_INTERVAL,
+        id_block: int = WRITE_BEHIND_ID_BLOCK,
+        orphan_flushes: int = WRITE_BEHIND_ORPHAN_FLUSHES,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block = id_block
+        self.orphan_flushes = orphan_flushes
+        self._orphans: Dict[tuple, int] = {}  # feedback row -> flushes tried (writer thread only)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._id_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._next_id = self._end_id = 0
+        self._closed = False
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # -- producer side (request threads) --
+    def record_interaction(
+        self,
+        user_text: str,
+        bot_intent: Optional[str],
+        confidence: Optional[float],
+        bot_answer: str
+    ) -> int:
+        iid = self._allocate_id()
+        row = (iid, user_text, bot_intent, confidence or 0.0, bot_answer, datetime.utcnow().isoformat())
+        self._put((_INTERACTION, row))
+        return iid
+
+    def record_feedback(
+        self,
+        interaction_id: int,
+        helpful: Optional[bool],
+        correction_intent: Optional[str],
+        corrected_answer: Optional[str]
+    ) -> None:
+        row = (
+            interaction_id,
+            (1 if helpful else 0) if helpful is not None else None,
+            correction_intent,
+            corrected_answer,
+            1,
+            datetime.utcnow().isoformat(),
+        )
+        self._put((_FEEDBACK, row))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is written (False on timeout)."""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Drain the queue durably and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_STOP, None))
+        self._thread.join()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._queue.qsize()
+        s["orphans"] = len(self._orphans)
+        s["avg_flush_ms"] = s["total_flush_ms"] / s["flushes"] if s["flushes"] else 0.0
+        return s
+
+    def _put(self, item) -> None:
+        if self._closed:
+            raise RuntimeError("write-behind logger is closed")
+        self._queue.put(item)  # blocks when full: back-pressure instead of unbounded memory
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+
+    def _allocate_id(self) -> int:
+        with self._id_lock:
+            if self._next_id >= self._end_id:
+                self._next_id = db.reserve_interaction_ids(self.id_block)
+                self._end_id = self._next_id + self.id_block
+            iid = self._next_id
+            self._next_id += 1
+            return iid
+
+    # -- consumer side (writer thread) --
+    def _run(self) -> None:
+        interactions, feedback = [], []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload = None, None
+
+            if kind == _INTERACTION:
+                interactions.append(payload)
+            elif kind == _FEEDBACK:
+                feedback.append(payload)
+            if kind in (_INTERACTION, _FEEDBACK) and deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+
+            pending = len(interactions) + len(feedback)
+            due = kind is None or kind in (_FLUSH, _STOP) or pending >= self.batch_size
+            if due and (pending or self._orphans):
+                self._write(interactions, feedback)
+                interactions, feedback = [], []
+            if due:
+                # orphaned feedback is retried on the next flush even when idle
+                deadline = time.monotonic() + self.flush_interval if self._orphans else None
+            if kind == _FLUSH:
+                payload.set()
+            elif kind == _STOP:
+                # give other workers the remaining flushes to write the parent rows
+                while self._orphans:
+                    time.sleep(self.flush_interval)
+                    self._write([], [])
+                return
+
+    def _write(self, interactions, feedback) -> None:
+        tried, self._orphans = self._orphans, {}
+        feedback = list(tried) + feedback
+        orphans: List[tuple] = []
+        t0 = time.perf_counter()
+        try:
+            failed = db.insert_log_rows(interactions, feedback, orphans)
+        except Exception:
+            log.exception("write-behind flush of %d rows failed", len(interactions) + len(feedback))
+            failed, orphans = len(interactions) + len(feedback), []
+        elapsed = time.perf_counter() - t0
+        expired = []
+        for row in orphans:
+            flushes = tried.get(row, 0) + 1
+            if flushes < self.orphan_flushes:
+                self._orphans[row] = flushes
+            else:
+                expired.append(row)
+        ms = elapsed * 1e3
+        if metrics.ENABLED:
+            metrics.observe("db_commit", elapsed)
+        with self._stats_lock:
+            st = self._stats
+            st["written"] += len(interactions) + len(feedback) - failed - len(orphans)
+            st["failed"] += failed
+            st["flushes"] += 1
+            st["last_flush_ms"] = ms
+            st["max_flush_ms"] = max(st["max_flush_ms"], ms)
+            st["total_flush_ms"] += ms
+        self._drop_orphans(expired)
+
+    def _drop_orphans(self, rows) -> None:
+        if not rows:
+            return
+        log.warning(
+            "dropping %d feedback row(s) whose interaction was never written: interaction ids %s",
+            len(rows), sorted({row[0] for row in rows}),
+        )
+        with self._stats_lock:
+            self._stats["failed"] += len(rows)
+
+
+_logger: Optional[WriteBehindLogger] = None
+_logger_lock = threading.Lock()
+
+
+def get_logger() -> WriteBehindLogger:
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = WriteBehindLogger()
+                atexit.register(_logger.close)
+    return _logger
+
+
+@metrics.timed("log")
+def record_interaction(user_text: str, bot_intent: Optional[str], confidence: Optional[float], bot_answer: str) -> int:
+    """db.record_interaction, deferred when WRITE_BEHIND is on."""
+    if not WRITE_BEHIND:
+        return db.record_interaction(user_text, bot_intent, confidence, bot_answer)
+    return get_logger().record_interaction(user_text, bot_intent, confidence, bot_answer)
+
+
+def record_feedback(
+    interaction_id: int,
+    helpful: Optional[bool],
+    correction_intent: Optional[str],
+    corrected_answer: Optional[str]
+) -> None:
+    """db.record_feedback, deferred when WRITE_BEHIND is on."""
+    if not WRITE_BEHIND:
+        return db.record_feedback(interaction_id, helpful, correction_intent, corrected_answer)
+    get_logger().record_feedback(interaction_id, helpful, correction_intent, corrected_answer)
+
+
+def flush_pending(timeout: Optional[float] = None) -> None:
+    """Make queued rows visible to readers (e.g. before retraining)."""
+    if _logger is not None:
+        _logger.flush(timeout)
@@ -0,0 +1,13 @@
+import pytest
+
+from chatbot import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """A freshly initialised database in tmp_path, used by every thread's connection."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "banking.db")
+    db.close_all()  # drop connections to the previous file
+    db.init_db()
+    yield db
+    db.close_all()
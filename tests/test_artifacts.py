@@ -0,0 +1,50 @@
+import threading
+from types import SimpleNamespace
+
+from chatbot import artifacts
+
+
+def _publish(root, name):
+    return artifacts.publish(SimpleNamespace(name=name, fingerprint_=name), rows=1, report="", root=root)
+
+
+def test_manifest_never_moves_back_when_publishes_finish_out_of_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "MODEL_FORMAT", "pickle")
+    monkeypatch.setattr(artifacts, "SPELL_CORRECTION", False)
+
+    # Hold the first publisher between claiming its version and updating the manifest
+    claimed, newer_published = threading.Event(), threading.Event()
+    update_manifest = artifacts._update_manifest
+
+    def delayed(root, manifest):
+        if manifest["fingerprint"] == "old":
+            claimed.set()
+            newer_published.wait(10)
+        return update_manifest(root, manifest)
+
+    monkeypatch.setattr(artifacts, "_update_manifest", delayed)
+    versions = {}
+    slow = threading.Thread(target=lambda: versions.setdefault("old", _publish(tmp_path, "old")))
+    slow.start()
+    assert claimed.wait(10)
+    versions["new"] = _publish(tmp_path, "new")
+    newer_published.set()
+    slow.join(10)
+
+    assert versions == {"old": 1, "new": 2}
+    manifest = artifacts.read_manifest(tmp_path)
+    assert manifest["version"] == 2
+    assert manifest["fingerprint"] == "new"
+    assert artifacts.load(root=tmp_path).name == "new"
+
+
+def test_stale_manifest_update_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "MODEL_FORMAT", "pickle")
+    monkeypatch.setattr(artifacts, "SPELL_CORRECTION", False)
+    assert _publish(tmp_path, "a") == 1
+    assert _publish(tmp_path, "b") == 2
+
+    assert not artifacts._update_manifest(tmp_path, {"version": 1, "path": "v000001"})
+    assert artifacts.read_manifest(tmp_path)["version"] == 2
+    assert artifacts._update_manifest(tmp_path, {"version": 3, "path": "v000003"})
+    assert artifacts.read_manifest(tmp_path)["version"] == 3
@@ -0,0 +1,19 @@
+from chatbot import inference, knowledge, response_cache, retrieval, training
+from chatbot.bench import _correct, csv_cases
+
+
+def test_every_csv_case_is_answered_correctly(temp_db, tmp_path, monkeypatch):
+    # Default hyperparameters on the seed data, as a fresh install trains them
+    monkeypatch.setattr(training, "TUNED_PARAMS_PATH", tmp_path / "params.json")
+    monkeypatch.setattr(retrieval.index, "path", tmp_path / "learned_index")
+    monkeypatch.setattr(retrieval.index, "_state", None)
+    monkeypatch.setattr(response_cache, "ENABLED", False)
+    knowledge.kb.refresh()
+    model, _ = training.train_model(save=False)
+
+    wrong = []
+    for text, expected in csv_cases():
+        intent, answer, confidence = inference.infer_intent_and_answer(model, text)
+        if not _correct(expected, intent) or (expected is not None and not answer):
+            wrong.append((text, expected, intent, round(confidence, 3)))
+    assert not wrong
@@ -0,0 +1,27 @@
+import logging
+
+from chatbot import db
+
+
+def test_smalltalk_dedupe_keeps_rows_with_another_response(tmp_path, monkeypatch, caplog):
+    # A version-0 database where every start re-inserted the seed rows
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "old.db")
+    db.close_all()
+    con = db.get_connection()
+    con.executescript(db.SCHEMA)
+    with con:
+        con.executemany("INSERT INTO smalltalk(pattern, response) VALUES (?, ?)", db.SMALLTALK * 3)
+        con.execute("INSERT INTO smalltalk(pattern, response) VALUES ('%hello%', 'Hey! Welcome to the bank.')")
+
+    with caplog.at_level(logging.WARNING, logger="chatbot.db"):
+        db.init_db()
+        db.init_db()  # later starts add nothing
+    try:
+        rows = db.get_smalltalk_rows()
+        assert rows == db.SMALLTALK + [("%hello%", "Hey! Welcome to the bank.")]
+        assert db.smalltalk_conflicts() == {
+            "%hello%": ["Hello! How can I assist you with banking today?", "Hey! Welcome to the bank."],
+        }
+        assert caplog.text.count("'%hello%' has 2 responses") == 1
+    finally:
+        db.close_all()
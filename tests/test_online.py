@@ -0,0 +1,34 @@
+from chatbot import db, online
+
+
+def _correction(text, intent):
+    iid = db.record_interaction(text, None, 0.0, "")
+    db.record_feedback(iid, False, intent, None)
+    return db.get_connection().execute("SELECT MAX(id) FROM feedback").fetchone()[0]
+
+
+def test_update_picks_up_a_correction_approved_below_the_watermark(temp_db):
+    held = _correction("where can i withdraw cash", "atm_availability")
+    db.approve_correction(held, False)  # posted, then held back for review
+    model, _ = online.rebuild(save=False)
+    _correction("how much is a home loan", "loan_rates")
+    model, report = online.update(model, save=False)
+    assert report.startswith("Folded in 1 ")
+
+    db.approve_correction(held)  # older than the feedback already folded in
+    model, report = online.update(model, save=False)
+    assert report.startswith("Folded in 1 ")
+    assert model.rows_since_rebuild_ == 2
+    assert online.update(model, save=False)[1].startswith("No new corrections")
+
+
+def test_revoked_correction_forces_a_rebuild_without_it(temp_db):
+    examples = len(online.example_rows())
+    fid = _correction("where can i withdraw cash", "atm_availability")
+    model, report = online.rebuild(save=False)
+    assert f"on {examples + 1} rows" in report
+
+    db.approve_correction(fid, False)
+    model, report = online.update(model, save=False)
+    assert report.startswith(f"Full rebuild on {examples} rows")
+    assert online.update(model, save=False)[1].startswith("No new corrections")
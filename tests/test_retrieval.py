@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+
+from chatbot import retrieval
+from chatbot.nlp import normalize
+
+
+def _row(writer, i):
+    return ("test", writer * 1000 + i), f"question {writer} number {i} about fees", f"answer {writer}-{i}"
+
+
+def test_concurrent_saves_and_loads_see_complete_indexes(tmp_path, monkeypatch):
+    # Separate index objects share nothing but the directory, like separate processes
+    monkeypatch.setattr(retrieval, "_KEEP_SAVES", 2)
+    writers, saves = 4, 15
+    errors, loads = [], []
+    done = threading.Event()
+
+    def write(writer):
+        idx = retrieval.LearnedAnswerIndex(path=tmp_path, merge_every=1, from_db=False)
+        try:
+            for i in range(saves):
+                idx.add_many([_row(writer, i)])
+                idx.save()
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        while not done.is_set():
+            st = retrieval.LearnedAnswerIndex(path=tmp_path, from_db=False)._load()
+            try:
+                assert st.docs.shape[0] == len(st.keys) == len(st.answers)
+                assert len(st.docs.indptr) == len(st.keys) + 1
+                for (_, source_id), answer in zip(st.keys, st.answers):
+                    assert answer == "answer {}-{}".format(*divmod(source_id, 1000))
+                # the arrays belong to the same save as meta.json
+                for row, key in enumerate(st.keys):
+                    ids, weights = retrieval.vectorize(normalize(_row(*divmod(key[1], 1000))[1]))
+                    assert abs(retrieval._score(st.docs, np.array([row]), ids, weights)[0] - 1) < 1e-5
+            except Exception as e:
+                errors.append(e)
+                return
+            loads.append(len(st.keys))
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for t in readers + threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    done.set()
+    for t in readers:
+        t.join(60)
+
+    assert not errors, errors[0]
+    assert loads
+    final = retrieval.LearnedAnswerIndex(path=tmp_path, from_db=False)._load()
+    assert len(final.keys) == saves  # the last save of one writer
+    assert len(list(tmp_path.glob(retrieval._SAVE_PREFIX + "*"))) <= 2
+    assert not list(tmp_path.glob(".tmp-*"))
+
+
+def test_saved_index_answers_after_reload(tmp_path):
+    idx = retrieval.LearnedAnswerIndex(path=tmp_path, merge_every=10, from_db=False)
+    idx.add_many([_row(0, i) for i in range(3)])
+    idx.save()
+    again = retrieval.LearnedAnswerIndex(path=tmp_path, from_db=False)
+    assert again.lookup(normalize("question 0 number 2 about fees")) == ("answer 0-2", 1.0)
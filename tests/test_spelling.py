@@ -0,0 +1,33 @@
+from chatbot import spelling
+
+WORDS = {"hello": 3, "hi": 3, "atm": 2, "loan": 4, "open": 2, "list": 1, "branch": 2, "interest": 2, "much": 1}
+
+
+def _index(**kwargs):
+    return spelling.SpellingIndex.build(WORDS, max_edit=2, prefix_length=7, min_length=3, short_length=4, **kwargs)
+
+
+def test_long_typos_get_two_edits():
+    index = _index()
+    assert index.correct("brnach intrest") == "branch interest"
+
+
+def test_short_tokens_get_one_edit_to_a_classifier_word():
+    index = _index(known={"hello", "atm", "loan", "open"})
+    assert index.correct("helo atn lon opn") == "hello atm loan open"
+    assert index.correct_token("hiya") == "hiya"  # "hi" is two edits away
+    assert index.correct_token("mucj") == "mucj"  # "much" is one edit away, but not a classifier word
+
+
+def test_real_words_and_tiny_tokens_are_left_alone():
+    index = _index()
+    for word in ("him", "his", "lost", "match", "opening", "hi", "42"):
+        assert index.correct_token(word) == word
+    assert "match" in spelling.english_words()  # from the shipped list, with or without NLTK data
+
+
+def test_saved_index_round_trips(tmp_path):
+    index = _index(known={"atm"})
+    index.save(tmp_path)
+    loaded = spelling.SpellingIndex.load(tmp_path)
+    assert loaded.correct("atn lon") == "atm lon"
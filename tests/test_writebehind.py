@@ -0,0 +1,53 @@
+import logging
+
+from chatbot import db, writebehind
+
+
+class FakeLog:
+    """insert_log_rows over in-memory tables, with the same FK rule as SQLite."""
+
+    def __init__(self):
+        self.interactions, self.feedback = set(), []
+
+    def insert_log_rows(self, interactions, feedback, orphans=None):
+        self.interactions.update(row[0] for row in interactions)
+        failed = 0
+        for row in feedback:
+            if row[0] in self.interactions:
+                self.feedback.append(row)
+            elif orphans is not None:
+                orphans.append(row)
+            else:
+                failed += 1
+        return failed
+
+
+def _logger(monkeypatch, **kwargs):
+    fake = FakeLog()
+    monkeypatch.setattr(db, "insert_log_rows", fake.insert_log_rows)
+    kwargs.setdefault("flush_interval", 0.01)
+    return fake, writebehind.WriteBehindLogger(**kwargs)
+
+
+def test_feedback_waits_for_an_interaction_written_by_another_worker(monkeypatch):
+    fake, logger = _logger(monkeypatch)
+    logger.record_feedback(7, False, "atm_locations", None)
+    assert logger.flush(5)
+    assert fake.feedback == [] and logger.stats()["orphans"] == 1
+
+    fake.interactions.add(7)  # the other worker's flush lands
+    assert logger.flush(5)
+    logger.close()
+    assert [row[:3] for row in fake.feedback] == [(7, 0, "atm_locations")]
+    stats = logger.stats()
+    assert (stats["written"], stats["failed"], stats["orphans"]) == (1, 0, 0)
+
+
+def test_orphaned_feedback_is_dropped_with_a_warning_after_the_retry_limit(monkeypatch, caplog):
+    fake, logger = _logger(monkeypatch, orphan_flushes=3)
+    logger.record_feedback(42, True, None, None)
+    with caplog.at_level(logging.WARNING, logger="chatbot.writebehind"):
+        logger.close()
+    assert fake.feedback == []
+    assert logger.stats()["failed"] == 1
+    assert "interaction ids [42]" in caplog.text